@@ -0,0 +1,227 @@
+'''Batch simulator: plays thousands of shoes at once as NumPy arrays.
+Only covers one CPU seat with a fixed bet and a strategy without random decisions (hard or a
+strategy chart), which is what we need to estimate the house edge. Plays any table rules but
+surrender. Results should match blackjack.simulate statistically.'''
+import sys                  # For the command line arguments
+import time                 # For timing runs
+import numpy as np
+import blackjack
+
+ACE = 0                                                                     # Card code of the aces
+VALUES = np.array([blackjack.CARD_VALUES[card] for card in blackjack.CARD_TYPES], dtype=np.int16)  # Aces count as 1
+MAX_HANDS = 16  # Hands a seat can have after splitting. More splits than this are refused (never happens in practice).
+
+def strategy_table(difficulty="hard"):
+    """A compiled CPU strategy table (see blackjack.get_strategy) as a [pair card, soft, total, up card] array"""
+    table = np.frombuffer(blackjack.get_strategy(difficulty), dtype=np.uint8).reshape(11, 2, 32, 11)
+    if (table & blackjack.HIT_SOMETIMES).any():
+        raise ValueError(f"The {difficulty} strategy makes random decisions, which the batch simulator can't play")
+    return table
+
+def rule_tables(spec):
+    """Compiled table rules (see blackjack.get_rules) as (dealer hits [soft, total], can double [after split, total],
+    most hands) arrays. Raises ValueError for rules the batch simulator can't play."""
+    rules = blackjack.get_rules(spec)
+    if rules.surrender:
+        raise ValueError("The batch simulator can't play surrender")
+    return np.array(rules.dealer_hits), np.array(rules.can_double), min(MAX_HANDS, rules.max_hands)
+
+def _hand_totals(hard, aces):
+    """Totals and soft flags of hands, from their hard totals and ace counts"""
+    soft = (aces > 0) & (hard <= 11)
+    return hard + 10*soft, soft
+
+def _play_shoes(rng, num_shoes, num_decks, blackjack_multiplier, strategy, rules, stats):
+    """Plays `num_shoes` shoes side by side until each of them reaches the cut card"""
+    size  = 52*num_decks
+    dealer_hits, can_double, max_hands = rules
+    cards = rng.permuted(np.tile(np.arange(len(VALUES), dtype=np.int8), (num_shoes, 4*num_decks)), axis=1)
+    cursor   = np.zeros(num_shoes, dtype=np.int64)
+    cut_card = num_decks*13 + 2     # Same as Shoe.reached_cut_card with one player
+    while True:
+        lanes = np.nonzero(size - cursor >= cut_card)[0]
+        if lanes.size == 0:
+            return
+        count = lanes.size
+
+        def draw(rows):
+            """Deals one card to each of the given rows of this round"""
+            shoes = lanes[rows]
+            codes = cards[shoes, cursor[shoes]]
+            cursor[shoes] += 1
+            return codes
+        # Per hand state: hard total, aces, number of cards, first card, pair flag, bet and bust flag
+        hard   = np.zeros((count, MAX_HANDS), dtype=np.int16)
+        aces   = np.zeros((count, MAX_HANDS), dtype=np.int16)
+        ncards = np.zeros((count, MAX_HANDS), dtype=np.int16)
+        first  = np.zeros((count, MAX_HANDS), dtype=np.int8)
+        pair   = np.zeros((count, MAX_HANDS), dtype=bool)
+        bets   = np.ones((count, MAX_HANDS), dtype=np.int16)
+        bust   = np.zeros((count, MAX_HANDS), dtype=bool)
+        num_hands = np.ones(count, dtype=np.int16)
+        current   = np.zeros(count, dtype=np.int16)
+
+        def add_card(rows, hands, codes):
+            hard[rows, hands]  += VALUES[codes]
+            aces[rows, hands]  += codes == ACE
+            pair[rows, hands]   = (ncards[rows, hands] == 1) & (first[rows, hands] == codes)
+            first[rows, hands]  = np.where(ncards[rows, hands] == 0, codes, first[rows, hands])
+            ncards[rows, hands] += 1
+        # Dealing: two cards for the player, then two for the dealer
+        everyone = np.arange(count)
+        hand_zero = np.zeros(count, dtype=np.int16)
+        add_card(everyone, hand_zero, draw(everyone))
+        add_card(everyone, hand_zero, draw(everyone))
+        dealer_first  = draw(everyone)
+        dealer_second = draw(everyone)
+        up = VALUES[dealer_first]
+        dealer_hard = VALUES[dealer_first] + VALUES[dealer_second]
+        dealer_aces = (dealer_first == ACE).astype(np.int16) + (dealer_second == ACE)
+        dealer_total, dealer_soft = _hand_totals(dealer_hard, dealer_aces)
+        player_total, _ = _hand_totals(hard[:, 0], aces[:, 0])
+        house_blackjack  = dealer_total == 21
+        player_blackjack = (player_total == 21) & ~house_blackjack
+        # Players' turn, one card (or decision) per step for every seat still playing
+        rows = np.nonzero(~house_blackjack & ~player_blackjack)[0]
+        while rows.size:
+            hands = current[rows]
+            one_card = ncards[rows, hands] == 1
+            finished = np.zeros(rows.size, dtype=bool)
+            # Hands left with one card after a split get their second card
+            if one_card.any():
+                single_rows, single_hands = rows[one_card], hands[one_card]
+                split_aces = aces[single_rows, single_hands] == 1 # After splitting aces you only get one card
+                add_card(single_rows, single_hands, draw(single_rows))
+                total, _ = _hand_totals(hard[single_rows, single_hands], aces[single_rows, single_hands])
+                finished[one_card] = split_aces | (total == 21)
+            deciding = ~one_card
+            if deciding.any():
+                decide_rows, decide_hands = rows[deciding], hands[deciding]
+                total, soft = _hand_totals(hard[decide_rows, decide_hands], aces[decide_rows, decide_hands])
+                is_pair = pair[decide_rows, decide_hands]
+                pair_card = np.where(is_pair, VALUES[first[decide_rows, decide_hands]], 0)
+                action = strategy[pair_card, soft.astype(np.int8), total, up[decide_rows]]
+                two_cards = ncards[decide_rows, decide_hands] == 2
+                splits  = is_pair & (action & blackjack.SPLIT > 0) & (num_hands[decide_rows] < max_hands)
+                doubles = ~splits & two_cards & can_double[(num_hands[decide_rows] > 1).astype(np.int8), total] & (action & blackjack.DOUBLE > 0)
+                hits    = ~splits & ~doubles & (action & blackjack.HIT > 0)
+                stands  = ~splits & ~doubles & ~hits
+                if splits.any():
+                    split_rows, split_hands = decide_rows[splits], decide_hands[splits]
+                    codes = first[split_rows, split_hands]
+                    new_hands = num_hands[split_rows]
+                    for hand_index in (split_hands, new_hands): # Both hands keep one card of the pair
+                        hard[split_rows, hand_index]   = VALUES[codes]
+                        aces[split_rows, hand_index]   = codes == ACE
+                        ncards[split_rows, hand_index] = 1
+                        first[split_rows, hand_index]  = codes
+                        pair[split_rows, hand_index]   = False
+                    num_hands[split_rows] += 1
+                if doubles.any():
+                    double_rows, double_hands = decide_rows[doubles], decide_hands[doubles]
+                    add_card(double_rows, double_hands, draw(double_rows))
+                    bets[double_rows, double_hands] = 2
+                    double_total, _ = _hand_totals(hard[double_rows, double_hands], aces[double_rows, double_hands])
+                    bust[double_rows, double_hands] = double_total > 21
+                if hits.any():
+                    hit_rows, hit_hands = decide_rows[hits], decide_hands[hits]
+                    add_card(hit_rows, hit_hands, draw(hit_rows))
+                    hit_total, _ = _hand_totals(hard[hit_rows, hit_hands], aces[hit_rows, hit_hands])
+                    bust[hit_rows, hit_hands] = hit_total > 21
+                    hits[hits] = hit_total >= 21    # Auto-stand on 21, stop on bust
+                finished[deciding] = doubles | hits | stands
+            current[rows[finished]] += 1
+            rows = rows[current[rows] < num_hands[rows]]
+        # Dealer's turn (skipped on house blackjack), hitting until 17 (or soft 17, depending on the rules)
+        drawing = np.nonzero(~house_blackjack & dealer_hits[dealer_soft.astype(np.int8), dealer_total])[0]
+        while drawing.size:
+            codes = draw(drawing)
+            dealer_hard[drawing] += VALUES[codes]
+            dealer_aces[drawing] += codes == ACE
+            dealer_total[drawing], dealer_soft[drawing] = _hand_totals(dealer_hard[drawing], dealer_aces[drawing])
+            drawing = drawing[dealer_hits[dealer_soft[drawing].astype(np.int8), dealer_total[drawing]]]
+        # Settlement, with the payouts of Player.payout
+        in_play = np.arange(MAX_HANDS) < num_hands[:, None]
+        totals, _ = _hand_totals(hard, aces)
+        dealer = dealer_total[:, None]
+        won   = np.where(dealer > 21, ~bust, (totals > dealer) & (totals <= 21)) & in_play
+        drawn = ~(dealer > 21) & (totals == dealer) & (totals <= 21) & in_play
+        lost  = in_play & ~won & ~drawn
+        # House blackjack: everyone loses except players with 21, who draw
+        won[house_blackjack] = False
+        drawn[house_blackjack, 0] = player_total[house_blackjack] == 21
+        lost[house_blackjack, 0]  = player_total[house_blackjack] != 21
+        # Player blackjack
+        won[player_blackjack, 0] = False
+        drawn[player_blackjack, 0] = False
+        lost[player_blackjack, 0]  = False
+        net = (bets*won).sum(axis=1) - (bets*lost).sum(axis=1) + blackjack_multiplier*player_blackjack
+        stats["rounds"]     += count
+        stats["hands"]      += int(num_hands.sum())
+        stats["blackjacks"] += int(player_blackjack.sum())
+        stats["won"]        += int(won.sum())
+        stats["drawn"]      += int(drawn.sum())
+        stats["lost"]       += int(lost.sum())
+        stats["wagered"]    += int((bets*in_play).sum())
+        stats["net"]        += float(net.sum())
+        stats["net_squared"] += float((net*net).sum())
+
+def simulate_batch(num_shoes, num_decks=6, blackjack_multiplier=1.5, bet=1, lanes=4096, seed=None, difficulty="hard",
+                   rules=blackjack.DEFAULT_SETTINGS["rules"]):
+    """Plays `num_shoes` shoes, `lanes` at a time, with one CPU betting `bet` every round.
+    Returns the same stats as blackjack.simulate, plus the house edge's standard error."""
+    rng = np.random.default_rng(seed)
+    strategy = strategy_table(difficulty)
+    tables = rule_tables(rules)
+    stats = dict.fromkeys(("rounds", "hands", "blackjacks", "won", "drawn", "lost", "wagered"), 0)
+    stats["net"] = stats["net_squared"] = 0.0
+    start_time = time.perf_counter()
+    for start in range(0, num_shoes, lanes):
+        _play_shoes(rng, min(lanes, num_shoes - start), num_decks, blackjack_multiplier, strategy, tables, stats)
+    elapsed = time.perf_counter() - start_time
+    rounds = stats["rounds"]
+    net = stats.pop("net")
+    variance = stats.pop("net_squared")/rounds - (net/rounds)**2 if rounds else 0.0
+    stats["stacks"] = num_shoes
+    stats["wagered"] *= bet
+    stats["casino_winnings"] = -net*bet
+    stats["house_edge"] = -net/(stats["wagered"]/bet) if stats["wagered"] else 0.0
+    # Per round results are independent enough for this estimate
+    stats["house_edge_stderr"] = (variance*rounds)**0.5/(stats["wagered"]/bet) if stats["wagered"] else 0.0
+    stats["seconds"] = elapsed
+    stats["rounds_per_sec"] = rounds/elapsed if elapsed else 0.0
+    return stats
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Estimates the house edge against a CPU strategy with NumPy.")
+    parser.add_argument("shoes", type=int, help="number of shoes to play")
+    parser.add_argument("--strategy", default="hard", help="hard or a strategy chart file")
+    parser.add_argument("--decks", type=int, default=blackjack.DEFAULT_SETTINGS["num_decks"], help="decks per shoe")
+    parser.add_argument("--multiplier", type=float, default=blackjack.DEFAULT_SETTINGS["blackjack_multiplier"],
+                        help="blackjack payout multiplier")
+    parser.add_argument("--rules", default=blackjack.DEFAULT_SETTINGS["rules"], help="table rules, as in the settings (no surrender)")
+    parser.add_argument("--lanes", type=int, default=4096, help="shoes played at once")
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--compare", type=int, metavar="ROUNDS",
+                        help="also play this many rounds with blackjack.simulate and show both house edges")
+    options = parser.parse_args(args)
+    try:
+        stats = simulate_batch(options.shoes, options.decks, options.multiplier, lanes=options.lanes, seed=options.seed,
+                               difficulty=options.strategy, rules=options.rules)
+    except ValueError as error:
+        parser.error(str(error))
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+    if options.compare:
+        bet = blackjack.DEFAULT_SETTINGS["minimum_bet"]
+        scalar = blackjack.simulate({"players_ai": 1, "CPU_difficulty": options.strategy, "num_decks": options.decks,
+                                     "blackjack_multiplier": options.multiplier, "rules": options.rules, "starting_money": 10**12,
+                                     "minimum_bet": bet, "maximum_bet": bet}, rounds=options.compare)
+        print(f"\nScalar engine: house edge {scalar['house_edge']:.5f} over {scalar['rounds']} rounds "
+              f"({scalar['rounds_per_sec']:.0f} rounds/sec)")
+        print(f"Batch engine:  house edge {stats['house_edge']:.5f} +- {stats['house_edge_stderr']:.5f} "
+              f"({stats['rounds_per_sec']:.0f} rounds/sec)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
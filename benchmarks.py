@@ -0,0 +1,201 @@
+'''Benchmarks for the game engine's hot paths.
+Run `python benchmarks.py` to save the results to a JSON file, and
+`python benchmarks.py --compare old_results.json` to check them against an older run.'''
+import sys                  # For the command line arguments and exit code
+import io                   # For swallowing the game's output
+import json                 # For saving/loading results
+import time                 # For timing
+import random               # For reproducible benchmark data
+import platform             # For recording where the benchmarks ran
+import contextlib           # For redirecting stdout
+import blackjack
+
+BENCHMARKS = []     # (name, unit, function) for every benchmark
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_THRESHOLD = 0.10    # Slowdown (10%) reported as a regression when comparing
+
+def benchmark(name, unit):
+    """Registers a benchmark. The function returns (operations, seconds) for one timed run."""
+    def register(function):
+        BENCHMARKS.append((name, unit, function))
+        return function
+    return register
+def sim_settings(**changes):
+    """CPU-only settings that don't run out of money, so every run plays the same amount"""
+    return blackjack.Settings(**dict(players_human=0, autopause=False, starting_money=10**12, **changes))
+@contextlib.contextmanager
+def quiet_game():
+    """Swallows everything the game prints, answers its input() calls and plays no music"""
+    replaced = {"input": lambda text="": "x", "clear": lambda: None, "audio": blackjack.Null_Audio()}
+    missing = object()
+    saved = {name: blackjack.__dict__.get(name, missing) for name in replaced}
+    blackjack.__dict__.update(replaced)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        for name, value in saved.items():
+            if value is missing:
+                del blackjack.__dict__[name]
+            else:
+                blackjack.__dict__[name] = value
+
+def realistic_hands(count, seed=1):
+    """Hands like the ones played in a game: two cards, plus hits until 17 or more"""
+    rng = random.Random(seed)
+    hands = []
+    shoe = blackjack.Shoe(6, rng=rng)
+    while len(hands) < count:
+        if shoe.reached_cut_card(1):
+            shoe.shuffle()
+        hand = [shoe.deal(), shoe.deal()]
+        while blackjack.total_up(hand) < 17 and rng.random() < 0.6:
+            hand.append(shoe.deal())
+        hands.append(hand)
+    return hands
+HANDS = realistic_hands(20000)
+
+@benchmark("total_up", "hands/sec")
+def bench_total_up():
+    total_up = blackjack.total_up
+    start = time.perf_counter()
+    for hand in HANDS:
+        total_up(hand)
+    return len(HANDS), time.perf_counter() - start
+@benchmark("is_soft", "hands/sec")
+def bench_is_soft():
+    is_soft = blackjack.is_soft
+    start = time.perf_counter()
+    for hand in HANDS:
+        is_soft(hand)
+    return len(HANDS), time.perf_counter() - start
+@benchmark("Hand.append", "hands/sec")
+def bench_hand():
+    Hand = blackjack.Hand
+    start = time.perf_counter()
+    for cards in HANDS:
+        Hand(cards)
+    return len(HANDS), time.perf_counter() - start
+def bench_make_decks(num_decks):
+    def run():
+        stacks = 2000
+        start = time.perf_counter()
+        for stack in range(stacks):
+            blackjack.make_decks(num_decks, blackjack.CARD_TYPES)
+        return stacks, time.perf_counter() - start
+    return run
+def bench_deal_stack(num_decks):
+    def run():
+        shoe = blackjack.make_decks(num_decks, blackjack.CARD_TYPES)
+        stacks = 200
+        cards = 0
+        start = time.perf_counter()
+        for stack in range(stacks):
+            shoe.shuffle()
+            while not shoe.reached_cut_card(1):
+                shoe.deal()
+                cards += 1
+        return cards, time.perf_counter() - start
+    return run
+for _decks in range(1, 9):
+    benchmark(f"make_decks[{_decks}]", "stacks/sec")(bench_make_decks(_decks))
+    benchmark(f"deal_to_cut_card[{_decks}]", "cards/sec")(bench_deal_stack(_decks))
+
+@benchmark("play_game", "rounds/sec")
+def bench_play_game():
+    """CPU-only game through play_game, with its output thrown away"""
+    random.seed(2)
+    blackjack.settings = sim_settings(stacks=20, players_ai=3, names_ai=False)
+    players = blackjack.create_players(0, 3, blackjack.settings.starting_money)
+    with quiet_game():
+        start = time.perf_counter()
+        rounds = blackjack.play_game(players, blackjack.CARD_TYPES, 0)
+        elapsed = time.perf_counter() - start
+    return rounds, elapsed
+@benchmark("dealer_turn", "rounds/sec")
+def bench_dealer_turn():
+    """Dealer resolution (dealer_turn and check_player_win) against three finished hands"""
+    random.seed(3)
+    blackjack.settings = sim_settings()
+    players = [blackjack.CPU_Player(100, f"CPU {seat}") for seat in range(3)]
+    shoe = blackjack.make_decks(6, blackjack.CARD_TYPES)
+    rounds = 20000
+    elapsed = 0.0
+    game_output = blackjack.output
+    blackjack.output = blackjack.Renderer(blackjack.SILENT)
+    try:
+        for round_num in range(rounds):
+            if shoe.reached_cut_card(len(players)):
+                shoe.shuffle()
+            for player in players:
+                player.reinitialize_hands()
+                player.deal_two_cards(shoe)
+            dealer_hand = blackjack.Hand([shoe.deal(), shoe.deal()])
+            start = time.perf_counter()
+            blackjack.dealer_turn(dealer_hand, shoe, players)
+            elapsed += time.perf_counter() - start
+    finally:
+        blackjack.output = game_output
+    return rounds, elapsed
+def bench_stack_throughput(players_ai):
+    def run():
+        random.seed(4)
+        stats = blackjack.simulate(sim_settings(players_ai=players_ai, CPU_difficulty="hard"), stacks=300)
+        return stats["rounds"], stats["seconds"]
+    return run
+for _players in (1, 2, 3, 5, 7):
+    benchmark(f"simulate_stacks[{_players} CPUs]", "rounds/sec")(bench_stack_throughput(_players))
+
+def run_benchmarks(repeat=3, only=None):
+    """Runs every benchmark `repeat` times and keeps the best rate"""
+    results = {}
+    for name, unit, function in BENCHMARKS:
+        if only and not any(part in name for part in only):
+            continue
+        rate = 0.0
+        for attempt in range(repeat):
+            operations, seconds = function()
+            rate = max(rate, operations/seconds if seconds else 0.0)
+        results[name] = {"rate": rate, "unit": unit}
+        print(f"{name:<28} {rate:>16,.0f} {unit}")
+    return results
+def compare_results(old, new, threshold=DEFAULT_THRESHOLD):
+    """Prints the change of every benchmark, returns the names of the ones that got slower than the threshold"""
+    regressions = []
+    print(f"\n{'benchmark':<28} {'old':>14} {'new':>14} {'change':>8}")
+    for name, result in new.items():
+        if name not in old:
+            continue
+        change = result["rate"]/old[name]["rate"] - 1 if old[name]["rate"] else 0.0
+        flag = ""
+        if change < -threshold:
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        print(f"{name:<28} {old[name]['rate']:>14,.0f} {result['rate']:>14,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmarks the blackjack engine.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"results file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", metavar="FILE", help="previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown reported as a regression, as a fraction (default: 0.10)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the best one counts")
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name contains one of these")
+    options = parser.parse_args(args)
+    results = run_benchmarks(options.repeat, options.only)
+    with open(options.output, "w") as file:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                   "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}, file, indent=4)
+    if options.compare:
+        with open(options.compare) as file:
+            old = json.load(file)["results"]
+        regressions = compare_results(old, results, options.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) got slower: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,137 @@
+'''Bet policy optimizer: races CPU bet policies (see blackjack.get_bet_policy) against each other
+on every core and drops the ones that are clearly worse as soon as the results say so.
+
+    python bet_optimizer.py --max-stacks 20000 --set CPU_difficulty=hard
+    python bet_optimizer.py flat:2 flat:10 fraction:0.1 progression:2:2 --objective survival
+
+Every policy plays the same stacks (same shoes and CPU decisions, from the same seed), in batches.
+After each batch, every policy still in the race is compared with the leader on the stacks both
+played, and dropped if the leader is ahead by more than `z` standard errors of the paired difference.
+The next batch is only played by the policies that are left, so they get all the budget.
+Every stack is a new CPU table (see montecarlo.play_stack), and its score is the average final
+money of its seats ("money") or the share of its seats that didn't go bankrupt ("survival").
+'''
+import sys                  # For the command line arguments
+import os                   # For the number of cores
+import math                 # For the standard errors
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import blackjack
+import montecarlo
+
+DEFAULT_POLICIES = ["quarter", "flat:2", "flat:5", "flat:10", "flat:25", "fraction:0.05", "fraction:0.1",
+                    "fraction:0.5", "kelly:0.5:0.01", "progression:2:2", "progression:5:1.5"]
+OBJECTIVES = ("money", "survival")
+
+def score_stacks(sim_settings, seed, stacks, objective):
+    """Worker task: plays the stacks and returns [(stack, score, final money, bankrupt seats, seats)]"""
+    scores = []
+    for stats in montecarlo.play_stacks(sim_settings, seed, stacks):
+        money = [player["money"] for player in stats["players"]]
+        bankrupt = sum(player["bankruptcy"] for player in stats["players"])
+        score = sum(money)/len(money) if objective == "money" else 1 - bankrupt/len(money)
+        scores.append((stats["stack"], score, sum(money), bankrupt, len(money)))
+    return scores
+
+class Candidate:
+    """A bet policy in the race and the scores of the stacks it played"""
+    def __init__(self, policy, sim_settings):
+        self.policy = policy
+        self.settings = sim_settings.replace(CPU_bets=policy)
+        self.scores = {}        # Stack: score
+        self.money = 0          # Final money of every seat, added up
+        self.bankrupt = 0       # Seats that went bankrupt
+        self.seats = 0
+        self.dropped = None     # Stacks played when it was dropped (None while in the race)
+    @property
+    def mean(self):
+        return sum(self.scores.values())/len(self.scores) if self.scores else 0.0
+    def report(self):
+        return {"policy": self.policy, "score": self.mean, "stacks": len(self.scores),
+                "average_money": self.money/self.seats if self.seats else 0.0,
+                "bust_rate": self.bankrupt/self.seats if self.seats else 0.0, "dropped_after": self.dropped}
+
+def paired_z(leader, candidate):
+    """How many standard errors the leader is ahead of the candidate, on the stacks both played"""
+    differences = [leader.scores[stack] - candidate.scores[stack] for stack in candidate.scores if stack in leader.scores]
+    count = len(differences)
+    if count < 2:
+        return 0.0
+    mean = sum(differences)/count
+    variance = sum((difference - mean)**2 for difference in differences)/(count - 1)
+    if variance == 0:
+        return math.inf if mean > 0 else 0.0
+    return mean/math.sqrt(variance/count)
+
+def optimize(sim_settings, policies=DEFAULT_POLICIES, objective="money", batch=256, max_stacks=10000,
+             z=3.0, min_stacks=512, workers=None, seed=0, on_batch=None):
+    """Races the bet policies and returns their reports, best first. Policies still in the race
+    after `max_stacks` stacks each (or the last one left) are the winners (dropped_after is None).
+    Testing after every batch makes false drops more likely than a single test would, hence the
+    conservative default `z`; no policy is dropped before `min_stacks` stacks."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    sim_settings = blackjack.Settings.from_dict(sim_settings)
+    candidates = [Candidate(policy, sim_settings) for policy in dict.fromkeys(policies)] # Settings check the policies
+    played = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        while played < max_stacks:
+            alive = [candidate for candidate in candidates if candidate.dropped is None]
+            if len(alive) == 1:
+                break
+            stacks = list(range(played, min(played + batch, max_stacks)))
+            tasks = [stacks[start:start + montecarlo.STACKS_PER_TASK] for start in range(0, len(stacks), montecarlo.STACKS_PER_TASK)]
+            futures = {executor.submit(score_stacks, candidate.settings, seed, task, objective): candidate
+                       for candidate in alive for task in tasks}
+            for future in as_completed(futures):
+                candidate = futures[future]
+                for stack, score, money, bankrupt, seats in future.result():
+                    candidate.scores[stack] = score
+                    candidate.money += money
+                    candidate.bankrupt += bankrupt
+                    candidate.seats += seats
+            played = stacks[-1] + 1
+            if played >= min_stacks:
+                leader = max(alive, key=lambda candidate: candidate.mean)
+                for candidate in alive:
+                    if candidate is not leader and paired_z(leader, candidate) > z:
+                        candidate.dropped = played
+            if on_batch:
+                on_batch(played, [candidate for candidate in candidates if candidate.dropped is None])
+    # Winners first, then by how long they lasted and their score
+    ranked = sorted(candidates, key=lambda candidate: (candidate.dropped is None, candidate.dropped or 0, candidate.mean),
+                    reverse=True)
+    return [candidate.report() for candidate in ranked]
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Finds the best CPU bet policy, dropping the bad ones early.")
+    parser.add_argument("policies", nargs="*", default=DEFAULT_POLICIES,
+                        help="bet policies to try, like the CPU_bets setting (default: a grid of every kind)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="money",
+                        help="average final money, or share of seats that don't go bankrupt (default: money)")
+    parser.add_argument("--batch", type=int, default=256, help="stacks every policy plays between tests (default: 256)")
+    parser.add_argument("--max-stacks", type=int, default=10000, help="most stacks any policy plays (default: 10000)")
+    parser.add_argument("--min-stacks", type=int, default=512, help="stacks played before dropping any policy (default: 512)")
+    parser.add_argument("--z", type=float, default=3.0, help="standard errors behind the leader to be dropped (default: 3)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--seed", default="0", help="master seed")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting, e.g. --set CPU_difficulty=hard")
+    options = parser.parse_args(args)
+    try:
+        sim_settings = blackjack.load_settings().replace(**montecarlo.parse_overrides(options.set))
+        for policy in options.policies:
+            sim_settings.replace(CPU_bets=policy)
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    def on_batch(played, alive):
+        print(f"{played} stacks: {len(alive)} left ({', '.join(candidate.policy for candidate in alive)})", file=sys.stderr)
+    reports = optimize(sim_settings, options.policies, options.objective, options.batch, options.max_stacks,
+                       options.z, options.min_stacks, options.workers, options.seed, on_batch)
+    for report in reports:
+        status = "still in" if report["dropped_after"] is None else f"dropped after {report['dropped_after']} stacks"
+        print(f"{report['policy']:>20}: {options.objective} {report['score']:.4f} | average money ${report['average_money']:.2f} | "
+              f"bust rate {report['bust_rate']:.2%} | {report['stacks']} stacks, {status}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -4,7 +4,8 @@ import os                   # For saving/loading and clearscreen
 import random               # For randomness!
 import math                 # To round up the floats
 import json                 # For saving/loading
-from pygame import mixer    # For music
+import time                 # For timing simulations
+import hashlib              # For deriving random streams from a seed
 import webbrowser           # For opening the rules page
 
 # Title graphic
@@ -23,6 +24,8 @@ TITLE_GRAPHIC = ("""
 """)
 # Game related values
 CARD_TYPES = ["A", 2, 3, 4, 5, 6, 7, 8, 9, 10, "J", "Q", "K"] # All the values a card can take
+CARD_CODES = {card: code for code, card in enumerate(CARD_TYPES)}   # Card code (as used by the Shoe) of each card
+CARD_VALUES = {"A": 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9, 10: 10, "J": 10, "Q": 10, "K": 10} # Aces count as 1 here
 DEFAULT_SETTINGS = {
     "stacks":           2, # number of card stacks
     "num_decks":        6, # number of decks in each stack
@@ -38,64 +41,101 @@ DEFAULT_SETTINGS = {
     "detailed_scores": True,    # True to show round results on the score
     "autopause":    True,       # Pause at the end of CPU turns and
     "bgm_volume":   30,            # BGM Volume
-    "CPU_difficulty":   "easy"  # CPU difficulty (easy or hard)
+    "CPU_difficulty":   "easy", # CPU difficulty (easy or hard, or the path to a strategy chart)
+    "CPU_bets":         "quarter",  # How CPUs bet (see get_bet_policy)
+    "rules":            "s17,das,double:9-11",  # Table rules (see get_rules)
+    "verbosity":        3       # Output when only CPUs play: 0 silent, 1 final scores, 2 round results, 3 every card
 }
 # Special thanks to ChatGPT, which gave me these names for a "high stakes blackjack tournament in a neo-noir spy film"
 DEFAULT_CPU_NAMES = ["Victor Davenport", "Isabella Sinclair", "Maximilian St. Clair", "Gabrielle Duval", "Jonathan Beaumont", 
 "Penelope Harrington", "Sebastian von Braun", "Arabella Kensington", "Xavier Moncrief", "Seraphina Rossi", "Alexander Whitaker",
 "Celeste Van der Linde", "Hugo Belmont", "Genevieve Fontaine", "Lucas Sinclair", "Cordelia Beaumont", "Nicholas Ashford", 
 "Vivienne Carmichael","Nathaniel Devereaux","Olivia Fontaine"]
+# Hand results
+LOSS        = -1
+DRAW        = 0
+WIN         = 1
+BLACKJACK   = 2
+SURRENDERED = -2    # Half the bet back
+hand_history = None # Hand history writer that logs every round (see hand_history.py), if any
+checkpoints = None  # Checkpointer that saves the table between rounds (see checkpoint.py), if any
+metrics = None      # Live metrics counted every round (see metrics.py), if any
+decision_log = None # Decision dataset writer that records every decision (see decision_dataset.py), if any
+cpu_random = random # Random source for CPU names and decisions (a seeded stream per stack in seeded simulations)
+audio = None # Audio backend (anything with queue_song and set_volume methods), made on first use by get_audio()
 
 ### PLAYER CLASSES AND PLAYER FUNCTIONS #######
 class Player:
     """For both CPU and human-controlled players."""
+    human = False   # True for the players the game asks for their decisions
+    __slots__ = ("money", "name", "bankruptcy", "round_results", "rounds_played", "blackjacks", "won", "drawn",
+                 "lost", "history", "decisions", "hands", "hand_id", "hand", "bet")
     def __init__(self, money, name):
         self.money      = money     # Amount of money a player currently has
         self.name       = name      # Name of a player
         self.bankruptcy  = False     # For determining if a player is still playing
-        self.results    = []      # Store the results for each round
-        self.hands      = [[]]      # Hands for each player (more than one if player splits pairs)
+        self.round_results = [DRAW] # Result of each hand in the current round
+        self.rounds_played = 0      # Rounds the player has been dealt in
+        self.blackjacks = 0         # Hands won with a blackjack
+        self.won        = 0         # Hands won (without blackjack)
+        self.drawn      = 0         # Hands drawn
+        self.lost       = 0         # Hands lost
+        self.history    = None      # Optional sink for every round's results (anything with an append method)
+        self.decisions  = None      # Optional list of this round's decisions: "P"split, "D"ouble, "R"surrender, "H"it, "S"tand
+        self.hands      = [Hand()]  # Hands for each player (more than one if player splits pairs)
         self.hand_id    = 0         # Index for the hand the player is currently playing
         self.hand       = self.hands[self.hand_id] # The current hand for the player
         self.bet        = [0]         # Bet for current hand
     def check_bankrupcy(self):
         """Kick player if they don't have enough money to bet"""
-        if self.money < settings["minimum_bet"] and not self.bankruptcy: 
+        if self.money < settings.minimum_bet and not self.bankruptcy: 
             self.bankruptcy = True
-            if isinstance(self, Human_Player) or settings["autopause"]:
+            if output.level < ROUNDS:
+                return
+            if isinstance(self, Human_Player) or settings.autopause:
                 wait_for_player_input(f"{self.name} ran out of money! Better luck next time!\n")
             else:
-                print(f"{self.name} ran out of money! Better luck next time!\n")
+                output.show(f"{self.name} ran out of money! Better luck next time!\n")
+    def result_counts(self):
+        """Returns how many hands the player got a blackjack, won, drew and lost"""
+        return {"blackjacks": self.blackjacks, "won": self.won, "drawn": self.drawn, "lost": self.lost}
     def detailed_scores(self):
-        _rounds_drawn = 0
-        _rounds_won = 0
-        _blackjacks = 0
-        _rounds_lost = 0
-        for round_results in self.results:
-            for hand_result in round_results:
-                if hand_result == 0: # Draw
-                    _rounds_drawn += 1
-                elif hand_result == 1: # Win
-                    _rounds_won += 1
-                elif hand_result == "bj": # Blackjack
-                    _blackjacks += 1
-                else: # | || || |_
-                    _rounds_lost += 1
-        total_hands = _rounds_drawn+ _rounds_won + _blackjacks + _rounds_lost
-        return f"Blackjacks: {_blackjacks} | Won: {_rounds_won} | Drawn: {_rounds_drawn} | Lost: {_rounds_lost} | Total rounds: {len(self.results)} | Total hands: {total_hands}"
+        total_hands = self.blackjacks + self.won + self.drawn + self.lost
+        return f"Blackjacks: {self.blackjacks} | Won: {self.won} | Drawn: {self.drawn} | Lost: {self.lost} | Total rounds: {self.rounds_played} | Total hands: {total_hands}"
+    def log_decision(self, decision):
+        """Records a decision (as in decisions) before it's played, for the hand history and the decision dataset"""
+        if self.decisions is not None:
+            self.decisions.append(decision)
+        if decision_log is not None:
+            decision_log.append(self, decision, self.human)
     def double_down(self, dealing_cards):
         '''Gives you one card, doubles your bet'''
-        print(f"{self.name} doubles down.")             
-        self.hand.append(dealing_cards.pop(0))
+        if output.level >= CARDS:
+            output.show(f"{self.name} doubles down.")
+        self.log_decision("D")
+        self.hand.append(dealing_cards.deal())
         self.money -= self.bet[self.hand_id]
         self.bet[self.hand_id] += self.bet[self.hand_id]
+        if self.hand.total > 21: # Only possible when doubling down on more than 11
+            self.round_results[self.hand_id] = LOSS
+            if output.level >= CARDS:
+                output.show(f"{self.name} busted!")
+        return True
+    def surrender(self):
+        '''Gives up the hand, half the bet is paid back with the other results'''
+        if output.level >= CARDS:
+            output.show(f"{self.name} surrenders.")
+        self.log_decision("R")
+        self.round_results[self.hand_id] = SURRENDERED
         return True
     def split_pairs(self):
-        print(f"{self.name} splits pairs.")
+        if output.level >= CARDS:
+            output.show(f"{self.name} splits pairs.")
+        self.log_decision("P")
         self.money -= self.bet[self.hand_id]
         self.bet.append(self.bet[self.hand_id])
-        self.results[-1].append(0)
-        self.hands.append([self.hands[self.hand_id].pop(0)]) # Appends new hand with the second player card
+        self.round_results.append(DRAW)
+        self.hands.append(self.hands[self.hand_id].split()) # Appends new hand with the second player card
         self.hand_id -= 1 # "Flag" to not increment hand_id at end of turn
     def deal_two_cards(self, dealing_cards):
         """Deal two cards to a player"""
@@ -103,9 +143,10 @@ class Player:
         if self.bankruptcy:
             return
         for card in range(2):                
-            self.hand.append(dealing_cards.pop(0))
-        # Initialize player.results' new element for each round
-        self.results.append([0])  # Starts as a draw
+            self.hand.append(dealing_cards.deal())
+        # Initialize the results for this round
+        self.round_results = [DRAW]  # Starts as a draw
+        self.rounds_played += 1
     def payout(self):
         # Payout time
         if self.bankruptcy:
@@ -113,142 +154,182 @@ class Player:
         # (bj_mul+1)*bet if Blackjack / 2*bet Win / 1*bet Draw / 0*bet Loss
         winnings = 0
         for hand in range(len(self.hands)):
-            hand_result = self.results[-1][hand]
+            hand_result = self.round_results[hand]
             # +1 to recover initial bet
-            if hand_result == "bj": # Blackjack
-                hand_winnings = self.bet[hand] * (settings["blackjack_multiplier"] + 1)
-            elif hand_result == 1: # Win
+            if hand_result == BLACKJACK:
+                hand_winnings = self.bet[hand] * (settings.blackjack_multiplier + 1)
+                self.blackjacks += 1
+            elif hand_result == WIN:
                 hand_winnings = self.bet[hand] * 2
-            elif hand_result == 0: # Draw
+                self.won += 1
+            elif hand_result == DRAW:
                 hand_winnings = self.bet[hand]
+                self.drawn += 1
+            elif hand_result == SURRENDERED:
+                hand_winnings = self.bet[hand] / 2
+                self.lost += 1
             else: # Loss
                 hand_winnings = 0
+                self.lost += 1
             winnings += hand_winnings
         self.money += winnings  # Update before winnings_text
+        if self.history is not None:
+            self.history.append(tuple(self.round_results))
+        if output.level < ROUNDS:
+            return
         winnings_text = f"{self.name}'s winnings: ${winnings} Total: ${self.money}"
-        print(winnings_text)
+        output.show(winnings_text)
     def reinitialize_hands(self):
-        self.hands = [[]]
+        self.hands = [Hand()]
         self.hand_id = 0
         self.hand = self.hands[self.hand_id]
 
 class Human_Player(Player):
+    __slots__ = ()
+    human = True
     def set_name(self, cpu_names):
         """Input name for a human player"""
-        if settings["names_human"]:
+        if settings.names_human:
+            output.flush()
             _name = input(f"Input the name for {self.name}: ")
             self.name = _name or self.name
     def make_bets(self, minimum_bet, maximum_bet):
         """Bets for human players"""
+        answer_prompts(self.bet_prompts(minimum_bet, maximum_bet))
+    def bet_prompts(self, minimum_bet, maximum_bet):
+        """make_bets as a generator of (player, prompt) that gets sent the answers"""
         if self.bankruptcy:
             return                            
         # Making bets (human)
         self.bet = [0]
-        print(f"{self.name}, how much do you want to bet?\nYou have: ${math.floor(self.money)}\
+        output.show(f"{self.name}, how much do you want to bet?\nYou have: ${math.floor(self.money)}\
                 \nMinimum: ${minimum_bet} Maximum: ${maximum_bet}")
         while True:
-            selection = wait_for_player_input("")
+            selection = yield self, ""
+            if self.bankruptcy: # Left the table
+                return
             try:
                 self.bet[0] = int(selection)
                 if self.bet[0] < minimum_bet:
-                    print(f"The minimum bet amount is ${minimum_bet}")
+                    output.show(f"The minimum bet amount is ${minimum_bet}")
                 elif self.bet[0] > maximum_bet:
-                    print(f"The maximum bet amount is ${maximum_bet}")
+                    output.show(f"The maximum bet amount is ${maximum_bet}")
                 elif self.bet[0] > self.money:
-                    print("You don't have enough money!")
+                    output.show("You don't have enough money!")
                 else:
-                    print(f"{self.name} bets ${self.bet[0]}")
+                    output.show(f"{self.name} bets ${self.bet[0]}")
                     self.money -= self.bet[0]
                     break
             except ValueError:
-                    print("Invalid amount (only numbers, no symbols or letters)")
+                    output.show("Invalid amount (only numbers, no symbols or letters)")
     def split_pairs_logic(self):
+        """Asks to split pairs (a generator of prompts like bet_prompts), returns True on splitting"""
         # TODO: Add payout and round results logic, make it work with multiple hands
         if self.money < self.bet[self.hand_id]: # We check that the player has enough money to split
             return False
-        print("Do you want to split pairs? (y/n)")
-        player_choice = str(wait_for_player_input(f"Your money: ${self.money} Your bet: ${self.bet[self.hand_id]}\n")).lower()
+        output.show("Do you want to split pairs? (y/n)")
+        player_choice = str((yield self, f"Your money: ${self.money} Your bet: ${self.bet[self.hand_id]}\n")).lower()
         if player_choice in ["y", "yes", "3"]:
             self.split_pairs()
             return True
         else:
-            wait_for_player_input(f"{self.name} does not split pairs.")
+            yield self, f"{self.name} does not split pairs."
             return False
-    def turn(self, dealing_cards):
+    def turn(self, dealing_cards, rules=None):
         '''Player turn logic'''
+        answer_prompts(self.turn_prompts(dealing_cards, rules))
+    def turn_prompts(self, dealing_cards, rules=None):
+        """turn as a generator of (player, prompt) that gets sent the answers"""
         if self.bankruptcy:
             return
+        rules = rules or get_rules(settings.rules)
         turn_num = 0
         while self.hand_id <= (len(self.hands) - 1):
             self.hand = self.hands[self.hand_id] # Refresh hand value
             if turn_num == 0:
-                print(f"-{self.name}'s turn-")
+                output.show(f"-{self.name}'s turn-")
             else:
-                print(f"-{self.name}'s {turn_num}{ordinal(turn_num)} hand-")
+                output.show(f"-{self.name}'s {turn_num}{ordinal(turn_num)} hand-")
             if len(self.hand) >= 2: # Don't print when we only got one card
-                print(f"Your hand: {self.hand} (Total: {total_up(self.hand)})")
+                output.show(f"Your hand: {self.hand} (Total: {self.hand.total})")
             # Checking for blackjack
             if len(self.hands) == 1: # Only can get Blackjack on the first dealing
-                if total_up(self.hand) == 21:
-                    self.results[-1][0] = "bj"
-                    wait_for_player_input(f"{self.name} got a blackjack!")
+                if self.hand.total == 21:
+                    self.round_results[0] = BLACKJACK
+                    yield self, f"{self.name} got a blackjack!"
                     break          
+            # Late surrender (only on the first two cards, so before splitting)
+            if rules.surrender and len(self.hands) == 1:
+                output.show("Do you want to surrender (half your bet back)? (y/n)")
+                player_choice = str((yield self, f"Your money: ${self.money} Your bet: ${self.bet[self.hand_id]}\n")).lower()
+                if player_choice in ["y", "yes"]:
+                    self.surrender()
+                    yield self, ""
+                    break
             # Checking for split pairs
-            if self.hand == ["A"]: # After splitting aces you only get one card
-                self.hand.append(dealing_cards.pop(0))
-                wait_for_player_input(f"Your hand: {self.hand} (Total: {total_up(self.hand)})")
+            if self.hand.aces == len(self.hand) == 1: # After splitting aces you only get one card
+                self.hand.append(dealing_cards.deal())
+                yield self, f"Your hand: {self.hand} (Total: {self.hand.total})"
                 self.hand_id += 1           # We skipping the rest of the turn
                 turn_num = self.hand_id + 1 # so we have to increase counter here too
                 continue
             ################                  
             # Dealing loop #
             ################
-            while total_up(self.hand) < 21:                
+            while self.hand.total < 21:                
                 if len(self.hand) == 1: # Always gives you a card if you only have one
-                    self.hand.append(dealing_cards.pop(0))
-                    print(f"Your hand: {self.hand} (Total: {total_up(self.hand)})")
-                    if total_up(self.hand) == 21: # Auto-stand if on 21
-                        wait_for_player_input(f"{self.name} stands.")
+                    self.hand.append(dealing_cards.deal())
+                    output.show(f"Your hand: {self.hand} (Total: {self.hand.total})")
+                    if self.hand.total == 21: # Auto-stand if on 21
+                        yield self, f"{self.name} stands."
                         break
                 # Splitting pairs
-                if len(self.hand) == 2 and self.hand[0] == self.hand[1]:
-                     if self.split_pairs_logic(): #Skip rest of dealing if splitting pairs
+                if self.hand.pair and len(self.hands) < rules.max_hands:
+                     if (yield from self.split_pairs_logic()): #Skip rest of dealing if splitting pairs
                         break
                 # Doubling Down
-                if total_up(self.hand) in [9, 10, 11] and len(self.hand) == 2 and (self.money >= self.bet[self.hand_id]):
-                    print("Do you want to double down? (y/n)")
-                    player_choice = str(wait_for_player_input(f"Your money: ${self.money} Your bet: ${self.bet[self.hand_id]}\n")).lower()
+                if rules.can_double[len(self.hands) > 1][self.hand.total] and len(self.hand) == 2 and (self.money >= self.bet[self.hand_id]):
+                    output.show("Do you want to double down? (y/n)")
+                    player_choice = str((yield self, f"Your money: ${self.money} Your bet: ${self.bet[self.hand_id]}\n")).lower()
                     if player_choice in ["y", "yes", "3"]:
                         self.double_down(dealing_cards)
-                        wait_for_player_input(f"Your hand: {self.hand} (Total: {total_up(self.hand)})")
+                        yield self, f"Your hand: {self.hand} (Total: {self.hand.total})"
                         break
-                    print(f"{self.name} does not double down.")                       
+                    output.show(f"{self.name} does not double down.")                       
                 # Hit or stand
-                player_choice = str(wait_for_player_input("(H)it or (S)tand?\n")).lower()
+                player_choice = str((yield self, "(H)it or (S)tand?\n")).lower()
+                self.log_decision("H" if player_choice in ["h", "hit", "3"] else "S")
                 if player_choice in ["h", "hit", "3"]:
-                    self.hand.append(dealing_cards.pop(0))
-                    print(f"Your hand: {self.hand} (Total: {total_up(self.hand)})")
-                    if total_up(self.hand) == 21: # Auto-stand if on 21
-                        wait_for_player_input(f"{self.name} stands.")
+                    self.hand.append(dealing_cards.deal())
+                    output.show(f"Your hand: {self.hand} (Total: {self.hand.total})")
+                    if self.hand.total == 21: # Auto-stand if on 21
+                        yield self, f"{self.name} stands."
                         break
-                    if total_up(self.hand) > 21:
-                        self.results[-1][self.hand_id] = -1
-                        wait_for_player_input(f"\n{self.name} busted!")
+                    if self.hand.total > 21:
+                        self.round_results[self.hand_id] = LOSS
+                        yield self, f"\n{self.name} busted!"
                         break
                 else:
-                    wait_for_player_input(f"{self.name} stands.")
+                    yield self, f"{self.name} stands."
                     break
             self.hand_id += 1 # Increment the hand ID count at the end of the turn
             turn_num = self.hand_id + 1
-        print("")
+        output.show("")
     
 class CPU_Player(Player):
+    __slots__ = ("strategy", "bet_policy", "last_bet")
+    def __init__(self, money, name, strategy=None, bet_policy=None):
+        super().__init__(money, name)
+        self.strategy = strategy    # Strategy table (None to use the CPU difficulty setting)
+        self.bet_policy = bet_policy    # Bet policy (None to use the CPU bets setting)
+        self.last_bet = 0           # Bet the CPU started the last round with
     def set_name(self, cpu_names):
         """Input name for an AI player"""
-        if settings["names_ai"]:
-                if settings["autoname"]:
-                    self.name = random.choice(cpu_names)
+        if settings.names_ai:
+                if settings.autoname:
+                    self.name = cpu_random.choice(cpu_names)
                 else:
+                    output.flush()
                     _name = input(f"Input the name for {self.name}: ")
                     self.name = _name or self.name
     def make_bets(self, minimum_bet, maximum_bet):
@@ -256,175 +337,484 @@ class CPU_Player(Player):
         if self.bankruptcy:
             return 
         # Making bets (CPU)
-        # CPU bets half their money, respecting min/max bets
+        # CPU bets what their bet policy says (a quarter of their money by default), respecting min/max bets
+        bet_policy = self.bet_policy or get_bet_policy(settings.CPU_bets)
         self.bet = [0]
-        self.bet[0] = int(min(maximum_bet,max(self.money/4, minimum_bet)))
-        print(f"{self.name} bets ${self.bet[0]}.")
+        self.bet[0] = int(min(maximum_bet, self.money, max(bet_policy(self, minimum_bet, maximum_bet), minimum_bet)))
+        self.last_bet = self.bet[0]
         self.money -= self.bet[0]
-    def double_down_logic(self, dealing_cards, dealer_hand):
-        if settings["CPU_difficulty"] == "easy": # On easy difficulty we only split aces or 8s
-            if total_up(self.hand) in [10, 11]:
-                return self.double_down(dealing_cards)
-        else:
-            if total_up(self.hand) == 9 and dealer_hand[0] in range(3, 7):
-                return self.double_down(dealing_cards)
-            if total_up(self.hand) == 10 and dealer_hand[0] in range(2, 10):
-                return self.double_down(dealing_cards)
-            if total_up(self.hand) == 11 and dealer_hand[0] != 'A':
-                return self.double_down(dealing_cards)
+        if output.level >= CARDS:
+            output.show(f"{self.name} bets ${self.bet[0]}.")
+    def double_down_logic(self, dealing_cards, action):
+        if action & DOUBLE:
+            return self.double_down(dealing_cards)
         return False
-    def split_pairs_logic(self, dealer_hand):
+    def split_pairs_logic(self, action):
         if self.money < self.bet[self.hand_id]: # We check that the player has enough money to split
             return False
-        if total_up(self.hand) in [20, 10]: # Never split 10s or 5s
-            return False
-        if self.hand == ['A', 'A'] or total_up(self.hand) == 16: # Always split aces or 8s
+        if action & SPLIT:
             self.split_pairs()
             return True
-        if settings["CPU_difficulty"] == "easy": # On easy difficulty we only split aces or 8s
-            return False
-        elif settings["CPU_difficulty"] == "hard":
-            if total_up(self.hand) == 18 and not dealer_hand[0] in [7, 10, 'J', 'Q', 'K', 'A']: # Split 9s if dealer card is not 7, 10 or Ace #TODO CHECK THIS ISNT PROBLEMATIC DETECTING ACES
-                self.split_pairs()
-                return True
-            elif total_up(self.hand) in [4, 6, 14] and dealer_hand[0] in range(2, 8): # Split 2s, 3s or 7s if dealer card is poor
-                self.split_pairs()
-                return True
-            elif total_up(self.hand) == 12 and dealer_hand[0] in range(2, 7): # Split 6s if dealer card is poorer
-                self.split_pairs()
-                return True
-            elif total_up(self.hand) == 8 and dealer_hand[0] in [5, 6]: # Split 4s if dealer card is poorest
-                self.split_pairs()
-                return True
-            return False
-    def hit_or_stand_logic(self, dealer_hand):
+        return False
+    def surrender_logic(self, action):
+        if action & SURRENDER:
+            return self.surrender()
+        return False
+    def hit_or_stand_logic(self, action):
         '''Returns True for hitting, False for standing'''
-        hand = self.hand
-        if settings["CPU_difficulty"] == "easy": # Easy difficulty logic
-            if ((random.random() >= 0.35) or total_up(hand) <= 11) and (total_up(hand) <= 17):
-                return True
-            return False
-        # -Hard difficulty logic-
-        # Soft hands
-        if is_soft(hand):
-            if total_up(hand) <= 17:
-                return True
-            if total_up(hand) == 18:
-                if dealer_hand[0] in [2, 7, 8]:
-                    return False
-                return True
-            return False
-        # Hard hands
-        if total_up(hand) == 12 and dealer_hand[0] in [4, 5, 6]:
-            return False
-        if total_up(hand) in range(13, 17) and dealer_hand[0] in range(2, 7):
-            return False
-        if total_up(hand) >= 17:
-            return False
-        return True
-    def turn(self, dealing_cards, dealer_hand):
+        if action & HIT_SOMETIMES: # Easy CPUs hit 65% of the time
+            return cpu_random.random() >= 0.35
+        return bool(action & HIT)
+    def turn(self, dealing_cards, dealer_hand, rules=None):
         '''CPU turn logic'''
         if self.bankruptcy:
             return
+        strategy = self.strategy or get_strategy(settings.CPU_difficulty)
+        rules = rules or get_rules(settings.rules)
+        up_card = CARD_VALUES[dealer_hand[0]]
         turn_num = 0
         while self.hand_id <= (len(self.hands) - 1):
             self.hand = self.hands[self.hand_id] # Refresh hand value
-            if turn_num == 0:
-                print(f"-{self.name}'s turn-")
-            else:
-                print(f"-{self.name}'s {turn_num}{ordinal(turn_num)} hand-")
-            if len(self.hand) >= 2: # Don't print when we only got one card
-                print(f"{self.name}'s hand: {self.hand} (Total: {total_up(self.hand)})")
+            if output.level >= CARDS:
+                if turn_num == 0:
+                    output.show(f"-{self.name}'s turn-")
+                else:
+                    output.show(f"-{self.name}'s {turn_num}{ordinal(turn_num)} hand-")
+                if len(self.hand) >= 2: # Don't print when we only got one card
+                    output.show(f"{self.name}'s hand: {self.hand} (Total: {self.hand.total})")
             # Checking for blackjack
             if len(self.hands) == 1: # Only can get Blackjack on the first dealing
-                if total_up(self.hand) == 21:
-                    self.results[-1][0] = "bj"
-                    print(f"{self.name} got a blackjack!")
+                if self.hand.total == 21:
+                    self.round_results[0] = BLACKJACK
+                    if output.level >= CARDS:
+                        output.show(f"{self.name} got a blackjack!")
                     break          
+            # Late surrender (only on the first two cards, so before splitting)
+            if rules.surrender and len(self.hands) == 1:
+                if self.surrender_logic(strategy[strategy_index(self.hand, up_card)]):
+                    break
             # Checking for split pairs
-            if self.hand == ["A"]: # After splitting aces you only get one card
-                self.hand.append(dealing_cards.pop(0))
-                print(f"{self.name}'s hand: {self.hand} (Total: {total_up(self.hand)})")
+            if self.hand.aces == len(self.hand) == 1: # After splitting aces you only get one card
+                self.hand.append(dealing_cards.deal())
+                if output.level >= CARDS:
+                    output.show(f"{self.name}'s hand: {self.hand} (Total: {self.hand.total})")
                 self.hand_id += 1           # We skipping the rest of the turn
                 turn_num = self.hand_id + 1 # so we have to increase counter here too
                 continue
             ################                  
             # Dealing loop #
             ################
-            while total_up(self.hand) < 21:                
+            while self.hand.total < 21:                
                 if len(self.hand) == 1: # Always gives you a card if you only have one
-                    self.hand.append(dealing_cards.pop(0))
-                    print(f"{self.name}'s hand: {self.hand} (Total: {total_up(self.hand)})")
-                    if total_up(self.hand) == 21: # Auto-stand if on 21
-                        print(f"{self.name} stands.")
+                    self.hand.append(dealing_cards.deal())
+                    if output.level >= CARDS:
+                        output.show(f"{self.name}'s hand: {self.hand} (Total: {self.hand.total})")
+                    if self.hand.total == 21: # Auto-stand if on 21
+                        if output.level >= CARDS:
+                            output.show(f"{self.name} stands.")
                         break
+                action = strategy[strategy_index(self.hand, up_card)] # Split/double/hit flags for this hand
                 # Splitting pairs
-                if len(self.hand) == 2 and self.hand[0] == self.hand[1]:
-                    if self.split_pairs_logic(dealer_hand): # Skip rest of dealing if splitting pairs                        
+                if self.hand.pair and len(self.hands) < rules.max_hands:
+                    if self.split_pairs_logic(action): # Skip rest of dealing if splitting pairs                        
                         break
                 # Doubling Down
-                if total_up(self.hand) in [9, 10, 11] and len(self.hand) == 2 and (self.money >= self.bet[self.hand_id]):
-                    if self.double_down_logic(dealing_cards, dealer_hand): # Skip rest of dealing if doubling down
-                        print(f"{self.name}'s hand: {self.hand} (Total: {total_up(self.hand)})")
+                if rules.can_double[len(self.hands) > 1][self.hand.total] and len(self.hand) == 2 and (self.money >= self.bet[self.hand_id]):
+                    if self.double_down_logic(dealing_cards, action): # Skip rest of dealing if doubling down
+                        if output.level >= CARDS:
+                            output.show(f"{self.name}'s hand: {self.hand} (Total: {self.hand.total})")
                         break                        
                 # Hit or stand
-                if self.hit_or_stand_logic(dealer_hand):
-                    print(f"{self.name} hits.")
-                    self.hand.append(dealing_cards.pop(0))
-                    print(f"{self.name}'s hand: {self.hand} (Total: {total_up(self.hand)})")
-                    if total_up(self.hand) == 21: # Auto-stand if on 21
-                        print(f"{self.name} stands.")
+                hit = self.hit_or_stand_logic(action)
+                self.log_decision("H" if hit else "S")
+                if hit:
+                    self.hand.append(dealing_cards.deal())
+                    if output.level >= CARDS:
+                        output.show(f"{self.name} hits.")
+                        output.show(f"{self.name}'s hand: {self.hand} (Total: {self.hand.total})")
+                    if self.hand.total == 21: # Auto-stand if on 21
+                        if output.level >= CARDS:
+                            output.show(f"{self.name} stands.")
                         break
-                    if total_up(self.hand) > 21:
-                        self.results[-1][self.hand_id] = -1
-                        print(f"\n{self.name} busted!")
+                    if self.hand.total > 21:
+                        self.round_results[self.hand_id] = LOSS
+                        if output.level >= CARDS:
+                            output.show(f"\n{self.name} busted!")
                         break
                 else:
-                    print(f"{self.name} stands.")
+                    if output.level >= CARDS:
+                        output.show(f"{self.name} stands.")
                     break
             self.hand_id += 1 # Increment the hand ID count at the end of the turn
             turn_num = self.hand_id + 1
-        print("")
+        if output.level >= CARDS:
+            output.show("")
 
 def create_players(players_human, players_ai, starting_money):
     """Creates the requested number of human and AI players."""
     players = []
+    strategy = get_strategy(settings.CPU_difficulty) # Resolved once for the whole game
+    bet_policy = get_bet_policy(settings.CPU_bets)
     for player in range(players_human):
         players.append(Human_Player(starting_money, f"Player {player+1}"))
     for player in range(players_ai):
-        players.append(CPU_Player(starting_money, f"CPU {player+1}"))
+        players.append(CPU_Player(starting_money, f"CPU {player+1}", strategy, bet_policy))
     cpu_names = DEFAULT_CPU_NAMES
-    if settings["autoname"]: # Load CPU name list if the setting is on
-        if os.path.exists('names.txt'):
-            with open('names.txt') as file:
-                data = file.read()
-                cpu_names = data.split("\n")
+    if settings.autoname: # Load CPU name list if the setting is on
+        cpu_names = load_cpu_names()
     for player in players:
         player.set_name(cpu_names)
     return players
+def load_cpu_names():
+    """Names for the CPU players, from names.txt if there is one"""
+    if os.path.exists('names.txt'):
+        with open('names.txt') as file:
+            data = file.read()
+            return data.split("\n")
+    return DEFAULT_CPU_NAMES
 def reinitialize_player_hands(players):
     for player in players:
         player.reinitialize_hands()
 
+### CPU STRATEGY #######
+# CPU decisions are looked up in a table with one entry per (pair card, soft hand, total, dealer's card).
+# Each entry has a flag for every action the CPU wants to take, in the order they are checked.
+STAND           = 0
+HIT             = 1
+DOUBLE          = 2   # Double down if allowed (the hit flag says what to do otherwise)
+SPLIT           = 4   # Split pairs if there's money for it
+HIT_SOMETIMES   = 8   # Hit 65% of the time
+SURRENDER       = 16  # Surrender if the rules allow it (the other flags say what to do otherwise)
+STRATEGY_SIZE   = 11*2*32*11
+CHART_COLUMNS   = [2, 3, 4, 5, 6, 7, 8, 9, 10, 1]   # Dealer's card for each column of a chart (ace last)
+strategies = {} # Compiled strategy tables, by difficulty or chart file
+
+def strategy_index(hand, up_card):
+    """Table index for a hand against the dealer's card value (aces are 1)"""
+    pair_card = hand.hard_total//2 if hand.pair else 0  # Value of the paired cards
+    return ((pair_card*2 + hand.soft)*32 + hand.total)*11 + up_card
+def compile_strategy(action_for):
+    """Builds a strategy table by calling action_for(total, soft, pair_card, up_card) for every entry"""
+    table = bytearray(STRATEGY_SIZE)
+    for pair_card in range(11):
+        for soft in (False, True):
+            for total in range(32):
+                for up_card in range(1, 11):
+                    table[((pair_card*2 + soft)*32 + total)*11 + up_card] = action_for(total, soft, pair_card, up_card)
+    return bytes(table)
+def easy_action(total, soft, pair_card, up_card):
+    action = STAND
+    if pair_card in (1, 8): # On easy difficulty we only split aces or 8s
+        action |= SPLIT
+    if total in (10, 11):
+        action |= DOUBLE
+    if total <= 11:
+        action |= HIT
+    elif total <= 17:
+        action |= HIT_SOMETIMES
+    return action
+def hard_action(total, soft, pair_card, up_card):
+    action = STAND
+    # Splitting pairs. Never split 10s or 5s, always split aces or 8s
+    if pair_card in (1, 8):
+        action |= SPLIT
+    elif pair_card == 9 and up_card not in (7, 10, 1): # Split 9s if dealer card is not 7, 10 or Ace
+        action |= SPLIT
+    elif pair_card in (2, 3, 7) and 2 <= up_card <= 7: # Split 2s, 3s or 7s if dealer card is poor
+        action |= SPLIT
+    elif pair_card == 6 and 2 <= up_card <= 6: # Split 6s if dealer card is poorer
+        action |= SPLIT
+    elif pair_card == 4 and up_card in (5, 6): # Split 4s if dealer card is poorest
+        action |= SPLIT
+    # Doubling down (soft hands only where the rules allow doubling on any two cards)
+    if (total == 9 and 3 <= up_card <= 6) or (total == 10 and 2 <= up_card <= 9) or (total == 11 and up_card != 1):
+        action |= DOUBLE
+    elif soft and ((total in (13, 14) and up_card in (5, 6)) or (total in (15, 16) and 4 <= up_card <= 6)
+                   or (total in (17, 18) and 3 <= up_card <= 6)):
+        action |= DOUBLE
+    # Late surrender (where the rules allow it): hard 16 against 9, 10 or ace, hard 15 against 10. 8s are split instead.
+    if not soft and pair_card != 8 and ((total == 16 and up_card in (9, 10, 1)) or (total == 15 and up_card == 10)):
+        action |= SURRENDER
+    # Soft hands
+    if soft:
+        if total <= 17 or (total == 18 and up_card not in (2, 7, 8)):
+            action |= HIT
+        return action
+    # Hard hands
+    if total == 12 and up_card in (4, 5, 6):
+        return action
+    if 13 <= total <= 16 and 2 <= up_card <= 6:
+        return action
+    if total < 17:
+        action |= HIT
+    return action
+def load_strategy_chart(path):
+    """Compiles a strategy chart from a JSON file like:
+    {"hard":  {"9": "H D D D D H H H H H", ...},
+     "soft":  {"18": "S Ds Ds Ds Ds S S H H H", ...},
+     "pairs": {"A": "P P P P P P P P P P", "8": ..., ...}}
+    Columns are the dealer's card from 2 to 10, then ace. Actions are H (hit), S (stand),
+    D (double down, otherwise hit), Ds (double down, otherwise stand), Rh (surrender, otherwise
+    hit), Rs (surrender, otherwise stand) and P (split; any other action on a pair row plays the
+    hand by its total). Hands missing from the chart hit below 17.
+    Doubling down and surrendering are still only allowed where the table rules allow them.
+    Raises OSError if it can't be read and ValueError if it isn't a chart like that."""
+    with open(path) as file:
+        chart = json.load(file)
+    actions = {"H": HIT, "S": STAND, "D": DOUBLE | HIT, "Ds": DOUBLE, "Rh": SURRENDER | HIT, "Rs": SURRENDER, "P": SPLIT}
+    rows = {}
+    if not isinstance(chart, dict):
+        raise ValueError(f"{path} is not a strategy chart")
+    for section in ("hard", "soft", "pairs"):
+        if not isinstance(chart.get(section, {}), dict):
+            raise ValueError(f"Bad section {section} in {path}")
+        for row, cells in chart.get(section, {}).items():
+            cells = cells.split() if isinstance(cells, str) else []
+            if len(cells) != len(CHART_COLUMNS) or any(cell not in actions for cell in cells):
+                raise ValueError(f"Bad row {section} {row} in {path}: {' '.join(cells)}")
+            if not (row == "A" or row.isdecimal() and 2 <= int(row) <= 21):
+                raise ValueError(f"Bad row {section} {row} in {path}")
+            key = CARD_VALUES["A"] if row == "A" else int(row)
+            for up_card, cell in zip(CHART_COLUMNS, cells):
+                rows[section, key, up_card] = actions[cell]
+    def action_for(total, soft, pair_card, up_card):
+        action = rows.get(("soft" if soft else "hard", total, up_card), HIT if total < 17 else STAND)
+        if pair_card:
+            action |= rows.get(("pairs", pair_card, up_card), STAND) & SPLIT
+        return action
+    return compile_strategy(action_for)
+def get_strategy(difficulty):
+    """Strategy table for a CPU difficulty ("easy", "hard" or a chart file), compiled once"""
+    if difficulty not in strategies:
+        if difficulty == "easy":
+            strategies[difficulty] = compile_strategy(easy_action)
+        elif difficulty == "hard":
+            strategies[difficulty] = compile_strategy(hard_action)
+        else:
+            strategies[difficulty] = load_strategy_chart(difficulty)
+    return strategies[difficulty]
+
+### CPU BETS #######
+# A bet policy is a function (player, minimum_bet, maximum_bet) -> amount. The amount is then
+# rounded down and kept between the minimum bet and the maximum bet (or the player's money).
+HAND_VARIANCE = 1.3   # Variance of a hand's result, in bets (for Kelly bets)
+bet_policies = {} # Bet policies, by setting value
+
+def quarter_bets(player, minimum_bet, maximum_bet):
+    return player.money/4
+def flat_bets(amount):
+    """Always bets `amount`"""
+    def bet_policy(player, minimum_bet, maximum_bet):
+        return amount
+    return bet_policy
+def fraction_bets(fraction):
+    """Bets a fixed fraction of the player's money"""
+    def bet_policy(player, minimum_bet, maximum_bet):
+        return player.money*fraction
+    return bet_policy
+def kelly_bets(multiplier, edge):
+    """Fractional Kelly: bets `multiplier` times the Kelly fraction (edge/variance) of the player's
+    money, for a player who expects to win `edge` per bet. With no edge, that's the minimum bet."""
+    return fraction_bets(max(0.0, multiplier*edge/HAND_VARIANCE))
+def progression_bets(base, factor):
+    """Bets `base`, times `factor` after every lost round (a martingale with 2), back to `base` after a won one"""
+    def bet_policy(player, minimum_bet, maximum_bet):
+        if not player.last_bet:
+            return base
+        net = sum((result > DRAW) - (result < DRAW) for result in player.round_results)
+        if net < 0:
+            return player.last_bet*factor
+        return base if net > 0 else player.last_bet
+    return bet_policy
+def get_bet_policy(spec):
+    """Bet policy for a CPU bets setting, made once: "quarter" (a quarter of the CPU's money), "flat:AMOUNT",
+    "fraction:FRACTION", "kelly:MULTIPLIER:EDGE" or "progression:BASE:FACTOR". Raises ValueError for anything else."""
+    if spec not in bet_policies:
+        name, *args = spec.split(":")
+        makers = {"flat": (flat_bets, 1), "fraction": (fraction_bets, 1), "kelly": (kelly_bets, 2), "progression": (progression_bets, 2)}
+        if name == "quarter" and not args:
+            bet_policies[spec] = quarter_bets
+        elif name in makers and len(args) == makers[name][1]:
+            numbers = [float(arg) for arg in args]
+            if not all(math.isfinite(number) for number in numbers):
+                raise ValueError(f"Bet policy values must be finite numbers: {spec}")
+            if any(number < 0 for number in numbers):
+                raise ValueError(f"Bet policy values can't be negative: {spec}")
+            bet_policies[spec] = makers[name][0](*numbers)
+        else:
+            raise ValueError(f"Unknown bet policy: {spec}")
+    return bet_policies[spec]
+
+### TABLE RULES #######
+# The rules setting is a comma separated list of:
+#   s17 / h17           the dealer stands / hits on soft 17
+#   das / nodas         doubling down after splitting is allowed / not allowed
+#   double:A-B          doubling down on a first two cards total of A to B (double:any for any two cards)
+#   resplit:N           splitting up to N hands (no limit by default)
+#   surrender           late surrender: half the bet back, only once the dealer hasn't got a blackjack
+# A rule set is compiled once into lookup tables, so turns and the dealer's loop look their
+# decisions up instead of checking every rule on every card.
+rule_sets = {} # Compiled rules, by setting value
+
+class Rules:
+    """Compiled table rules (see get_rules)"""
+    __slots__ = ("spec", "dealer_hits", "can_double", "max_hands", "surrender")
+def compile_rules(spec):
+    """Rules for a rules setting. Raises ValueError for anything it doesn't know."""
+    hits_soft_17, double_after_split, double_range, max_hands, surrender = False, True, (9, 11), math.inf, False
+    for rule in spec.lower().split(","):
+        rule = rule.strip()
+        name, _, value = rule.partition(":")
+        low, _, high = value.partition("-")
+        if rule in ("s17", "h17"):
+            hits_soft_17 = rule == "h17"
+        elif rule in ("das", "nodas"):
+            double_after_split = rule == "das"
+        elif rule == "surrender":
+            surrender = True
+        elif name == "double" and value == "any":
+            double_range = (2, 21)
+        elif name == "double" and low.isdecimal() and high.isdecimal():
+            double_range = (int(low), int(high))
+            if not 2 <= double_range[0] <= double_range[1] <= 21:
+                raise ValueError(f"Double down totals must be from 2 to 21, lowest first: {rule}")
+        elif name == "resplit" and value.isdecimal() and int(value) >= 1:
+            max_hands = int(value)
+        else:
+            raise ValueError(f"Unknown rule: {rule}")
+    rules = Rules()
+    rules.spec = spec
+    # Dealer hits on [soft][total]
+    rules.dealer_hits = tuple(tuple(total < 17 or (soft and hits_soft_17 and total == 17) for total in range(32)) for soft in (False, True))
+    # Hands can double down on [after splitting][total] (of their first two cards)
+    rules.can_double = tuple(tuple(double_range[0] <= total <= double_range[1] and (double_after_split or not after_split) for total in range(32))
+                             for after_split in (False, True))
+    rules.max_hands = max_hands
+    rules.surrender = surrender
+    return rules
+def get_rules(spec):
+    """Compiled Rules for a rules setting ("s17,das,double:9-11" by default), made once"""
+    if spec not in rule_sets:
+        rule_sets[spec] = compile_rules(spec)
+    return rule_sets[spec]
+
 ### SETTINGS MENU FUNCTIONS #######
-def load_settings():
-    # Load settings from a JSON file
-    if os.path.exists('game_blackjack_settings.json'):
-        with open('game_blackjack_settings.json') as file:
-            settings = json.load(file)        
-        # Convert JSON boolean values to Python boolean values
-        for key, value in settings.items():
-            if value in ['false', 'true']:
-                settings[key] = value == 'true' # Key is True if word is true
-        return settings
-    # If no file is found, return default settings
-    settings = DEFAULT_SETTINGS.copy()
+SETTINGS_FILE = 'game_blackjack_settings.json'
+POSITIVE_SETTINGS     = ("stacks", "num_decks", "blackjack_multiplier", "starting_money", "minimum_bet") # Can't be 0 or less
+NOT_NEGATIVE_SETTINGS = ("players_human", "players_ai")
+class SettingsError(ValueError):
+    """A setting with a value the game can't play with"""
+class Settings:
+    """Validated, read-only game settings (missing ones take their DEFAULT_SETTINGS value).
+    Read them as attributes (settings.num_decks), or like a dict (settings.num_decks, dict(settings)),
+    and make changed copies with replace()."""
+    __slots__ = tuple(DEFAULT_SETTINGS)
+    def __init__(self, **values):
+        unknown = set(values) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise SettingsError(f"Unknown setting: {', '.join(sorted(unknown))}")
+        for key, default in DEFAULT_SETTINGS.items():
+            value = values.get(key, default)
+            if isinstance(default, bool):
+                if value in ['false', 'true']: # JSON booleans saved as text
+                    value = value == 'true'
+                if not isinstance(value, bool):
+                    raise SettingsError(f"{key} must be true or false")
+            elif isinstance(default, (int, float)):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise SettingsError(f"{key} must be a number")
+                if not math.isfinite(value): # NaN or infinity (JSON files can have them)
+                    raise SettingsError(f"{key} must be a finite number")
+                if isinstance(default, int):
+                    if value != int(value):
+                        raise SettingsError(f"{key} must be a whole number")
+                    value = int(value)
+                else:
+                    value = float(value)
+            elif isinstance(default, str) and not isinstance(value, str):
+                raise SettingsError(f"{key} must be text")
+            object.__setattr__(self, key, value)
+        for key in POSITIVE_SETTINGS:
+            if self[key] <= 0:
+                raise SettingsError(f"{key} must be more than 0")
+        for key in NOT_NEGATIVE_SETTINGS:
+            if self[key] < 0:
+                raise SettingsError(f"{key} can't be negative")
+        if self.players_human + self.players_ai == 0:
+            raise SettingsError("There has to be at least one player")
+        if self.maximum_bet < self.minimum_bet:
+            raise SettingsError("maximum_bet can't be less than minimum_bet")
+        if not 0 <= self.bgm_volume <= 100:
+            raise SettingsError("bgm_volume must be between 0 and 100")
+        if not SILENT <= self.verbosity <= CARDS:
+            raise SettingsError(f"verbosity must be between {SILENT} and {CARDS}")
+        try:
+            get_strategy(self.CPU_difficulty) # Loads and compiles a chart file now, not in the first CPU turn
+        except (OSError, ValueError) as error:
+            raise SettingsError(f"CPU_difficulty must be easy, hard or a strategy chart file ({error})")
+        try:
+            get_bet_policy(self.CPU_bets)
+        except ValueError as error:
+            raise SettingsError(f"CPU_bets: {error}")
+        try:
+            get_rules(self.rules)
+        except ValueError as error:
+            raise SettingsError(f"rules: {error}")
+    @classmethod
+    def from_dict(cls, values):
+        """Settings from a dict (or Settings, returned as they are)"""
+        if isinstance(values, cls):
+            return values
+        if not isinstance(values, dict) or not all(isinstance(key, str) for key in values):
+            raise SettingsError("Settings must be a mapping of setting names to values")
+        return cls(**values)
+    def replace(self, **changes):
+        """A copy of the settings with some of them changed"""
+        return Settings(**dict(self, **changes))
+    def __setattr__(self, key, value):
+        raise AttributeError("Settings are read-only, use replace()")
+    def __getitem__(self, key):
+        if key not in DEFAULT_SETTINGS:
+            raise KeyError(key)
+        return getattr(self, key)
+    def keys(self):
+        return DEFAULT_SETTINGS.keys()
+    def items(self):
+        return [(key, getattr(self, key)) for key in DEFAULT_SETTINGS]
+    def __eq__(self, other):
+        return isinstance(other, Settings) and self.items() == other.items()
+    def __reduce__(self): # For sending them to worker processes
+        return (Settings.from_dict, (dict(self),))
+    def __repr__(self):
+        return f"Settings({', '.join(f'{key}={value!r}' for key, value in self.items())})"
+settings_cache = {} # Path: (modification time, Settings) for every settings file loaded
+def load_settings(path=SETTINGS_FILE):
+    """Loads the settings from a JSON file (the default settings if there's no file).
+    The file is only read again after it changes."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError: # If no file is found, return default settings
+        return Settings()
+    cached = settings_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path) as file:
+            try:
+                values = json.load(file)
+            except ValueError as error: # Not JSON (or not UTF-8)
+                raise SettingsError(f"not JSON: {error}")
+        settings = Settings.from_dict(values)
+    except SettingsError as error:
+        print(f"Invalid settings file ({error}), using the default settings.\n")
+        settings = Settings()
+    settings_cache[path] = (mtime, settings)
     return settings
-def save_settings(settings):
+def save_settings(settings, path=SETTINGS_FILE):
     # Save settings to a JSON file
-    with open('game_blackjack_settings.json', 'w') as file:
-        json.dump(settings, file, indent=4)
-def settings_menu(settings): #TODO: no permitir valores negativos o 0 en stacks y asi aunque es grasioso
+    with open(path, 'w') as file:
+        json.dump(dict(settings), file, indent=4)
+def settings_menu(settings):
     """Settings menu"""
     settings_labels = {
         "stacks":               "Number of card stacks",
@@ -441,7 +831,10 @@ def settings_menu(settings): #TODO: no permitir valores negativos o 0 en stacks
         "detailed_scores":      "Show detailed scores (round results)",
         "autopause":            "Auto-pause in between turns (makes gameplay slower)",
         "bgm_volume":           "Background music volume (0-100)",
-        "CPU_difficulty":       "CPU difficulty (easy/hard)"
+        "CPU_difficulty":       "CPU difficulty (easy/hard or a strategy chart file)",
+        "CPU_bets":             "CPU bets (quarter, flat:10, fraction:0.1, kelly:0.5:0.01 or progression:2:2)",
+        "rules":                "Table rules (s17/h17, das/nodas, double:9-11/double:any, resplit:4, surrender)",
+        "verbosity":            "Output when only CPUs play (0 none, 1 scores, 2 round results, 3 everything)"
     }
     while True:
         for index, (key, value) in enumerate(settings.items(), start=1):
@@ -455,23 +848,26 @@ def settings_menu(settings): #TODO: no permitir valores negativos o 0 en stacks
             new_value = input(f"Enter the new value for {settings_labels[setting_key].lower().replace('cpu', 'CPU')}: ")
             if new_value.strip():  # Check if input is not empty
                 if type(setting_value) == int:
-                    settings[setting_key] = int(new_value)
+                    setting_value = int(new_value)
                 elif type(setting_value) == bool:
-                    settings[setting_key] = True
+                    setting_value = True
                     if new_value.lower() in ["0", "false", "f", "n", "no", "untrue"]: # TODO Add more synonyms. More.
-                        settings[setting_key] = False
+                        setting_value = False
                 elif type(setting_value) == str:
-                    if new_value.lower() == "easy":
-                        settings[setting_key] = "easy"
-                    elif new_value.lower() == "hard":
-                        settings[setting_key] = "hard"
+                    setting_value = new_value.lower() if new_value.lower() in ["easy", "hard"] else new_value
+                    if os.path.exists(new_value): # Strategy chart file
+                        get_strategy(new_value) # Check it loads before saving it
                 else:
-                    settings[setting_key] = float(new_value)            
+                    setting_value = float(new_value)
+                settings = settings.replace(**{setting_key: setting_value}) # Checks the new value
             # Update global variables based on the modified settings
-            mixer.music.set_volume(settings["bgm_volume"]/100) # Refresh music volume
+            get_audio().set_volume(settings.bgm_volume) # Refresh music volume
             save_settings(settings)  # Save settings before exiting
             clear()
-        except ValueError: #Just kidding, negative values also break the game but it's fine
+        except SettingsError as error:
+            clear()
+            print(f"Wrong input! ({error})\n")
+        except ValueError:
             clear()
             print("Wrong input! (perhaps you didn't write a number?)\n")
         except IndexError:
@@ -502,12 +898,12 @@ on each line to use those for autonaming.""")
             "try not to go over 21!",
             "digital money isn't real money. Spend it.",
             "try changing the settings! What could go wrong?",
-            "try negative numbers on the options. Not sure about this one.",
+            "try negative numbers on the options. They won't work anymore, but try.",
             "check out bicyclecards.com/how-to-play/blackjack/ for a rundown of the rules.\
             \nShoutouts to their neat page! (Tyoe \"rules\" anytime to open on your web browser)"]
     print(CONTROLS_TEXT)
     settings = load_settings()
-    if settings["autoname"]:
+    if settings.autoname:
         print(TEXT_SEPARATOR)
         print(AUTONAME_TEXT)
     print(TEXT_SEPARATOR)
@@ -515,9 +911,29 @@ on each line to use those for autonaming.""")
     print("")
 
 ### TEXT FUNCTIONS #######
+# Output levels, each one shows everything the ones before it show
+SILENT  = 0 # Nothing
+SUMMARY = 1 # Final scores
+ROUNDS  = 2 # Stacks, rounds, round results and winnings
+CARDS   = 3 # Every bet, card and decision
+class Renderer:
+    """Collects the game's output and writes it in one go: at the end of each round, and before
+    the game waits for input. Callers check the level (output.level >= ROUNDS) before building a
+    message, so nothing is formatted when nobody would see it."""
+    def __init__(self, level=CARDS, write=None):
+        self.level = level
+        self.lines = []
+        self.write = write  # Where to write to (None for the terminal)
+    def show(self, text=""):
+        self.lines.append(text)
+    def flush(self):
+        if self.lines:
+            (self.write or sys.stdout.write)("\n".join(self.lines) + "\n")
+            self.lines.clear()
+output = Renderer() # Where the game's output goes
 def emboss(text): 
-    '''Prints text with a slash symbol border'''
-    print("\n" + "/"*(len(text) + 2) + "\n" + "/" + text + "/" + "\n" + "/"*(len(text) + 2) + "\n")
+    '''Returns text with a slash symbol border'''
+    return "\n" + "/"*(len(text) + 2) + "\n" + "/" + text + "/" + "\n" + "/"*(len(text) + 2) + "\n"
 def ordinal(number):
     '''Takes an int, returns its ordinal indicator string (st,nd,rd,th)'''
     if type(number) is not int:
@@ -536,50 +952,180 @@ def clear():
         _ = os.system("cls")
     else:  # For Unix/Linux and MacOS
         _ = os.system("clear")
+class BackToMenu(Exception):
+    """Raised when a player asks to go back to the main menu"""
 def wait_for_player_input(text):
     '''For when player input can lead to main menu or quitting'''
+    output.flush()
     player_choice = input(f"{text}")
     if player_choice.strip():
         if player_choice.lower() in ["q", "quit", "exit"]:
             sys.exit()
         elif player_choice.lower() in ["m", "menu"]:
-            main_loop()
+            raise BackToMenu
         elif player_choice.lower() == "rules":
             webbrowser.open('https://bicyclecards.com/how-to-play/blackjack/')
             player_choice = wait_for_player_input("")
         else:   
             return player_choice
     return player_choice  
+def answer_prompts(prompts):
+    """Runs a generator of (player, prompt) decision points (like Human_Player.turn_prompts),
+    answering each prompt from the terminal. Returns what the generator returns."""
+    try:
+        player, prompt = next(prompts)
+        while True:
+            player, prompt = prompts.send(wait_for_player_input(prompt))
+    except StopIteration as done:
+        return done.value
 
 ### MUSIC #######
-def music_initialize():
-    '''Initializes pygame's mixer and sets the music volume'''
-    mixer.init()    # Initialize pygame audio mixer
-    settings = load_settings()
-    mixer.music.set_volume(settings["bgm_volume"]/100)
+class Null_Audio:
+    """Audio backend that doesn't play anything (simulations, or no pygame/audio device)"""
+    def queue_song(self):
+        pass
+    def set_volume(self, volume):
+        pass
+class Pygame_Audio:
+    """Plays the songs in the music folder with pygame's mixer. pygame is only imported (and
+    the mixer initialized) when the first song is played, and the folder is only listed once."""
+    def __init__(self, volume, path="music/"):
+        self.volume = volume
+        self.path   = path
+        self.mixer  = None
+        self.music_list = None
+    def songs(self):
+        if self.music_list is None:
+            self.music_list = os.listdir(self.path) if os.path.exists(self.path) else []
+        return self.music_list
+    def start_mixer(self):
+        '''Initializes pygame's mixer and sets the music volume. Returns False if there's no audio.'''
+        if self.mixer is None:
+            try:
+                from pygame import mixer
+                mixer.init()    # Initialize pygame audio mixer
+            except (ImportError, RuntimeError): # No pygame, or no audio device (pygame.error)
+                self.music_list = [] # Don't try again
+                return False
+            self.mixer = mixer
+            self.set_volume(self.volume)
+        return True
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.mixer is not None:
+            self.mixer.music.set_volume(volume/100)
+    def queue_song(self):
+        '''Plays a song, adds another one to the pygame mixer queue'''
+        music_list = self.songs()
+        if music_list != [] and self.start_mixer():
+            music = self.mixer.music
+            if music.get_busy():                                    # Queue song if music is already playing
+                music.queue(self.path + random.choice(music_list))
+            else:                                                   # Play a song otherwise
+                music.load(self.path + random.choice(music_list))
+                music.play() # (-1) for loop play
+                music.queue(self.path + random.choice(music_list)) # And queue another one
+def get_audio():
+    """The audio backend, made the first time it's needed with the output on (no audio while it's silent)"""
+    global audio
+    if audio is None:
+        if output.level == SILENT: # Not kept, so music still plays if the output is turned on later
+            return Null_Audio()
+        audio = Pygame_Audio(load_settings().bgm_volume)
+    return audio
 def queue_song():
-    '''Plays a song, adds another one to the pygame mixer queue'''
-    path = "music/"
-    music_list = []
-    if os.path.exists(path):
-        music_list = os.listdir(path)
-    if music_list != []:
-        if mixer.music.get_busy():                              # Queue song if music is already playing
-            mixer.music.queue(path + random.choice(music_list))
-        else:                                                   # Play a song otherwise
-            mixer.music.load(path + random.choice(music_list))
-            mixer.music.play() # (-1) for loop play                                 
-            mixer.music.queue(path + random.choice(music_list)) # And queue another one
+    '''Plays a song, adds another one to the music queue'''
+    if output.level > SILENT:
+        get_audio().queue_song()
             
 ### MAIN FUNCTIONS #################################################################################################################
-def make_decks(num_decks, CARD_TYPES):
-    """Creates a shuffled deck out of 52-card decks * num_decks"""
-    new_deck = []
-    for deck in range(num_decks):       #For each of our decks
-        for suit in range(4):           #Four suits => 4 loops
-            new_deck.extend(CARD_TYPES) #Appends one of each card into deck
-    random.shuffle(new_deck)            #Shuffles deck
-    return new_deck                     #Returns shuffled decks
+class Shoe:
+    """A stack of cards, kept as card codes (indexes into the card types) in a bytearray.
+    Cards are dealt by moving a cursor, and shuffled lazily: each card is picked at random
+    from the ones left when it's dealt, so cards that never get dealt are never shuffled."""
+    def __init__(self, num_decks, card_types=CARD_TYPES, rng=random):
+        self.num_decks  = num_decks
+        self.card_types = card_types
+        self.cards      = bytearray(range(len(card_types))) * (4*num_decks) # Four suits per deck
+        self.size       = len(self.cards)
+        self.cursor     = 0     # Index of the next card to deal
+        self.rng        = rng   # Random source for the lazy shuffle (None if the cards come shuffled)
+    @classmethod
+    def from_codes(cls, codes, num_decks=None, card_types=CARD_TYPES):
+        """A stack that deals the given card codes in order, without shuffling"""
+        shoe = cls(0, card_types, rng=None)
+        shoe.cards = codes
+        shoe.size = len(codes)
+        shoe.num_decks = len(codes)//52 if num_decks is None else num_decks
+        return shoe
+    def __len__(self):
+        """Number of cards left to deal"""
+        return self.size - self.cursor
+    def deal(self):
+        """Deals the next card (lazy Fisher-Yates step)"""
+        cards  = self.cards
+        cursor = self.cursor
+        if self.rng is not None:
+            pick = cursor + int(self.rng.random() * (self.size - cursor))
+            cards[cursor], cards[pick] = cards[pick], cards[cursor]
+        self.cursor = cursor + 1
+        return self.card_types[cards[cursor]]
+    def composition(self):
+        """How many cards of each value are left to deal, as a list indexed by value (aces are 1,
+        tens and faces 10; index 0 is unused)"""
+        counts = [0]*11
+        left = bytes(self.cards[self.cursor:]) # Corpus stacks are memoryviews, which can't count
+        for code, card in enumerate(self.card_types):
+            counts[CARD_VALUES[card]] += left.count(code)
+        return counts
+    def penetration(self):
+        """Fraction of the stack that has been dealt"""
+        return self.cursor / self.size
+    def reached_cut_card(self, num_players):
+        """True when there aren't enough cards left for another round (3/4ths of all cards are used)"""
+        return self.size - self.cursor < self.num_decks*13 + 2*num_players
+    def shuffle(self):
+        """Puts every card back in the stack. The new order is drawn lazily while dealing."""
+        self.cursor = 0
+def make_decks(num_decks, CARD_TYPES, rng=random):
+    """Creates a shuffled stack out of 52-card decks * num_decks"""
+    return Shoe(num_decks, CARD_TYPES, rng)
+class Hand:
+    """A player's (or the dealer's) cards. The total is updated on every new card instead
+    of adding up the whole hand each time we need it."""
+    __slots__ = ("cards", "hard_total", "aces", "total", "soft", "pair")
+    def __init__(self, cards=()):
+        self.cards      = []    # Cards in the hand, as in CARD_TYPES
+        self.hard_total = 0     # Total counting every ace as 1
+        self.aces       = 0     # Number of aces in the hand
+        self.total      = 0     # Value of the hand (same as total_up)
+        self.soft       = False # True if an ace is being counted as 11 (same as is_soft)
+        self.pair       = False # True if the hand is two cards of the same type
+        for card in cards:
+            self.append(card)
+    def append(self, card):
+        """Adds a card and updates the totals"""
+        self.cards.append(card)
+        self.hard_total += CARD_VALUES[card]
+        if card == "A":
+            self.aces += 1
+        # Only one ace can be worth 11 without going over 21
+        self.soft  = self.aces > 0 and self.hard_total <= 11
+        self.total = self.hard_total + 10 if self.soft else self.hard_total
+        self.pair  = len(self.cards) == 2 and self.cards[0] == card
+    def split(self):
+        """Takes the first card out of a pair, returns it as a new hand"""
+        new_hand = Hand(self.cards[:1])
+        self.__init__(self.cards[1:])
+        return new_hand
+    def __len__(self):
+        return len(self.cards)
+    def __getitem__(self, index):
+        return self.cards[index]
+    def __iter__(self):
+        return iter(self.cards)
+    def __repr__(self):
+        return repr(self.cards)
 def total_up(hand):
     """Returns the total value of a hand."""
     _aces  = 0
@@ -618,171 +1164,244 @@ def is_soft(hand):
 
 def check_house_blackjack(dealer_hand, players):
     house_blackjack = False
-    if total_up(dealer_hand) == 21:
+    if dealer_hand.total == 21:
         house_blackjack = True
-        print("House blackjack!\n")
-        if settings["autopause"]:
-            wait_for_player_input("")
-        print("-"*11 + "Round Results" + "-"*11 + "\n")
+        if output.level >= ROUNDS:
+            output.show("House blackjack!\n")
+            if settings.autopause:
+                wait_for_player_input("")
+            output.show("-"*11 + "Round Results" + "-"*11 + "\n")
         for player in players:
             if not player.bankruptcy:
-                if total_up(player.hand) != 21:
-                    print(f"{player.name} loses the round.")
-                    player.results[-1] = [-1]
+                if player.hand.total != 21:
+                    if output.level >= ROUNDS:
+                        output.show(f"{player.name} loses the round.")
+                    player.round_results = [LOSS]
                 else:
-                    print(f"{player.name} draws the round.")
-                    player.results[-1] = [0]
+                    if output.level >= ROUNDS:
+                        output.show(f"{player.name} draws the round.")
+                    player.round_results = [DRAW]
     return house_blackjack
-def dealer_turn(dealer_hand, dealing_cards, players):
+def dealer_turn(dealer_hand, dealing_cards, players, rules=None):
     # Skip Dealer's turn if they got blackjack
-    if total_up(dealer_hand) == 21 and len(dealer_hand) == 2:
+    if dealer_hand.total == 21 and len(dealer_hand) == 2:
         return
     # Dealer hits based on the rules
-    print("-Dealer's turn-")
-    print(f"Dealer's hand: {dealer_hand} (Total: {total_up(dealer_hand)})")
-    # Hitting until 17 loop
-    while total_up(dealer_hand) < 17:
-        dealer_hand.append(dealing_cards.pop(0))
-        print("Dealer hits.")
-        print(f"Dealer's hand: {dealer_hand} (Total: {total_up(dealer_hand)})")
+    if output.level >= CARDS:
+        output.show("-Dealer's turn-")
+        output.show(f"Dealer's hand: {dealer_hand} (Total: {dealer_hand.total})")
+    # Hitting until 17 loop (or soft 17, depending on the rules)
+    dealer_hits = (rules or get_rules(settings.rules)).dealer_hits
+    while dealer_hits[dealer_hand.soft][dealer_hand.total]:
+        dealer_hand.append(dealing_cards.deal())
+        if output.level >= CARDS:
+            output.show("Dealer hits.")
+            output.show(f"Dealer's hand: {dealer_hand} (Total: {dealer_hand.total})")
     # If dealer busts, check if player has busted too
-    if total_up(dealer_hand) > 21: 
-        print("Dealer busted!")
-        if settings["autopause"]:
-            wait_for_player_input("") 
-        print("-"*11 + "Round Results" + "-"*11 + "\n")  
+    if dealer_hand.total > 21: 
+        if output.level >= ROUNDS:
+            output.show("Dealer busted!")
+            if settings.autopause:
+                wait_for_player_input("") 
+            output.show("-"*11 + "Round Results" + "-"*11 + "\n")  
         for player in players:
             check_player_bust(player,dealer_hand)
     # If no dealer bust, check which players won
     else:
-        print("Dealer stands.")
-        if settings["autopause"]:
-            wait_for_player_input("")
-        print("-"*11 + "Round Results" + "-"*11 + "\n")
+        if output.level >= ROUNDS:
+            output.show("Dealer stands.")
+            if settings.autopause:
+                wait_for_player_input("")
+            output.show("-"*11 + "Round Results" + "-"*11 + "\n")
         for player in players:
             check_player_win(player,dealer_hand)
-    if settings["autopause"]:
+    if output.level < ROUNDS:
+        return
+    if settings.autopause:
         wait_for_player_input("")
     else:
-        print("")       
+        output.show("")       
 def check_player_bust(player,dealer_hand):
     # Check if dealer busted; players that didn't bust win
     if player.bankruptcy:
         return
-    if len(player.results[-1]) > 1:
+    if len(player.round_results) > 1:
         for hand in range(len(player.hands)):
-            if player.results[-1][hand] == -1:
-                print(f"{player.name} loses the hand.")
+            if player.round_results[hand] == LOSS:
+                if output.level >= ROUNDS:
+                    output.show(f"{player.name} loses the hand.")
                 continue
-            print(f"{player.name} wins the hand!")
-            if player.results[-1][hand] == 0:
-                player.results[-1][hand] = 1
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} wins the hand!")
+            if player.round_results[hand] == DRAW:
+                player.round_results[hand] = WIN
     else:
-        if player.results[-1][0] == -1:
-            print(f"{player.name} loses the round.")
+        if player.round_results[0] == LOSS:
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} loses the round.")
             return             
-        print(f"{player.name} wins the round!")
-        if player.results[-1][0] == 0:
-            player.results[-1][0] = 1            
+        if player.round_results[0] == SURRENDERED:
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} surrendered the round.")
+            return
+        if output.level >= ROUNDS:
+            output.show(f"{player.name} wins the round!")
+        if player.round_results[0] == DRAW:
+            player.round_results[0] = WIN
 def check_player_win(player,dealer_hand):   
     if player.bankruptcy:
         return
     label = "round" # Change to "hand" if player has split pairs
     if len(player.hands) > 1: 
         label = "hand"
+    dealer_total = dealer_hand.total
+    results = player.round_results
     hand_id = 0
     for hand in (player.hands):
-        if total_up(hand) > total_up(dealer_hand) or player.results[-1][hand_id] == "bj":
-            if total_up(hand) <= 21:
-                print(f"{player.name} wins the {label}!")
+        if results[hand_id] == SURRENDERED:
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} surrendered the {label}.")
+        elif hand.total > dealer_total or results[hand_id] == BLACKJACK:
+            if hand.total <= 21:
+                if output.level >= ROUNDS:
+                    output.show(f"{player.name} wins the {label}!")
                 # Don't change if player got a blackjack 
-                if not player.results[-1][hand_id] == "bj":
-                    player.results[-1][hand_id] = 1
+                if not results[hand_id] == BLACKJACK:
+                    results[hand_id] = WIN
             else:
-                print(f"{player.name} loses the {label}.")
-                player.results[-1][hand_id] = -1
-        elif total_up(hand) == total_up(dealer_hand) and total_up(hand) <= 21:
-            print(f"{player.name} draws the {label}.")
-            player.results[-1][hand_id] = 0
+                if output.level >= ROUNDS:
+                    output.show(f"{player.name} loses the {label}.")
+                results[hand_id] = LOSS
+        elif hand.total == dealer_total and hand.total <= 21:
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} draws the {label}.")
+            results[hand_id] = DRAW
         else:
-            print(f"{player.name} loses the {label}.")
-            player.results[-1][hand_id] = -1
+            if output.level >= ROUNDS:
+                output.show(f"{player.name} loses the {label}.")
+            results[hand_id] = LOSS
         hand_id += 1
 def end_game_scores(total_rounds, players):
     # End of the game
-    print("\n" + "/" * 35 + "\n")
-    print("End of game. Results:\n")
-    print(f"Total number of rounds: {total_rounds} rounds.")
-    print(f"Casino winnings: ${settings['starting_money']*(len(players))-(sum(player.money for player in players))}")
+    if output.level >= SUMMARY:
+        output.show("\n" + "/" * 35 + "\n")
+        output.show("End of game. Results:\n")
+        output.show(f"Total number of rounds: {total_rounds} rounds.")
+        output.show(f"Casino winnings: ${settings.starting_money*(len(players))-(sum(player.money for player in players))}")
+    output.flush()
     input("\n>Show scores\n")
-    players = sorted(players, key=lambda player: player.money, reverse=True)  # Sort by money
-    players = sorted(players, key=lambda player: len(player.results), reverse=True) # Sort by rounds played (non-bankrupt)
-    for position, player in enumerate(players):  # Print sorted player list
-        print(f"{position+1}{ordinal(position+1)} place - {player.name}: ${math.floor(player.money)}" + f"{' - ' + player.detailed_scores() if settings['detailed_scores'] else ''}")
+    if output.level >= SUMMARY:
+        output.show(standings(players))
     player_choice = ""
+    output.flush()
     while player_choice == "":
         player_choice = input("\nType anything to continue...")
     clear()
     print(TITLE_GRAPHIC)
-def play_game(players, CARD_TYPES, total_rounds):
-    for stack in range(settings["stacks"]):  
+def rank_players(players):
+    """Players sorted from first to last place: by rounds played (the ones who didn't go bankrupt
+    first), then by money"""
+    players = sorted(players, key=lambda player: player.money, reverse=True)  # Sort by money
+    return sorted(players, key=lambda player: player.rounds_played, reverse=True) # Sort by rounds played (non-bankrupt)
+def standings(players, ranked=False):
+    """The final standings, one line per place (ranked=True if the players are in their places already)"""
+    return "\n".join(f"{position+1}{ordinal(position+1)} place - {player.name}: ${math.floor(player.money)}" + f"{' - ' + player.detailed_scores() if settings.detailed_scores else ''}"
+                     for position, player in enumerate(players if ranked else rank_players(players)))
+def play_round(players, dealing_cards, rules=None):
+    """Plays a single round (bets, dealing, turns, dealer and payout) with the given cards and
+    table rules (see get_rules; the rules setting's if None). Returns the dealer's hand."""
+    return answer_prompts(round_prompts(players, dealing_cards, rules))
+def round_prompts(players, dealing_cards, rules=None):
+    """play_round as a generator of the human players' (player, prompt) decision points, that gets
+    sent the answers. play_round answers them from the terminal, table_server.py over sockets."""
+    rules = rules or get_rules(settings.rules)
+    if hand_history is not None:
+        hand_history.start_round(players, dealing_cards, settings)
+    if metrics is not None:
+        metrics.start_round(players, dealing_cards)
+    reinitialize_player_hands(players) # Re-initialize player hands
+    # //////
+    # /BETS/
+    # //////
+    for player in players:
+        if isinstance(player, Human_Player):
+            yield from player.bet_prompts(settings.minimum_bet, settings.maximum_bet)
+            if not player.bankruptcy:      #TODO Maybe delete this idk
+                output.show("")            #TODO Maybe delete this idk
+        else:
+            player.make_bets(settings.minimum_bet, settings.maximum_bet)
+    # /////////
+    # /DEALING/
+    # /////////
+    if output.level >= CARDS:
+        output.show("\n" + "-"*11 + "Round Start" + "-"*11 + "\n")
+    for player in players:
+        player.deal_two_cards(dealing_cards) # Deal 2 cards to the first hand of each player
+    # Dealer's hand
+    dealer_hand = Hand()
+    # We append two cards for the dealer
+    dealer_hand.append(dealing_cards.deal())
+    dealer_hand.append(dealing_cards.deal())
+    # We show the first card of the dealer's hand
+    if output.level >= CARDS:
+        output.show(f"Dealer's hand: {dealer_hand[0]}\n")
+    if decision_log is not None:
+        decision_log.deal(players, dealer_hand)
+    # ////////////
+    # /GAME LOGIC/
+    # ////////////
+    # Check for house blackjack
+    house_blackjack = check_house_blackjack(dealer_hand, players)                    
+    # Skip players' turn when house blackjack
+    if not house_blackjack:
+        # Players' turn
+        for player in players:
+            if isinstance(player, CPU_Player):
+                player.turn(dealing_cards, dealer_hand, rules)
+                if settings.autopause and output.level >= CARDS:
+                    wait_for_player_input("")
+            else:
+                yield from player.turn_prompts(dealing_cards, rules)
+    # Dealer's Turn
+    dealer_turn(dealer_hand, dealing_cards, players, rules)
+    # Payout for non-busted players
+    for player in players:
+        player.payout()
+    if hand_history is not None:
+        hand_history.end_round(players, dealer_hand, dealing_cards)
+    if metrics is not None:
+        metrics.end_round(players, dealing_cards)
+    if decision_log is not None:
+        decision_log.end_round()
+    output.flush() # One write for the whole round
+    return dealer_hand
+def play_game(players, CARD_TYPES, total_rounds, resume=None):
+    """Plays the game's stacks. With resume (a checkpoint.TableState), carries on from it."""
+    rules = get_rules(settings.rules) # Resolved once for the whole game
+    for stack in range(resume.stack if resume else 0, settings.stacks):
         # STACK START
         # Each "stack" is made of decks, and it lasts until we run out of cards
-        emboss(f"STACK {stack+1}")
-        round_num = 0
-        dealing_cards = make_decks(settings["num_decks"], CARD_TYPES)        
+        if output.level >= ROUNDS:
+            output.show(emboss(f"STACK {stack+1}"))
+        if resume is not None: # Same shoe, dealt up to the same card
+            round_num, dealing_cards = resume.round_num, resume.shoe
+            resume = None
+        else:
+            round_num = 0
+            dealing_cards = make_decks(settings.num_decks, CARD_TYPES)
         # Each round uses one stack, until the amount of cards left is low 
-        while len(dealing_cards) >= settings["num_decks"]*13 + 2*len(players): # 3/4ths of all cards are used
+        while not dealing_cards.reached_cut_card(len(players)): # 3/4ths of all cards are used
             # ROUND START         
-            print(f"----ROUND {round_num+1}----\n")
+            if output.level >= ROUNDS:
+                output.show(f"----ROUND {round_num+1}----\n")
             queue_song() # We try to queue a song at the start of each round so they don't stop coming and they don't stop coming...
-            reinitialize_player_hands(players) # Re-initialize player hands
-            # //////
-            # /BETS/
-            # //////
-            for player in players:
-                player.make_bets(settings["minimum_bet"], settings["maximum_bet"])
-                if isinstance(player, Human_Player) and not player.bankruptcy:      #TODO Maybe delete this idk
-                    print("")                                                       #TODO Maybe delete this idk
-            # /////////
-            # /DEALING/
-            # /////////
-            print("\n" + "-"*11 + "Round Start" + "-"*11 + "\n")
-            for player in players:
-                player.deal_two_cards(dealing_cards) # Deal 2 cards to the first hand of each player
-            # Dealer's hand
-            dealer_hand = []
-            # We append two cards for the dealer
-            dealer_hand.append(dealing_cards.pop(0))
-            dealer_hand.append(dealing_cards.pop(0))
-            # We show the first card of the dealer's hand
-            print(f"Dealer's hand: {dealer_hand[0]}\n")
-            # ////////////
-            # /GAME LOGIC/
-            # ////////////
-            # Check for house blackjack
-            house_blackjack = check_house_blackjack(dealer_hand, players)                    
-            # Skip players' turn when house blackjack
-            if not house_blackjack:
-                # Players' turn
-                for player in players:
-                    if isinstance(player, CPU_Player):
-                        player.turn(dealing_cards, dealer_hand)
-                        if settings["autopause"]:
-                            wait_for_player_input("")
-                    else:
-                        player.turn(dealing_cards)
-            # Dealer's Turn
-            dealer_turn(dealer_hand, dealing_cards, players)
-            # Payout for non-busted players
-            for player in players:
-                player.payout()
+            play_round(players, dealing_cards, rules)
             # Wait for player input at the end of each round unless
             # it's only CPU players or all humans have run out of money.
-            if settings["players_human"] > 0 and any(isinstance(player, Human_Player) and not player.bankruptcy for player in players) or settings["autopause"]:
+            if settings.players_human > 0 and any(isinstance(player, Human_Player) and not player.bankruptcy for player in players) or settings.autopause:
                 wait_for_player_input("")
-            else:
-                print("")
+            elif output.level >= ROUNDS:
+                output.show("")
             # Check for bankruptcy
             for player in players:
                 player.check_bankrupcy() # Update value
@@ -792,27 +1411,179 @@ def play_game(players, CARD_TYPES, total_rounds):
             # Increment round counters
             round_num += 1  # Increment at the end cause we use it for results index
             total_rounds +=1  # This one can be incremented whenever
+            if checkpoints is not None and checkpoints.due():
+                checkpoints.save(players, dealing_cards, stack, round_num, total_rounds)
         for player in players:
             player.check_bankrupcy() # Update value
         if all(player.bankruptcy for player in players): # End loop if no-one has money to bet
+            output.flush()
             input("Everyone ran out of money. Table closed.\n")
             break
     # End of the game
+    if checkpoints is not None:
+        checkpoints.remove() # Nothing left to resume
     end_game_scores(total_rounds, players)
+    return total_rounds
+
+### RANDOM STREAMS #######
+def stream_seed(seed, *keys):
+    """Seed for the child stream `keys` (e.g. "shoe", 12) of a master seed. Child seeds are
+    hashed from the master seed and the keys, so they don't depend on each other or on the
+    order they're made in."""
+    text = ":".join(str(part) for part in (seed,) + keys)
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=16).digest(), "little")
+class RandomStreams:
+    """Seeded random streams for a table: one for the shuffle and one for the CPU decisions
+    of every stack. Any stack's streams can be made again from the seed and the stack number
+    alone, without playing the stacks before it."""
+    def __init__(self, seed=None):
+        self.seed = random.getrandbits(64) if seed is None else seed
+    def stream(self, *keys):
+        return random.Random(stream_seed(self.seed, *keys))
+    def spawn(self, *keys):
+        """Streams for another table (e.g. a worker's), independent from this table's"""
+        return RandomStreams(stream_seed(self.seed, "table", *keys))
+    def shoe(self, stack):
+        return self.stream("shoe", stack)
+    def decisions(self, stack):
+        return self.stream("decisions", stack)
+
+### SIMULATION #######
+def simulate(sim_settings, rounds=None, stacks=None, bankroll=False, seed=None, first_stack=0, corpus=None, resume=None,
+             players=None):
+    """Plays rounds between CPU players without any terminal I/O, until `rounds` rounds or
+    `stacks` stacks have been played (the settings' number of stacks if neither is given),
+    or everyone runs out of money. Returns a dict with the stats of the simulation.
+    With bankroll=True, the stats also have every player's money after each round.
+    With a seed, stack number `first_stack + n` is shuffled and played with that stack's own
+    RandomStreams(seed) streams, otherwise the global random module is used.
+    With a corpus (see shoe_corpus.py), stack number `first_stack + n` is dealt from the corpus instead.
+    With resume (a checkpoint.TableState), carries on from it (rounds and stacks count the ones before
+    it too, bankroll only the ones after it), saving checkpoints as it goes if checkpoints is set.
+    With players (CPU_Players with the starting money), they play instead of players_ai new CPUs."""
+    global settings, output, cpu_random
+    settings = Settings.from_dict(sim_settings).replace(players_human=0, autopause=False) # Nobody to ask for input
+    if rounds is None and stacks is None:
+        stacks = settings.stacks
+    strategy = get_strategy(settings.CPU_difficulty) # Resolved once for the whole simulation
+    bet_policy = get_bet_policy(settings.CPU_bets)
+    rules = get_rules(settings.rules)
+    if players is None:
+        players = [CPU_Player(settings.starting_money, f"CPU {player+1}", strategy, bet_policy) for player in range(settings.players_ai)]
+    total_rounds = 0
+    total_stacks = 0
+    wagered = 0
+    dealer_blackjacks = 0
+    if resume is not None:
+        players, total_rounds, wagered, dealer_blackjacks = resume.players, resume.total_rounds, resume.wagered, resume.dealer_blackjacks
+        total_stacks = resume.stack - first_stack # Stacks started before the one it stopped in
+    trajectories = [[] for player in players]
+    streams = RandomStreams(seed) if seed is not None else None
+    start_time = time.perf_counter()
+    game_output = output
+    output = Renderer(SILENT)
+    try:
+        while (rounds is None or total_rounds < rounds) and (stacks is None or total_stacks < stacks) \
+                and not all(player.bankruptcy for player in players):
+            if resume is not None: # Same shoe and random states as when it stopped
+                dealing_cards, cpu_random, stack_rounds = resume.shoe, resume.cpu_random, resume.round_num
+                resume = None
+            else:
+                stack_rounds = 0
+                if streams is not None:
+                    cpu_random = streams.decisions(first_stack + total_stacks)
+                if corpus is not None:
+                    dealing_cards = corpus.shoe(first_stack + total_stacks)
+                elif streams is not None:
+                    dealing_cards = make_decks(settings.num_decks, CARD_TYPES, streams.shoe(first_stack + total_stacks))
+                else:
+                    dealing_cards = make_decks(settings.num_decks, CARD_TYPES)
+            total_stacks += 1
+            while not dealing_cards.reached_cut_card(len(players)) and (rounds is None or total_rounds < rounds):
+                dealer_hand = play_round(players, dealing_cards, rules)
+                if dealer_hand.total == 21 and len(dealer_hand) == 2:
+                    dealer_blackjacks += 1
+                for player in players:
+                    if not player.bankruptcy:
+                        wagered += sum(player.bet) # Bets after doubling down and splitting
+                    player.check_bankrupcy()
+                if bankroll:
+                    for player, trajectory in zip(players, trajectories):
+                        trajectory.append(player.money)
+                total_rounds += 1
+                stack_rounds += 1
+                if all(player.bankruptcy for player in players):
+                    break
+                if checkpoints is not None and checkpoints.due():
+                    checkpoints.save(players, dealing_cards, first_stack + total_stacks - 1, stack_rounds, total_rounds,
+                                     wagered=wagered, dealer_blackjacks=dealer_blackjacks, seed=seed)
+    finally:
+        output = game_output
+        cpu_random = random
+    elapsed = time.perf_counter() - start_time
+    player_stats = []
+    for player in players:
+        player_stats.append(dict(player.result_counts(), name=player.name, money=player.money,
+                                 rounds=player.rounds_played, bankruptcy=player.bankruptcy))
+    outcomes = {key: sum(stats[key] for stats in player_stats) for key in ("blackjacks", "won", "drawn", "lost")}
+    casino_winnings = settings.starting_money*len(players) - sum(player.money for player in players)
+    stats = {
+        "rounds":           total_rounds,
+        "stacks":           total_stacks,
+        "hands":            sum(outcomes.values()),
+        **outcomes,
+        "wagered":          wagered,
+        "casino_winnings":  casino_winnings,
+        "house_edge":       casino_winnings/wagered if wagered else 0.0,
+        "dealer_blackjacks": dealer_blackjacks,
+        "bankrupt_players": sum(player.bankruptcy for player in players),
+        "seconds":          elapsed,
+        "rounds_per_sec":   total_rounds/elapsed if elapsed else 0.0,
+        "players":          player_stats
+    }
+    if bankroll:
+        stats["bankroll"] = trajectories
+    return stats
+def simulate_command(args):
+    """Runs `python blackjack.py simulate [rounds] [--seed SEED]` and prints the stats"""
+    seed = None
+    if "--seed" in args:
+        seed_arg = args.index("--seed")
+        seed = args[seed_arg + 1]
+        args = args[:seed_arg] + args[seed_arg + 2:]
+    rounds = int(args[0]) if args else 100000
+    resume = checkpoints.load() if checkpoints is not None else None
+    if resume is not None:
+        print(f"Resuming the saved simulation after {resume.total_rounds} rounds.")
+        stats = simulate(resume.settings, rounds, seed=resume.seed, resume=resume)
+    else:
+        stats = simulate(load_settings(), rounds, seed=seed)
+    if checkpoints is not None:
+        checkpoints.remove() # Finished, nothing left to resume
+    players = stats.pop("players")
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+    for player in players:
+        print(f"{player['name']}: ${math.floor(player['money'])} - Blackjacks: {player['blackjacks']} | Won: {player['won']} | Drawn: {player['drawn']} | Lost: {player['lost']}")
 
 ######################
 ## GAME STARTS HERE ##
 ######################
 MAIN_MENU = {"1-":"Play Blackjack.","2-":"Settings.","3-":"How to play.","4-":"Quit."}
-music_initialize()
 #############
 # Main loop #
 #############
 def main_loop():
-    queue_song() # Start playing music
-    clear()  # We clear the screen to start
-    print(TITLE_GRAPHIC)  # Prints the main title
-    global settings
+    while True:
+        queue_song() # Start playing music
+        clear()  # We clear the screen to start
+        print(TITLE_GRAPHIC)  # Prints the main title
+        try:
+            main_menu()
+        except BackToMenu: # Someone typed "m" (or "menu"), start over from the title
+            pass
+def main_menu():
+    global settings, cpu_random
     options = MAIN_MENU.keys()
     while True:
         for entry in options:
@@ -831,13 +1602,74 @@ def main_loop():
             sys.exit()
         elif selection == "1":  # Play game
             clear() #Clear the screen
-            #Initialize new game
-            settings = load_settings()
-            total_rounds = 0  # Round counter for games with >= 2 stacks
-            players = create_players(settings["players_human"], settings["players_ai"], settings["starting_money"])  # Create the players for the current game      
-            play_game(players, CARD_TYPES, total_rounds) 
+            resume = checkpoints.load() if checkpoints is not None else None
+            if resume is not None: # Carry on with the saved game
+                settings, players, total_rounds, cpu_random = resume.settings, resume.players, resume.total_rounds, resume.cpu_random
+            else: #Initialize new game
+                settings = load_settings()
+                total_rounds = 0  # Round counter for games with >= 2 stacks
+                players = create_players(settings.players_human, settings.players_ai, settings.starting_money)  # Create the players for the current game      
+            output.level = settings.verbosity if settings.players_human == 0 else CARDS # Humans see everything
+            if resume is not None and output.level >= SUMMARY:
+                output.show(f"Resuming the saved game from stack {resume.stack+1}, round {resume.round_num+1}.\n")
+            play_game(players, CARD_TYPES, total_rounds, resume)
         else:
             clear()
             print(TITLE_GRAPHIC)
             print("\nUnknown selection.\n")
-main_loop()
\ No newline at end of file
+
+if __name__ == "__main__":
+    # The helpers below import blackjack: make that this module, not a second copy with its own globals and classes
+    sys.modules["blackjack"] = sys.modules["__main__"]
+    args = sys.argv[1:]
+    if "--history" in args: # Log every round to a hand history file
+        import hand_history as hand_history_module
+        history_arg = args.index("--history")
+        hand_history = hand_history_module.HandHistoryWriter(args[history_arg + 1])
+        del args[history_arg:history_arg + 2]
+    if "--checkpoint" in args: # Save the table every few seconds, and carry on from the saved one if there is one
+        import checkpoint
+        checkpoint_arg = args.index("--checkpoint")
+        checkpoints = checkpoint.Checkpointer(args[checkpoint_arg + 1])
+        del args[checkpoint_arg:checkpoint_arg + 2]
+        if "--checkpoint-every" in args: # Seconds between saves (10 by default)
+            checkpoint_arg = args.index("--checkpoint-every")
+            checkpoints.every_seconds = float(args[checkpoint_arg + 1])
+            del args[checkpoint_arg:checkpoint_arg + 2]
+    if "--decisions" in args: # Record every decision to a columnar dataset
+        import decision_dataset
+        decisions_arg = args.index("--decisions")
+        decision_log = decision_dataset.DecisionWriter(args[decisions_arg + 1])
+        del args[decisions_arg:decisions_arg + 2]
+    metrics_file = None
+    if "--metrics" in args or "--metrics-file" in args: # Live metrics over HTTP (Prometheus text format) and/or to a file
+        import metrics as metrics_module
+        metrics = metrics_module.Metrics()
+        if "--metrics" in args:
+            metrics_arg = args.index("--metrics")
+            metrics.serve(int(args[metrics_arg + 1]))
+            del args[metrics_arg:metrics_arg + 2]
+        metrics_interval = 10.0
+        if "--metrics-interval" in args: # Seconds between metrics file writes (10 by default)
+            metrics_arg = args.index("--metrics-interval")
+            metrics_interval = float(args[metrics_arg + 1])
+            del args[metrics_arg:metrics_arg + 2]
+        if "--metrics-file" in args:
+            metrics_arg = args.index("--metrics-file")
+            metrics_file = args[metrics_arg + 1]
+            metrics.write_every(metrics_file, metrics_interval)
+            del args[metrics_arg:metrics_arg + 2]
+    try:
+        if args[:1] == ["simulate"]:
+            simulate_command(args[1:])
+        else:
+            main_loop()
+    finally:
+        if hand_history is not None:
+            hand_history.close()
+        if decision_log is not None:
+            decision_log.close()
+        if metrics is not None:
+            metrics.publish() # The final counts
+            if metrics_file is not None:
+                metrics.write(metrics_file)
@@ -0,0 +1,148 @@
+'''Checkpoints: a snapshot of a table between two rounds (the shoe and where it's dealt up to,
+every player's money and counters, the round and stack counters and the random generators'
+states), so a long game or simulation can be stopped and carried on from the exact same point.
+
+    python blackjack.py --checkpoint game.bjcp              (resumes game.bjcp if it's there)
+    python blackjack.py simulate 10000000 --seed 1 --checkpoint sim.bjcp --checkpoint-every 60
+
+File layout (little endian):
+    header: b"BJCP", version (u8), settings JSON length (u32), settings JSON, seed length (u16) and seed
+    table:  stack (u32), round in the stack (u32), total rounds (u64), wagered (f64), dealer blackjacks (u64), seats (u8)
+    shoe:   decks (u16), cards (u16), cursor (u16), the card codes, then the shuffle's random state
+    the CPU decisions' random state
+    seats:  seat type (u8, 0 human, 1 CPU), name length (u8) and name, money (f64), flags (u8: 1 bankrupt, 2 money is a float),
+            rounds played, blackjacks, won, drawn, lost (u32 each), last bet (f64), and the results of the
+            last round's hands (count (u8), then one i8 each; bet policies can look at them)
+A random state is its kind (u8: 0 the global random module, 1 its own generator, 2 none), and
+for the first two the Mersenne Twister state: 625 words (u32), has gauss (u8) and gauss (f64).
+A snapshot is a few KB, so it's written whole to a temporary file that then replaces the old one:
+a run killed mid-write still has its previous checkpoint.
+'''
+import os                   # For replacing checkpoints atomically
+import json                 # For the settings in the header
+import time                 # For periodic checkpoints
+import random               # For the random generators' states
+import struct               # For the binary records
+import blackjack
+
+MAGIC   = b"BJCP"
+VERSION = 1
+HEADER  = struct.Struct("<4sBI")
+TABLE   = struct.Struct("<IIQdQB")
+SHOE    = struct.Struct("<HHH")
+SEAT    = struct.Struct("<dBIIIIId")
+STATE   = struct.Struct("<B625IBd")
+GLOBAL_RANDOM, OWN_RANDOM, NO_RANDOM = 0, 1, 2
+HUMAN, CPU = 0, 1
+
+class TableState:
+    """A table as read from a checkpoint, ready to carry on playing"""
+    __slots__ = ("settings", "seed", "stack", "round_num", "total_rounds", "wagered", "dealer_blackjacks",
+                 "shoe", "cpu_random", "players")
+
+def pack_random(rng):
+    if rng is None:
+        return STATE.pack(NO_RANDOM, *[0]*625, 0, 0.0)
+    version, words, gauss = rng.getstate()
+    return STATE.pack(GLOBAL_RANDOM if rng is random else OWN_RANDOM, *words, gauss is not None, gauss or 0.0)
+def unpack_random(data, offset):
+    kind, *words, has_gauss, gauss = STATE.unpack_from(data, offset)
+    if kind == NO_RANDOM:
+        return None
+    rng = random if kind == GLOBAL_RANDOM else random.Random()
+    rng.setstate((3, tuple(words), gauss if has_gauss else None))
+    return rng
+
+def snapshot(players, dealing_cards, stack, round_num, total_rounds, wagered=0, dealer_blackjacks=0, seed=None):
+    """The table (as the engine's globals have it) as checkpoint bytes"""
+    payload = json.dumps(dict(blackjack.settings)).encode()
+    seed = b"" if seed is None else str(seed).encode()
+    data = bytearray(HEADER.pack(MAGIC, VERSION, len(payload)) + payload)
+    data += struct.pack("<H", len(seed)) + seed
+    data += TABLE.pack(stack, round_num, total_rounds, wagered, dealer_blackjacks, len(players))
+    data += SHOE.pack(dealing_cards.num_decks, dealing_cards.size, dealing_cards.cursor) + bytes(dealing_cards.cards)
+    data += pack_random(dealing_cards.rng) + pack_random(blackjack.cpu_random)
+    for player in players:
+        name = player.name.encode()[:255]
+        data += struct.pack("<BB", CPU if isinstance(player, blackjack.CPU_Player) else HUMAN, len(name)) + name
+        flags = player.bankruptcy | isinstance(player.money, float) << 1
+        data += SEAT.pack(player.money, flags, player.rounds_played, player.blackjacks, player.won,
+                          player.drawn, player.lost, getattr(player, "last_bet", 0))
+        data += struct.pack("<B", len(player.round_results)) + struct.pack(f"<{len(player.round_results)}b", *player.round_results)
+    return bytes(data)
+def restore(data):
+    """A TableState from checkpoint bytes"""
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a checkpoint file (or an unsupported version)")
+    state = TableState()
+    offset = HEADER.size
+    state.settings = blackjack.Settings.from_dict(json.loads(data[offset:offset + length]))
+    offset += length
+    seed_length, = struct.unpack_from("<H", data, offset)
+    offset += 2
+    state.seed = data[offset:offset + seed_length].decode() if seed_length else None
+    offset += seed_length
+    state.stack, state.round_num, state.total_rounds, state.wagered, state.dealer_blackjacks, seats = TABLE.unpack_from(data, offset)
+    if state.wagered.is_integer():
+        state.wagered = int(state.wagered) # Whole bets add up to a whole number, as in simulate
+    offset += TABLE.size
+    num_decks, size, cursor = SHOE.unpack_from(data, offset)
+    offset += SHOE.size
+    state.shoe = blackjack.Shoe.from_codes(bytearray(data[offset:offset + size]), num_decks)
+    state.shoe.cursor = cursor
+    offset += size
+    state.shoe.rng = unpack_random(data, offset)
+    state.cpu_random = unpack_random(data, offset + STATE.size) or random
+    offset += 2*STATE.size
+    strategy = blackjack.get_strategy(state.settings.CPU_difficulty)
+    bet_policy = blackjack.get_bet_policy(state.settings.CPU_bets)
+    state.players = []
+    for seat in range(seats):
+        kind, name_length = struct.unpack_from("<BB", data, offset)
+        offset += 2
+        name = data[offset:offset + name_length].decode()
+        offset += name_length
+        money, flags, rounds_played, blackjacks, won, drawn, lost, last_bet = SEAT.unpack_from(data, offset)
+        offset += SEAT.size
+        num_results, = struct.unpack_from("<B", data, offset)
+        round_results = list(struct.unpack_from(f"<{num_results}b", data, offset + 1))
+        offset += 1 + num_results
+        if not flags & 2:
+            money = int(money) # Prints as $100, not $100.0
+        if kind == CPU:
+            player = blackjack.CPU_Player(money, name, strategy, bet_policy)
+            player.last_bet = int(last_bet)
+        else:
+            player = blackjack.Human_Player(money, name)
+        player.bankruptcy = bool(flags & 1)
+        player.round_results = round_results
+        player.rounds_played, player.blackjacks, player.won, player.drawn, player.lost = rounds_played, blackjacks, won, drawn, lost
+        state.players.append(player)
+    return state
+
+class Checkpointer:
+    """Saves the table to `path` every `every_seconds` (checked between rounds), and loads it back"""
+    def __init__(self, path, every_seconds=10.0):
+        self.path = path
+        self.every_seconds = every_seconds
+        self.last_save = time.monotonic()
+    def due(self):
+        return time.monotonic() - self.last_save >= self.every_seconds
+    def save(self, *table, **counters):
+        """Writes a checkpoint (arguments as for snapshot)"""
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(snapshot(*table, **counters))
+        os.replace(temporary, self.path)
+        self.last_save = time.monotonic()
+    def load(self):
+        """The saved TableState, or None if there's no checkpoint"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as file:
+            return restore(file.read())
+    def remove(self):
+        """Deletes the checkpoint (when the game is over, so the next one starts fresh)"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
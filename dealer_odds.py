@@ -0,0 +1,153 @@
+'''Dealer odds: the exact probability of each final dealer total (17 to 21, or bust) for an up card
+and the cards left in the shoe, with the dealer drawing like dealer_turn does with the table rules
+(standing or hitting on soft 17) and the shoe running down as they draw.
+
+    python dealer_odds.py --decks 6                 (every up card, full shoe)
+    python dealer_odds.py --up 6 --counts 24,24,24,24,24,24,24,24,24,94 --rules h17
+
+Results are kept in a bounded LRU cache keyed by a 23 byte signature of the query (up card, whether
+the dealer's blackjack is ruled out, whether the dealer hits soft 17 and the count of every card
+value, 16 bits each so any shoe fits), so repeated queries
+take a microsecond or so. DealerOdds.save() writes the cache to disk (the CLI does it when it's
+done), and the next DealerOdds loads it back. In the engine, the odds a player faces in the middle
+of a round are odds.get(up card value, unseen_counts(dealing_cards, dealer_hand[1]), rules=rules).
+Nothing in the CPU strategy asks for them yet.
+
+File layout (little endian): b"BJDO", version (u8), then every entry: signature (23 bytes) and the
+six probabilities (f64).
+'''
+import sys                  # For the command line arguments
+import os                   # For loading the cache
+import struct               # For the cache file
+from collections import OrderedDict
+import blackjack
+
+MAGIC   = b"BJDO"
+VERSION = 2
+SIGNATURE = struct.Struct("<BBB10H")
+ENTRY   = struct.Struct(f"<{SIGNATURE.size}s6d")
+CACHE_FILE = 'dealer_odds.bin'
+OUTCOMES = (17, 18, 19, 20, 21, "bust")    # Order of the probabilities
+BUST = 5
+
+def full_shoe(num_decks):
+    """Card counts of a full shoe, by value (index 0 unused, aces are 1, tens and faces 10)"""
+    return [0] + [4*num_decks]*9 + [16*num_decks]
+def unseen_counts(dealing_cards, hole_card):
+    """Card counts by value of the cards the players haven't seen: the ones a Shoe has left to
+    deal and the dealer's hole card"""
+    counts = dealing_cards.composition()
+    counts[blackjack.CARD_VALUES[hole_card]] += 1
+    return counts
+
+def _draw(hard, aces, counts, left, results, weight, dealer_hits):
+    """Adds weight x the probabilities of every way the dealer ends from this hand"""
+    soft = aces and hard <= 11
+    total = hard + 10 if soft else hard
+    if not dealer_hits[soft][total]:
+        results[BUST if total > 21 else total - 17] += weight
+        return
+    for value in range(1, 11):
+        count = counts[value]
+        if count:
+            counts[value] = count - 1
+            _draw(hard + value, aces or value == 1, counts, left - 1, results, weight*count/left, dealer_hits)
+            counts[value] = count
+def distribution(up_card, counts, no_blackjack=True, rules=None):
+    """Probabilities of the dealer ending on 17, 18, 19, 20, 21 and busting (see OUTCOMES), without
+    any cache. `up_card` is the up card's value (ace 1), `counts` the cards by value the hole card
+    and the hits come from (see full_shoe; the up card shouldn't be in them).
+    With no_blackjack, the dealer is known not to have a blackjack (the players get to play only
+    then), otherwise a dealer blackjack counts as 21.
+    `rules` are compiled Rules (see blackjack.get_rules; the default rules if None)."""
+    dealer_hits = (rules or blackjack.get_rules(blackjack.DEFAULT_SETTINGS["rules"])).dealer_hits
+    counts = list(counts)
+    left = sum(counts[1:])
+    results = [0.0]*6
+    for hole in range(1, 11):
+        count = counts[hole]
+        if not count:
+            continue
+        if no_blackjack and {up_card, hole} == {1, 10}:
+            continue
+        counts[hole] = count - 1
+        _draw(up_card + hole, up_card == 1 or hole == 1, counts, left - 1, results, count, dealer_hits)
+        counts[hole] = count
+    total = sum(results)
+    return tuple(result/total for result in results) if total else tuple(results)
+
+def signature(up_card, counts, no_blackjack=True, rules=None):
+    """Cache key: the up card, the blackjack flag, the soft 17 rule and the counts of values 1 to 10"""
+    dealer_hits = (rules or blackjack.get_rules(blackjack.DEFAULT_SETTINGS["rules"])).dealer_hits
+    return SIGNATURE.pack(up_card, no_blackjack, dealer_hits[True][17], *counts[1:11])
+
+class DealerOdds:
+    """distribution() behind a bounded LRU cache that can be saved to disk"""
+    def __init__(self, maxsize=1 << 16, path=CACHE_FILE):
+        self.maxsize = maxsize
+        self.path = path
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+        if path and os.path.exists(path):
+            self.load()
+    def get(self, up_card, counts, no_blackjack=True, rules=None):
+        key = signature(up_card, counts, no_blackjack, rules)
+        cache = self.cache
+        result = cache.get(key)
+        if result is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = cache[key] = distribution(up_card, counts, no_blackjack, rules)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False) # Least recently used
+        return result
+    def load(self):
+        with open(self.path, "rb") as file:
+            data = file.read()
+        if data[:4] != MAGIC or data[4:5] != bytes((VERSION,)):
+            return # Not ours (or an old version), start over
+        for key, *probabilities in ENTRY.iter_unpack(data[5:5 + (len(data) - 5)//ENTRY.size*ENTRY.size]):
+            self.cache[key] = tuple(probabilities)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+    def save(self):
+        """Writes the cache (least recently used first, so loading it keeps the order)"""
+        data = bytearray(MAGIC + bytes((VERSION,)))
+        for key, probabilities in self.cache.items():
+            data += ENTRY.pack(key, *probabilities)
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, self.path)
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Exact dealer final total probabilities.")
+    parser.add_argument("--decks", type=int, default=6, help="decks in a full shoe (default: 6)")
+    parser.add_argument("--up", type=int, choices=range(1, 11), metavar="1-10", help="dealer's up card (1 is an ace; default: all)")
+    parser.add_argument("--counts", help="cards left of each value from ace to ten, comma separated (default: a full shoe)")
+    parser.add_argument("--with-blackjack", action="store_true", help="don't rule out the dealer's blackjack")
+    parser.add_argument("--rules", help="table rules, as in the settings (default: your saved settings)")
+    options = parser.parse_args(args)
+    try:
+        rules = blackjack.get_rules(options.rules or blackjack.load_settings().rules)
+    except ValueError as error:
+        parser.error(str(error))
+    odds = DealerOdds()
+    print("Up card " + " ".join(f"{outcome:>7}" for outcome in OUTCOMES))
+    for up_card in [options.up] if options.up else range(1, 11):
+        if options.counts:
+            counts = [0] + [int(count) for count in options.counts.split(",")]
+            if len(counts) != 11:
+                parser.error("give ten counts, from aces to tens")
+        else:
+            counts = full_shoe(options.decks)
+            counts[up_card] -= 1
+        probabilities = odds.get(up_card, counts, not options.with_blackjack, rules)
+        print(f"{'A' if up_card == 1 else up_card:>7} " + " ".join(f"{probability:7.4f}" for probability in probabilities))
+    odds.save()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,161 @@
+'''Decision dataset: every decision the players make in their turns (CPU and human), written as
+columns of memory-mappable NumPy .npy files, with an index by game situation to audit strategies.
+
+    python blackjack.py simulate 1000000 --decisions decisions
+    python decision_dataset.py query decisions --total 18 --soft --up 9 --action H
+
+Columns (one row per decision, in the order they were made):
+    total.npy    u1  hand total before the decision
+    soft.npy     u1  1 if the hand was soft
+    pair.npy     u1  1 if the hand was a pair
+    up_card.npy  u1  dealer's up card value (aces are 1)
+    action.npy   u1  the decision as an ASCII letter: H(it), S(tand), D(ouble down), P (split) or R (surrender)
+    outcome.npy  i1  result of the hand it was made on (blackjack.LOSS, DRAW, WIN, BLACKJACK or SURRENDERED)
+    seat.npy     u1  the player's seat
+    human.npy    u1  1 for human players
+Writing only needs the standard library: rows are appended to the column files as they come, under a
+fixed size .npy header that close() rewrites with the final row count.
+The index (NumPy, built by close() or the index command) is order.npy, the row numbers sorted by
+situation, and offsets.npy, where every situation starts in order. A situation is
+((soft*32 + total)*11 + up card)*5 + the action's place in ACTIONS, so its rows are
+order[offsets[situation]:offsets[situation + 1]]: two lookups instead of a scan.
+'''
+import sys                  # For the command line arguments
+import os                   # For the dataset folder
+import time                 # For timing queries
+import struct               # For the .npy headers
+import blackjack
+
+COLUMNS = {"total": "|u1", "soft": "|u1", "pair": "|u1", "up_card": "|u1", "action": "|u1",
+           "outcome": "|i1", "seat": "|u1", "human": "|u1"}
+ACTIONS = "HSDPR"
+SITUATIONS = 2*32*11*len(ACTIONS)
+HEADER_SIZE = 128       # Bytes of every .npy header (room for any row count)
+FLUSH_ROWS = 1 << 16    # Rows kept in memory before they're written
+
+def npy_header(descr, rows):
+    """A .npy (version 1.0) header for a column of `rows` values"""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", HEADER_SIZE - 10) + header.ljust(HEADER_SIZE - 11).encode() + b"\n"
+def situation(total, soft, up_card, action):
+    """Index key of a situation (works on NumPy arrays too, with the actions' places in ACTIONS)"""
+    return ((soft*32 + total)*11 + up_card)*len(ACTIONS) + action
+
+class DecisionWriter:
+    """Records the decisions of every round (see blackjack.decision_log) to a dataset folder"""
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.files = {}
+        for name, descr in COLUMNS.items():
+            self.files[name] = open(os.path.join(directory, name + ".npy"), "wb")
+            self.files[name].write(npy_header(descr, 0))
+        self.buffers = {name: bytearray() for name in COLUMNS}
+        self.rows = 0           # Rows written to the files
+        self.pending = []       # (player, hand number) of this round's decisions, for their outcomes
+        self.seats = {}
+        self.up_card = 0
+    def deal(self, players, dealer_hand):
+        """Called by round_prompts once the cards are dealt"""
+        self.up_card = blackjack.CARD_VALUES[dealer_hand[0]]
+        self.seats = {id(player): seat for seat, player in enumerate(players)}
+    def append(self, player, decision, human):
+        """Called by Player.log_decision before the decision is played (human is the player's human flag)"""
+        hand = player.hand
+        buffers = self.buffers
+        buffers["total"].append(hand.total)
+        buffers["soft"].append(hand.soft)
+        buffers["pair"].append(hand.pair)
+        buffers["up_card"].append(self.up_card)
+        buffers["action"].append(ord(decision))
+        buffers["seat"].append(self.seats[id(player)])
+        buffers["human"].append(human)
+        self.pending.append((player, player.hand_id))
+    def end_round(self):
+        """Called by round_prompts after the payout, when the hands' results are known"""
+        outcomes = self.buffers["outcome"]
+        for player, hand_id in self.pending:
+            outcomes.append(player.round_results[hand_id] & 0xFF)
+        self.pending.clear()
+        if len(outcomes) >= FLUSH_ROWS:
+            self.flush()
+    def flush(self):
+        for name, buffer in self.buffers.items():
+            self.files[name].write(buffer)
+        self.rows += len(self.buffers["outcome"])
+        for buffer in self.buffers.values():
+            buffer.clear()
+    def close(self):
+        """Writes what's left, sets the row counts and builds the index (if NumPy is there)"""
+        for buffer in self.buffers.values(): # Decisions of a round that didn't finish
+            del buffer[len(self.buffers["outcome"]):]
+        self.flush()
+        for name, file in self.files.items():
+            file.seek(0)
+            file.write(npy_header(COLUMNS[name], self.rows))
+            file.close()
+        try:
+            build_index(self.directory)
+        except ImportError: # Index it later with the index command
+            pass
+
+def load(directory):
+    """The dataset's columns (and index, if it's built) as read-only memory maps"""
+    import numpy as np
+    columns = {}
+    for name in list(COLUMNS) + ["order", "offsets"]:
+        path = os.path.join(directory, name + ".npy")
+        if os.path.exists(path):
+            columns[name] = np.load(path, mmap_mode="r")
+    return columns
+def build_index(directory):
+    """Writes order.npy and offsets.npy (see the module docstring)"""
+    import numpy as np
+    columns = load(directory)
+    action_places = np.zeros(256, dtype=np.int64)
+    action_places[[ord(action) for action in ACTIONS]] = np.arange(len(ACTIONS))
+    keys = situation(columns["total"].astype(np.int64), columns["soft"].astype(np.int64),
+                     columns["up_card"].astype(np.int64), action_places[columns["action"]])
+    order = np.argsort(keys, kind="stable").astype(np.uint32 if keys.size < 1 << 32 else np.int64)
+    offsets = np.zeros(SITUATIONS + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=SITUATIONS), out=offsets[1:])
+    np.save(os.path.join(directory, "order.npy"), order)
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+def query(columns, total, soft, up_card, action):
+    """Row numbers of the decisions taken in a situation (action is a letter of ACTIONS)"""
+    key = situation(total, int(soft), up_card, ACTIONS.index(action))
+    return columns["order"][columns["offsets"][key]:columns["offsets"][key + 1]]
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Indexes and queries decision datasets.")
+    parser.add_argument("command", choices=["index", "query"])
+    parser.add_argument("directory", help="dataset folder")
+    parser.add_argument("--total", type=int, help="hand total")
+    parser.add_argument("--soft", action="store_true", help="soft hands (default: hard hands)")
+    parser.add_argument("--up", type=int, choices=range(1, 11), metavar="1-10", help="dealer's up card (1 is an ace)")
+    parser.add_argument("--action", choices=list(ACTIONS), help="only this decision (default: all of them)")
+    options = parser.parse_args(args)
+    if options.command == "index":
+        build_index(options.directory)
+        return
+    if options.total is None or options.up is None:
+        parser.error("query needs --total and --up")
+    columns = load(options.directory)
+    if "order" not in columns:
+        parser.error("the dataset has no index, build it with the index command")
+    print(f"{'soft' if options.soft else 'hard'} {options.total} against {'A' if options.up == 1 else options.up}:")
+    names = {blackjack.LOSS: "lost", blackjack.DRAW: "drawn", blackjack.WIN: "won",
+             blackjack.BLACKJACK: "blackjacks", blackjack.SURRENDERED: "surrendered"}
+    for action in options.action or ACTIONS:
+        start = time.perf_counter()
+        rows = query(columns, options.total, options.soft, options.up, action)
+        outcomes = columns["outcome"][rows]
+        elapsed = time.perf_counter() - start
+        if not rows.size:
+            continue
+        results = ", ".join(f"{(outcomes == result).mean():.1%} {name}" for result, name in names.items() if (outcomes == result).any())
+        print(f"  {action}: {rows.size} decisions ({columns['human'][rows].sum()} human): {results} ({elapsed*1000:.2f} ms)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,255 @@
+'''Hand history: an append-only binary log of every round played, with a streaming reader
+and a replayer that plays the recorded rounds through the engine again.
+
+File layout (little endian), one session after another (a writer appending to a file starts a new one):
+    header: b"BJHH", version (u8), length (u32) and JSON of the session's settings and seat names
+    rounds: one frame per round, payload length (u32) followed by the payload
+A frame length is never b"BJHH" read as a u32 (over a GB), so that's how readers find the next header.
+Round payload:
+    round number (u32), stack number (u32), cards dealt (u16), seats (u8), dealer cards (u8),
+    the cards dealt in order and the dealer's cards (one card code per byte), then for each seat:
+    seat number (u8), money before the round (f64), money after it (f64), decisions (u16),
+    hands (u8), the decisions (one ASCII letter each: P, D, H, S or R) and for each hand:
+    bet (f64), result (i8), cards (u8) and the card codes.
+'''
+import sys                  # For the command line arguments
+import json                 # For the settings in the header
+import time                 # For periodic flushes
+import struct               # For the binary records
+from collections import namedtuple
+import blackjack
+
+MAGIC   = b"BJHH"
+VERSION = 2
+FILE_HEADER  = struct.Struct("<4sBI")
+FRAME_HEADER = struct.Struct("<I")
+ROUND_HEADER = struct.Struct("<IIHBB")
+SEAT_HEADER  = struct.Struct("<BddHB")
+HAND_HEADER  = struct.Struct("<dbB")
+
+Round    = namedtuple("Round", "session number stack cards dealer seats")
+Seat     = namedtuple("Seat", "seat name money_before money_after decisions hands")
+HandLog  = namedtuple("HandLog", "bet result cards")
+
+class HandHistoryWriter:
+    """Logs rounds as binary frames. Frames are batched in memory and written when the buffer
+    gets big or every `flush_seconds`, and always on close()."""
+    def __init__(self, path, buffer_size=1 << 16, flush_seconds=5.0):
+        self.file = open(path, "ab")
+        self.new_session = True     # Session header still to be written
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.flush_seconds = flush_seconds
+        self.last_flush = time.monotonic()
+        self.rounds = 0
+        self.stacks = 0
+        self.names  = None
+        self._shoe = None
+        self._first_card = 0
+        self._money = []
+    def start_round(self, players, dealing_cards, settings):
+        """Called by play_round before the bets"""
+        if self.new_session:
+            self.names = [player.name for player in players]
+            payload = json.dumps({"settings": dict(settings), "names": self.names}).encode()
+            self.buffer += FILE_HEADER.pack(MAGIC, VERSION, len(payload)) + payload
+            self.new_session = False
+        if dealing_cards is not self._shoe or dealing_cards.cursor < self._first_card:
+            self.stacks += 1
+            self._shoe = dealing_cards
+        self._first_card = dealing_cards.cursor
+        self._money = [player.money for player in players]
+        for player in players:
+            player.decisions = []
+    def end_round(self, players, dealer_hand, dealing_cards):
+        """Called by play_round after the payout"""
+        codes = blackjack.CARD_CODES
+        cards = bytes(dealing_cards.cards[self._first_card:dealing_cards.cursor]) # Lazily shuffled, so in dealing order
+        dealer = bytes(codes[card] for card in dealer_hand)
+        seats = bytearray()
+        num_seats = 0
+        for seat, (player, money_before) in enumerate(zip(players, self._money)):
+            if player.bankruptcy: # Not dealt in this round (bankruptcies are checked after the round)
+                continue
+            num_seats += 1
+            decisions = "".join(player.decisions).encode()
+            seats += SEAT_HEADER.pack(seat, money_before, player.money, len(decisions), len(player.hands)) + decisions
+            for hand, bet, result in zip(player.hands, player.bet, player.round_results):
+                seats += HAND_HEADER.pack(bet, result, len(hand)) + bytes(codes[card] for card in hand)
+        payload = ROUND_HEADER.pack(self.rounds, self.stacks, len(cards), num_seats, len(dealer)) + cards + dealer + seats
+        self.buffer += FRAME_HEADER.pack(len(payload)) + payload
+        self.rounds += 1
+        if len(self.buffer) >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+    def flush(self):
+        self.file.write(self.buffer)
+        self.file.flush()
+        self.buffer.clear()
+        self.last_flush = time.monotonic()
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_header(file):
+    """Reads a session header, returns {"settings": ..., "names": ...}"""
+    magic, version, length = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a hand history file (or an unsupported version)")
+    return json.loads(file.read(length))
+def decode_round(payload, names, session=0):
+    number, stack, num_cards, num_seats, num_dealer = ROUND_HEADER.unpack_from(payload)
+    offset = ROUND_HEADER.size
+    cards = payload[offset:offset + num_cards]
+    offset += num_cards
+    dealer = payload[offset:offset + num_dealer]
+    offset += num_dealer
+    seats = []
+    for seat_num in range(num_seats):
+        seat, money_before, money_after, num_decisions, num_hands = SEAT_HEADER.unpack_from(payload, offset)
+        offset += SEAT_HEADER.size
+        decisions = payload[offset:offset + num_decisions].decode()
+        offset += num_decisions
+        hands = []
+        for hand in range(num_hands):
+            bet, result, num_hand_cards = HAND_HEADER.unpack_from(payload, offset)
+            offset += HAND_HEADER.size
+            hands.append(HandLog(bet, result, payload[offset:offset + num_hand_cards]))
+            offset += num_hand_cards
+        seats.append(Seat(seat, names[seat], money_before, money_after, decisions, hands))
+    return Round(session, number, stack, cards, dealer, seats)
+def read_sessions(path, where=None):
+    """Streams (session header, Round) for the rounds in a hand history file, one frame at a time.
+    `where` is an optional filter called with each Round."""
+    with open(path, "rb") as file:
+        header = read_header(file)
+        session = 0
+        while True:
+            frame = file.read(FRAME_HEADER.size)
+            if len(frame) < FRAME_HEADER.size:
+                return
+            if frame == MAGIC: # The next session
+                file.seek(-FRAME_HEADER.size, 1)
+                header = read_header(file)
+                session += 1
+                continue
+            length, = FRAME_HEADER.unpack(frame)
+            payload = file.read(length)
+            if len(payload) < length: # Last frame of a run that died mid-write
+                return
+            round_log = decode_round(payload, header["names"], session)
+            if where is None or where(round_log):
+                yield header, round_log
+def read_history(path, where=None):
+    """Streams the rounds (Round) in a hand history file. `where` is an optional filter called with each Round."""
+    for header, round_log in read_sessions(path, where):
+        yield round_log
+def card_names(codes):
+    """Card codes as the cards they stand for"""
+    return [blackjack.CARD_TYPES[code] for code in codes]
+
+class Replay_Player(blackjack.CPU_Player):
+    """Seat that bets and decides what a recorded player did"""
+    __slots__ = ("recorded_bet", "recorded_decisions", "next_decision")
+    def make_bets(self, minimum_bet, maximum_bet):
+        self.bet = [self.recorded_bet]
+        self.money -= self.recorded_bet
+    def _takes(self, decision):
+        """True (and moves on) if the next recorded decision is this one"""
+        if self.recorded_decisions[self.next_decision:self.next_decision + 1] == decision:
+            self.next_decision += 1
+            return True
+        return False
+    def split_pairs_logic(self, *args):
+        if self._takes("P"):
+            self.split_pairs()
+            return True
+        return False
+    def surrender_logic(self, *args):
+        if self._takes("R"):
+            return self.surrender()
+        return False
+    def double_down_logic(self, dealing_cards, *args):
+        if self._takes("D"):
+            return self.double_down(dealing_cards)
+        return False
+    def hit_or_stand_logic(self, *args):
+        if self._takes("H"):
+            return True
+        self._takes("S")
+        return False
+def replay(path, where=None):
+    """Plays the recorded rounds again through the engine (with the recorded cards, bets and
+    decisions) with the settings of their session and checks they end the same way.
+    Returns (rounds replayed, mismatched rounds as (session, round number))."""
+    saved = blackjack.settings if hasattr(blackjack, "settings") else None
+    saved_history = blackjack.hand_history
+    game_output = blackjack.output
+    blackjack.output = blackjack.Renderer(blackjack.SILENT)
+    blackjack.hand_history = None
+    replayed = 0
+    mismatches = []
+    session = None
+    try:
+        for header, round_log in read_sessions(path, where):
+            if round_log.session != session:
+                session = round_log.session
+                blackjack.settings = blackjack.Settings.from_dict(header["settings"])
+            players = []
+            for seat in round_log.seats:
+                player = Replay_Player(seat.money_before, seat.name)
+                # Every hand bets the first bet, or twice that if it doubled down (once at most)
+                bet = min(hand.bet for hand in seat.hands)
+                player.recorded_bet = bet/2 if seat.decisions.count("D") == len(seat.hands) else bet
+                player.recorded_decisions = seat.decisions
+                player.next_decision = 0
+                players.append(player)
+            blackjack.play_round(players, blackjack.Shoe.from_codes(round_log.cards))
+            replayed += 1
+            for seat, player in zip(round_log.seats, players):
+                if player.money != seat.money_after or [bytes(blackjack.CARD_CODES[card] for card in hand)
+                                                        for hand in player.hands] != [hand.cards for hand in seat.hands]:
+                    mismatches.append((round_log.session, round_log.number))
+                    break
+    finally:
+        blackjack.output = game_output
+        blackjack.hand_history = saved_history
+        if saved is not None:
+            blackjack.settings = saved
+    return replayed, mismatches
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Reads and replays blackjack hand history files.")
+    parser.add_argument("command", choices=["show", "replay"])
+    parser.add_argument("path", help="hand history file")
+    parser.add_argument("--seat", type=int, help="only rounds where this seat (from 0) played")
+    parser.add_argument("--session", type=int, help="only rounds of this session (from 0, one per run that wrote to the file)")
+    parser.add_argument("--stack", type=int, help="only rounds of this stack")
+    parser.add_argument("--limit", type=int, help="show at most this many rounds")
+    options = parser.parse_args(args)
+    def where(round_log):
+        if options.session is not None and round_log.session != options.session:
+            return False
+        if options.stack is not None and round_log.stack != options.stack:
+            return False
+        return options.seat is None or any(seat.seat == options.seat for seat in round_log.seats)
+    if options.command == "replay":
+        replayed, mismatches = replay(options.path, where)
+        print(f"Replayed {replayed} rounds, {len(mismatches)} didn't match" + (f": {mismatches[:20]}" if mismatches else "."))
+        return 1 if mismatches else 0
+    for count, round_log in enumerate(read_history(options.path, where)):
+        if options.limit is not None and count >= options.limit:
+            break
+        print(f"Session {round_log.session} stack {round_log.stack} round {round_log.number + 1}: dealer {card_names(round_log.dealer)}")
+        for seat in round_log.seats:
+            hands = " ".join(f"{card_names(hand.cards)} ${hand.bet:g} ({hand.result:+d})" for hand in seat.hands)
+            print(f"  {seat.name}: {hands} decisions {seat.decisions or '-'} money ${seat.money_before:g} -> ${seat.money_after:g}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,149 @@
+'''Live metrics: counters the engine updates after every round, published in the Prometheus text
+format over HTTP and/or to a file.
+
+    python blackjack.py simulate 100000000 --metrics 9100 --metrics-file metrics.prom
+    curl localhost:9100/metrics
+
+The round loop only adds to plain counters. Every `publish_seconds` it copies them into an
+immutable snapshot (with the rates and the bankroll percentiles worked out then) when a round
+starts, so the last round's bankruptcies have been checked by then, and the HTTP
+server and the file writer (both in daemon threads) only ever read the latest snapshot, so the
+round loop never waits on them and never takes a lock. Only the rounds played in this process
+are counted (not montecarlo.py's or tournament.py's workers).
+'''
+import os                   # For replacing the metrics file atomically
+import time                 # For the rates and the intervals
+import threading            # For the server and the file writer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import blackjack
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+class Metrics:
+    """Counters updated by the engine (start_round and end_round, called by round_prompts)"""
+    def __init__(self, publish_seconds=1.0):
+        self.publish_seconds = publish_seconds
+        self.start_time = time.monotonic()
+        self.rounds = 0
+        self.cards_dealt = 0
+        self.hands = 0
+        self.blackjacks = 0
+        self.wagered = 0
+        self.casino_winnings = 0
+        self.seat_hands = []    # Hands played by every seat
+        self.seat_busts = []    # Hands busted by every seat
+        self.players = []       # The players of the last round (for bankruptcies and bankrolls)
+        self._cursor = 0
+        self._money = 0
+        self._last_publish = (self.start_time, 0)   # (time, rounds) of the last snapshot
+        self.snapshot = self._snapshot(self.start_time)
+    def start_round(self, players, dealing_cards):
+        self._cursor = dealing_cards.cursor
+        self._money = sum(player.money for player in players)
+        now = time.monotonic()
+        if now - self._last_publish[0] >= self.publish_seconds:
+            self.publish(now)
+    def end_round(self, players, dealing_cards):
+        self.rounds += 1
+        self.cards_dealt += dealing_cards.cursor - self._cursor
+        self.players = players
+        if len(self.seat_hands) < len(players):
+            extra = len(players) - len(self.seat_hands)
+            self.seat_hands += [0]*extra
+            self.seat_busts += [0]*extra
+        money = 0
+        for seat, player in enumerate(players):
+            money += player.money
+            if player.bankruptcy: # Not dealt in (bankruptcies are checked after the round)
+                continue
+            self.wagered += sum(player.bet)
+            for hand, result in zip(player.hands, player.round_results):
+                self.seat_hands[seat] += 1
+                if hand.total > 21:
+                    self.seat_busts[seat] += 1
+                if result == blackjack.BLACKJACK:
+                    self.blackjacks += 1
+            self.hands += len(player.hands)
+        self.casino_winnings += self._money - money
+    def publish(self, now=None):
+        """Makes a new snapshot of the counters (done by start_round every publish_seconds)"""
+        now = time.monotonic() if now is None else now
+        self.snapshot = self._snapshot(now)
+        self._last_publish = (now, self.rounds)
+    def _snapshot(self, now):
+        last_time, last_rounds = self._last_publish
+        bankrolls = sorted(player.money for player in self.players)
+        return {
+            "rounds":           self.rounds,
+            "rounds_per_second": (self.rounds - last_rounds)/(now - last_time) if now > last_time else 0.0,
+            "cards_dealt":      self.cards_dealt,
+            "hands":            self.hands,
+            "wagered":          self.wagered,
+            "casino_winnings":  self.casino_winnings,
+            "house_edge":       self.casino_winnings/self.wagered if self.wagered else 0.0,
+            "blackjack_rate":   self.blackjacks/self.hands if self.hands else 0.0,
+            "seat_bust_rates":  [busts/hands if hands else 0.0 for busts, hands in zip(self.seat_busts, self.seat_hands)],
+            "bankrupt_players": sum(player.bankruptcy for player in self.players),
+            "bankrolls":        [(quantile, bankrolls[min(len(bankrolls) - 1, int(quantile*len(bankrolls)))]) for quantile in QUANTILES]
+                                if bankrolls else [],
+            "bankroll_sum":     sum(bankrolls),
+            "bankroll_count":   len(bankrolls),
+            "uptime":           now - self.start_time,
+        }
+    def render(self):
+        """The latest snapshot in the Prometheus text format"""
+        snapshot = self.snapshot
+        lines = []
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP blackjack_{name} {help_text}")
+            lines.append(f"# TYPE blackjack_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"blackjack_{name}{labels} {value}")
+        metric("rounds_total", "counter", "Rounds played.", [("", snapshot["rounds"])])
+        metric("rounds_per_second", "gauge", "Rounds played per second since the last snapshot.", [("", snapshot["rounds_per_second"])])
+        metric("cards_dealt_total", "counter", "Cards dealt.", [("", snapshot["cards_dealt"])])
+        metric("hands_total", "counter", "Player hands played.", [("", snapshot["hands"])])
+        metric("wagered_total", "counter", "Money bet, after doubling down and splitting.", [("", snapshot["wagered"])])
+        metric("casino_winnings", "gauge", "Money the casino won from the players.", [("", snapshot["casino_winnings"])])
+        metric("house_edge", "gauge", "Casino winnings over money bet.", [("", snapshot["house_edge"])])
+        metric("blackjack_rate", "gauge", "Player hands that were a blackjack.", [("", snapshot["blackjack_rate"])])
+        metric("seat_bust_rate", "gauge", "Hands that busted, per seat.",
+               [(f'{{seat="{seat}"}}', rate) for seat, rate in enumerate(snapshot["seat_bust_rates"], start=1)])
+        metric("bankrupt_players", "gauge", "Players out of money.", [("", snapshot["bankrupt_players"])])
+        metric("bankroll", "summary", "Players' money.", [(f'{{quantile="{quantile}"}}', value) for quantile, value in snapshot["bankrolls"]]
+               + [("_sum", snapshot["bankroll_sum"]), ("_count", snapshot["bankroll_count"])])
+        metric("uptime_seconds", "gauge", "Seconds since the metrics started.", [("", snapshot["uptime"])])
+        return "\n".join(lines) + "\n"
+    def serve(self, port, host="127.0.0.1"):
+        """Serves the metrics at http://host:port/metrics from a daemon thread. Returns the server."""
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args): # Don't print every request over the game
+                pass
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    def write(self, path):
+        """Writes the latest snapshot to `path` (through a temporary file, so readers never see half of it)"""
+        temporary = path + ".tmp"
+        with open(temporary, "w") as file:
+            file.write(self.render())
+        os.replace(temporary, path)
+    def write_every(self, path, seconds=10.0):
+        """Writes the metrics file every `seconds` from a daemon thread"""
+        def writer():
+            while True:
+                time.sleep(seconds)
+                self.write(path)
+        threading.Thread(target=writer, daemon=True).start()
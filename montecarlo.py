@@ -0,0 +1,177 @@
+'''Monte Carlo runner: plays many CPU-only stacks on every core and merges the results.'''
+import sys                  # For the command line arguments
+import os                   # For the number of cores and resuming runs
+import json                 # For streaming the per-stack results
+import time                 # For timing runs
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import blackjack
+
+STACKS_PER_TASK = 32    # Stacks each worker plays before sending its results back (for runs that don't save them)
+QUEUED_PER_WORKER = 4   # Stacks waiting for each worker in run(), which gets every stack back on its own
+corpora = {}            # Shoe corpora opened by this process, by path
+
+def play_stack(sim_settings, seed, stack, corpus_path=None):
+    """Plays one stack with a fresh CPU table. The shuffle and the CPU decisions use the
+    stack's own streams (see blackjack.RandomStreams), so a stack plays the same no matter
+    which worker gets it, and any stack can be played again from its number alone.
+    With a corpus_path, the stack is dealt from that shoe corpus instead of being shuffled."""
+    corpus = None
+    if corpus_path:
+        if corpus_path not in corpora:
+            import shoe_corpus
+            corpora[corpus_path] = shoe_corpus.ShoeCorpus(corpus_path) # Mapped once per worker
+        corpus = corpora[corpus_path]
+    stats = blackjack.simulate(sim_settings, stacks=1, bankroll=True, seed=seed, first_stack=stack, corpus=corpus)
+    stats["stack"] = stack
+    del stats["seconds"], stats["rounds_per_sec"]
+    return stats
+def play_stacks(sim_settings, seed, stacks, corpus_path=None):
+    """Worker task: plays each of the given stacks"""
+    return [play_stack(sim_settings, seed, stack, corpus_path) for stack in stacks]
+
+def load_results(path):
+    """Reads the per-stack results already streamed to `path` (if any)"""
+    results = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    stats = json.loads(line)
+                except ValueError: # Half-written line from a run that died
+                    continue
+                results[stats["stack"]] = stats
+    return results
+def run(sim_settings, stacks, workers=None, seed=0, out_path=None, on_stack=None, corpus_path=None):
+    """Plays `stacks` stacks across a process pool and returns the merged report.
+    Every stack's results are appended to `out_path` (JSON lines) as soon as it's played,
+    and stacks already in that file are skipped, so an interrupted run can be resumed
+    (a worker that dies only loses the stack it was playing).
+    With a corpus_path, stack n is dealt from stack n of that shoe corpus (see shoe_corpus.py)."""
+    workers = workers or os.cpu_count() or 1
+    results = load_results(out_path) if out_path else {}
+    pending = [stack for stack in range(stacks) if stack not in results]
+    out_file = open(out_path, "a") if out_path else None
+    start_time = time.perf_counter()
+    def save(done):
+        for future in done:
+            stats = future.result()
+            results[stats["stack"]] = stats
+            if out_file:
+                out_file.write(json.dumps(stats) + "\n")
+                out_file.flush()
+            if on_stack:
+                on_stack(stats)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = set()
+            for stack in pending: # Submitted as the workers get through them, not all at once
+                futures.add(executor.submit(play_stack, sim_settings, seed, stack, corpus_path))
+                if len(futures) >= workers*QUEUED_PER_WORKER:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    save(done)
+            save(as_completed(futures))
+    except BrokenProcessPool:
+        print(f"A worker died. {len(results)} of {stacks} stacks were saved, run again to resume.", file=sys.stderr)
+        raise
+    finally:
+        if out_file:
+            out_file.close()
+    report = merge_results([results[stack] for stack in sorted(results)])
+    report["seconds"] = time.perf_counter() - start_time
+    return report
+
+def merge_results(results):
+    """Merges per-stack results into one report"""
+    keys = ("rounds", "hands", "blackjacks", "won", "drawn", "lost", "wagered", "casino_winnings", "bankrupt_players")
+    report = {key: sum(stats[key] for stats in results) for key in keys}
+    report["stacks"] = len(results)
+    report["house_edge"] = report["casino_winnings"]/report["wagered"] if report["wagered"] else 0.0
+    # Per seat totals (every stack starts a new table, so seats are matched by position)
+    seats = []
+    for stats in results:
+        for seat, player in enumerate(stats["players"]):
+            if seat == len(seats):
+                seats.append({"seat": seat + 1, "blackjacks": 0, "won": 0, "drawn": 0, "lost": 0,
+                              "rounds": 0, "bankruptcies": 0, "final_money": 0})
+            for key in ("blackjacks", "won", "drawn", "lost", "rounds"):
+                seats[seat][key] += player[key]
+            seats[seat]["bankruptcies"] += player["bankruptcy"]
+            seats[seat]["final_money"] += player["money"]
+    for seat in seats:
+        seat["final_money"] /= len(results)  # Average over stacks
+    report["seats"] = seats
+    # Average bankroll after each round of the stack, per seat
+    report["bankroll"] = []
+    for seat in range(len(seats)):
+        totals = []
+        counts = []
+        for stats in results:
+            for round_num, money in enumerate(stats["bankroll"][seat]):
+                if round_num == len(totals):
+                    totals.append(0)
+                    counts.append(0)
+                totals[round_num] += money
+                counts[round_num] += 1
+        report["bankroll"].append([total/count for total, count in zip(totals, counts)])
+    return report
+
+def parse_overrides(overrides):
+    """KEY=VALUE strings as a settings dict"""
+    sim_settings = {}
+    for override in overrides:
+        key, value = override.split("=", 1)
+        try:
+            sim_settings[key] = json.loads(value)
+        except ValueError: # Plain strings like easy/hard
+            sim_settings[key] = value
+    return sim_settings
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Plays CPU-only blackjack stacks on every core.")
+    parser.add_argument("stacks", type=int, nargs="?", help="number of stacks to play")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--seed", default="0", help="master seed")
+    parser.add_argument("--out", help="file to stream per-stack results to (JSON lines), and resume from")
+    parser.add_argument("--stack", type=int, metavar="N",
+                        help="only play stack N again (e.g. an outlier of an earlier run with the same seed)")
+    parser.add_argument("--corpus", metavar="FILE", help="deal the stacks from this shoe corpus (see shoe_corpus.py)")
+    parser.add_argument("--history", metavar="FILE", help="with --stack, log the stack's rounds to a hand history file")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting, e.g. --set CPU_difficulty=hard --set blackjack_multiplier=1.2")
+    options = parser.parse_args(args)
+    if options.stacks is None and options.stack is None:
+        parser.error("give the number of stacks to play (or --stack N)")
+    try:
+        sim_settings = blackjack.load_settings().replace(**parse_overrides(options.set))
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    if options.corpus:
+        import shoe_corpus
+        with shoe_corpus.ShoeCorpus(options.corpus) as corpus:
+            sim_settings = sim_settings.replace(num_decks=corpus.num_decks) # The corpus decides
+    if options.stack is not None:
+        if options.history:
+            import hand_history
+            blackjack.hand_history = hand_history.HandHistoryWriter(options.history)
+        try:
+            stats = play_stack(sim_settings, options.seed, options.stack, options.corpus)
+        finally:
+            if blackjack.hand_history is not None:
+                blackjack.hand_history.close()
+        for player in stats["players"]:
+            print(f"{player['name']}: ${player['money']:.2f} - Blackjacks: {player['blackjacks']} | Won: {player['won']} | "
+                  f"Drawn: {player['drawn']} | Lost: {player['lost']} | Bankrupt: {player['bankruptcy']}")
+        print(f"rounds: {stats['rounds']} house_edge: {stats['house_edge']}")
+        return
+    report = run(sim_settings, options.stacks, options.workers, options.seed, options.out, corpus_path=options.corpus)
+    seats = report.pop("seats")
+    del report["bankroll"]
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    for seat in seats:
+        print(f"Seat {seat['seat']}: average final money ${seat['final_money']:.2f} - Blackjacks: {seat['blackjacks']} | "
+              f"Won: {seat['won']} | Drawn: {seat['drawn']} | Lost: {seat['lost']} | Bankruptcies: {seat['bankruptcies']}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
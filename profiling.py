@@ -0,0 +1,152 @@
+'''Opt-in profiling for the round loop.
+While a Profiler is installed, the round phases (bets, dealing, turns, dealer, payout and
+bankruptcy checks) are wrapped with timers and a few engine counters are kept. Nothing is
+wrapped otherwise, so the game runs at full speed when nobody is profiling it.
+
+    with Profiler(trace=True) as profiler:
+        blackjack.simulate(settings, rounds=10000)
+    print(profiler.summary())
+    profiler.write_trace("trace.json")   # Open in chrome://tracing or Perfetto
+'''
+import sys                  # For the command line arguments
+import os                   # For the trace's process id
+import json                 # For the trace file
+import time                 # For timing
+import functools            # For wrapping functions
+import blackjack
+
+# Phases timed in the round loop: (class or None for module functions, attribute, phase name)
+# Human bets and turns are prompts driven by play_round, so their time (mostly thinking) stays in it
+PHASES = [
+    (None,                  "play_round",       "play_round"),
+    (blackjack.CPU_Player,  "make_bets",        "make_bets"),
+    (blackjack.Player,      "deal_two_cards",   "deal_two_cards"),
+    (blackjack.CPU_Player,  "turn",             "turn"),
+    (None,                  "dealer_turn",      "dealer_turn"),
+    (blackjack.Player,      "payout",           "payout"),
+    (blackjack.Player,      "check_bankrupcy",  "check_bankrupcy"),
+]
+# Calls counted (not timed): (class or None, attribute, counter name)
+# Hand totals are updated by Hand.append (total_up isn't called by the engine any more)
+COUNTERS = [
+    (blackjack.Shoe,        "deal",             "cards_dealt"),
+    (None,                  "make_decks",       "shuffles"),
+    (blackjack.Shoe,        "shuffle",          "shuffles"),
+    (blackjack.Hand,        "append",           "hand_updates"),
+]
+
+class Profiler:
+    """Times the round phases and counts engine calls while installed"""
+    def __init__(self, trace=False, max_events=1000000):
+        self.phases   = {}      # Phase name: [calls, seconds]
+        self.counters = {}      # Counter name: calls
+        self.events   = [] if trace else None   # (phase, start, duration) for the trace
+        self.max_events = max_events
+        self.wall_time  = 0.0
+        self._originals = []
+        self._start = None
+    def _owner(self, cls):
+        return blackjack.__dict__ if cls is None else cls.__dict__
+    def _replace(self, cls, name, wrapper):
+        self._originals.append((cls, name, self._owner(cls)[name]))
+        if cls is None:
+            setattr(blackjack, name, wrapper)
+        else:
+            setattr(cls, name, wrapper)
+    def _timed(self, function, phase):
+        stats = self.phases.setdefault(phase, [0, 0.0])
+        events = self.events
+        max_events = self.max_events
+        perf_counter = time.perf_counter
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                if events is not None and len(events) < max_events:
+                    events.append((phase, start, elapsed))
+        return wrapper
+    def _counted(self, function, counter):
+        counters = self.counters
+        counters.setdefault(counter, 0)
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counters[counter] += 1
+            return function(*args, **kwargs)
+        return wrapper
+    def install(self):
+        """Wraps the engine functions. Call uninstall() (or use `with`) to put them back."""
+        if self._originals:
+            return self
+        for cls, name, phase in PHASES:
+            self._replace(cls, name, self._timed(self._owner(cls)[name], phase))
+        for cls, name, counter in COUNTERS:
+            self._replace(cls, name, self._counted(self._owner(cls)[name], counter))
+        self._start = time.perf_counter()
+        return self
+    def uninstall(self):
+        if not self._originals:
+            return
+        self.wall_time += time.perf_counter() - self._start
+        for cls, name, original in reversed(self._originals):
+            if cls is None:
+                setattr(blackjack, name, original)
+            else:
+                setattr(cls, name, original)
+        self._originals = []
+    def __enter__(self):
+        return self.install()
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    def summary(self):
+        """Phase timings and counters as a text table"""
+        wall_time = self.wall_time or 1e-9
+        lines = [f"{'phase':<16} {'calls':>10} {'total ms':>12} {'mean us':>10} {'% wall':>8}"]
+        for phase, (calls, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            if calls:
+                lines.append(f"{phase:<16} {calls:>10} {seconds*1000:>12.1f} {seconds/calls*1e6:>10.2f} {seconds/wall_time:>8.1%}")
+        lines.append(f"{'wall time':<16} {'':>10} {self.wall_time*1000:>12.1f}")
+        lines.append("")
+        for counter, calls in self.counters.items():
+            lines.append(f"{counter:<16} {calls:>10}")
+        return "\n".join(lines)
+    def trace(self):
+        """Chrome trace-event JSON object with one complete event per timed call"""
+        if self.events is None:
+            raise ValueError("This profiler wasn't recording a trace (use Profiler(trace=True))")
+        origin = min((start for phase, start, elapsed in self.events), default=0.0)
+        pid = os.getpid()
+        events = [{"name": phase, "cat": "round", "ph": "X", "pid": pid, "tid": 0,
+                   "ts": (start - origin)*1e6, "dur": elapsed*1e6} for phase, start, elapsed in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": dict(self.counters)}
+    def write_trace(self, path):
+        with open(path, "w") as file:
+            json.dump(self.trace(), file)
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Profiles the blackjack round loop.")
+    parser.add_argument("rounds", type=int, nargs="?", default=10000, help="rounds to simulate (default: 10000)")
+    parser.add_argument("--trace", metavar="FILE", help="also write a Chrome trace-event file")
+    parser.add_argument("--play", action="store_true", help="profile a normal game instead of a simulation")
+    options = parser.parse_args(args)
+    profiler = Profiler(trace=bool(options.trace))
+    with profiler:
+        if options.play:
+            try:
+                blackjack.main_loop()
+            except SystemExit: # Quitting the game ends the profile
+                pass
+        else:
+            blackjack.simulate(blackjack.load_settings(), rounds=options.rounds)
+    print(profiler.summary())
+    if options.trace:
+        profiler.write_trace(options.trace)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,164 @@
+'''Risk of ruin: the probability that a seat runs out of money (check_bankrupcy: less than the
+minimum bet) within N rounds, for the settings' starting money, CPU bet policy and table limits.
+
+    python risk_of_ruin.py --rounds 5000 --walks 200000 --bets flat:10
+    python risk_of_ruin.py --rounds 2000 --compare 200         (checks it against real games)
+
+It plays the engine once (with a bankroll big enough to never be short of money) to learn the
+distribution of a round's net result in bets, doubles, splits and blackjack payouts included.
+Then it plays hundreds of thousands of bankroll random walks side by side as NumPy arrays, each
+round drawing every walk's result from that distribution and betting like the bet policy would.
+It leaves out what the real table does differently near ruin: rounds are independent (no shoe
+effects) and a seat short of money for a double or a split is assumed to lose at most what it has.
+'''
+import sys                  # For the command line arguments
+import time                 # For timing runs
+import numpy as np
+import blackjack
+
+QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9)
+BLOCK = 64  # Rounds whose results are drawn at once (ruined walks are dropped between blocks)
+
+def outcome_distribution(sim_settings, rounds=100000, seed=0):
+    """(values, probabilities) of a seat's net result in a round, in initial bets, learned from
+    `rounds` rounds of the engine with the settings' seats and CPU difficulty"""
+    sim_settings = blackjack.Settings.from_dict(sim_settings)
+    bet = sim_settings.minimum_bet
+    learn_settings = sim_settings.replace(players_ai=max(1, sim_settings.players_ai), starting_money=10**12, CPU_bets=f"flat:{bet}")
+    stats = blackjack.simulate(learn_settings, rounds, bankroll=True, seed=seed)
+    trajectories = np.array(stats["bankroll"], dtype=np.float64)
+    results = np.diff(trajectories, axis=1, prepend=float(learn_settings.starting_money))/bet
+    values, counts = np.unique(results, return_counts=True)
+    return values, counts/counts.sum()
+
+def bet_sizes(spec):
+    """A bet policy (see blackjack.get_bet_policy) for arrays: (money, last bet, last net result) -> amounts.
+    progression looks at the sign of the money won in the last round instead of counting its hands."""
+    blackjack.get_bet_policy(spec) # Raises ValueError like the engine does
+    name, *args = spec.split(":")
+    numbers = [float(arg) for arg in args]
+    if name == "quarter":
+        return lambda money, last_bet, last_net: money/4
+    if name == "flat":
+        return lambda money, last_bet, last_net: np.full_like(money, numbers[0])
+    if name in ("fraction", "kelly"):
+        fraction = numbers[0] if name == "fraction" else max(0.0, numbers[0]*numbers[1]/blackjack.HAND_VARIANCE)
+        return lambda money, last_bet, last_net: money*fraction
+    base, factor = numbers
+    def progression(money, last_bet, last_net):
+        bets = np.where(last_net < 0, last_bet*factor, np.where(last_net > 0, base, last_bet))
+        return np.where(last_bet == 0, base, bets)
+    return progression
+
+def ruin_walks(values, probabilities, sim_settings, rounds, walks, seed=None):
+    """Plays `walks` bankrolls for up to `rounds` rounds. Returns (ruin round, final money) arrays:
+    the round (from 1) each walk went bankrupt in, 0 if it didn't."""
+    sim_settings = blackjack.Settings.from_dict(sim_settings)
+    minimum_bet, maximum_bet = sim_settings.minimum_bet, sim_settings.maximum_bet
+    policy = bet_sizes(sim_settings.CPU_bets)
+    rng = np.random.default_rng(seed)
+    cumulative = np.cumsum(probabilities)
+    cumulative[-1] = 1.0 # No rounding gap at the top
+    ruin_round  = np.zeros(walks, dtype=np.int64)
+    final_money = np.zeros(walks, dtype=np.float64)
+    walk_ids = np.arange(walks)
+    money    = np.full(walks, float(sim_settings.starting_money))
+    last_bet = np.zeros(walks)
+    last_net = np.zeros(walks)
+    if sim_settings.starting_money < minimum_bet: # Bankrupt before the first round
+        return np.ones(walks, dtype=np.int64), money
+    for block_start in range(0, rounds, BLOCK):
+        block_rounds = min(BLOCK, rounds - block_start)
+        results = values[np.searchsorted(cumulative, rng.random((block_rounds, walk_ids.size)), side="right")]
+        ruined = np.zeros(walk_ids.size, dtype=np.int64)
+        for offset in range(block_rounds):
+            live = ruined == 0
+            # Like CPU_Player.make_bets: rounded down, between the minimum bet and the maximum bet (or the money)
+            bets = np.floor(np.minimum(np.minimum(maximum_bet, money), np.maximum(policy(money, last_bet, last_net), minimum_bet)))
+            bets *= live
+            net = np.maximum(bets*results[offset], -money)
+            money += net
+            last_bet = np.where(live, bets, last_bet)
+            last_net = net
+            ruined[live & (money < minimum_bet)] = block_start + offset + 1
+        done = ruined > 0
+        ruin_round[walk_ids[done]] = ruined[done]
+        final_money[walk_ids[done]] = money[done]
+        walk_ids, money, last_bet, last_net = walk_ids[~done], money[~done], last_bet[~done], last_net[~done]
+        if not walk_ids.size:
+            break
+    final_money[walk_ids] = money
+    return ruin_round, final_money
+
+def ruin_curve(ruin_round, rounds, points=10):
+    """[(rounds, probability of ruin within them, its standard error)] at `points` even steps"""
+    ruined = np.sort(ruin_round[ruin_round > 0])
+    curve = []
+    for step in range(1, points + 1):
+        within = rounds*step//points
+        probability = np.searchsorted(ruined, within, side="right")/ruin_round.size
+        curve.append((within, probability, np.sqrt(probability*(1 - probability)/ruin_round.size)))
+    return curve
+def ruin_time_quantiles(ruin_round, quantiles=QUANTILES):
+    """[(quantile, rounds to ruin)] over all walks, None where that many walks didn't go bankrupt"""
+    times = np.sort(np.where(ruin_round > 0, ruin_round, np.iinfo(np.int64).max))
+    results = []
+    for quantile in quantiles:
+        value = times[min(times.size - 1, int(quantile*times.size))]
+        results.append((quantile, None if value == np.iinfo(np.int64).max else int(value)))
+    return results
+
+def compare_games(sim_settings, rounds, games, seed=0):
+    """Fraction of the seats of `games` engine games of `rounds` rounds that went bankrupt"""
+    bankrupt = seats = 0
+    for game in range(games):
+        stats = blackjack.simulate(sim_settings, rounds, seed=f"{seed}:compare:{game}")
+        bankrupt += stats["bankrupt_players"]
+        seats += len(stats["players"])
+    return bankrupt/seats, seats
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Estimates the risk of ruin with NumPy bankroll random walks.")
+    parser.add_argument("--rounds", type=int, default=1000, help="rounds to play (default: 1000)")
+    parser.add_argument("--walks", type=int, default=100000, help="bankrolls to play (default: 100000)")
+    parser.add_argument("--learn-rounds", type=int, default=100000, help="engine rounds to learn the results from (default: 100000)")
+    parser.add_argument("--money", type=int, help="starting money (default: your saved settings)")
+    parser.add_argument("--difficulty", help="CPU difficulty (default: your saved settings)")
+    parser.add_argument("--bets", help="CPU bet policy (default: your saved settings)")
+    parser.add_argument("--minimum-bet", type=int, help="minimum bet (default: your saved settings)")
+    parser.add_argument("--maximum-bet", type=int, help="maximum bet (default: your saved settings)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--compare", type=int, metavar="GAMES",
+                        help="also play this many games with blackjack.simulate and show both ruin probabilities")
+    options = parser.parse_args(args)
+    overrides = {"starting_money": options.money, "CPU_difficulty": options.difficulty, "CPU_bets": options.bets,
+                 "minimum_bet": options.minimum_bet, "maximum_bet": options.maximum_bet}
+    try:
+        sim_settings = blackjack.load_settings().replace(**{key: value for key, value in overrides.items() if value is not None})
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    start_time = time.perf_counter()
+    values, probabilities = outcome_distribution(sim_settings, options.learn_rounds, options.seed)
+    learned = time.perf_counter()
+    mean = float(values @ probabilities)
+    print(f"Round results ({options.learn_rounds} rounds, {learned - start_time:.1f}s): {values.size} values, "
+          f"mean {mean:+.4f} bets, standard deviation {np.sqrt(values**2 @ probabilities - mean**2):.4f} bets")
+    ruin_round, final_money = ruin_walks(values, probabilities, sim_settings, options.rounds, options.walks, options.seed)
+    print(f"{options.walks} walks of {options.rounds} rounds in {time.perf_counter() - learned:.1f}s "
+          f"(${sim_settings.starting_money}, bets {sim_settings.CPU_bets}, limits ${sim_settings.minimum_bet}-${sim_settings.maximum_bet})\n")
+    print("Rounds   P(ruin)")
+    for within, probability, stderr in ruin_curve(ruin_round, options.rounds):
+        print(f"{within:>6}   {probability:.4f} ± {1.96*stderr:.4f}")
+    print("\nRounds to ruin: " + ", ".join(f"{quantile:.0%} {f'>{options.rounds}' if value is None else value}"
+                                           for quantile, value in ruin_time_quantiles(ruin_round)))
+    survivors = final_money[ruin_round == 0]
+    if survivors.size:
+        print("Survivors' money: " + ", ".join(f"{quantile:.0%} ${np.quantile(survivors, quantile):.0f}" for quantile in QUANTILES))
+    if options.compare:
+        probability, seats = compare_games(sim_settings, options.rounds, options.compare, options.seed)
+        print(f"\nEngine: {probability:.4f} ± {1.96*np.sqrt(probability*(1 - probability)/seats):.4f} "
+              f"of {seats} seats bankrupt within {options.rounds} rounds")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
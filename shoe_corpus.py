@@ -0,0 +1,158 @@
+'''Shoe corpus: many pregenerated shuffled stacks in one binary file, read through mmap.
+Comparing two strategies or settings on the same shoes (common random numbers) takes the
+shuffle noise out of the difference, so it needs far fewer stacks than two separate runs.
+
+    python shoe_corpus.py make shoes.bjc 1000000 --decks 6 --seed 1
+    python shoe_corpus.py compare shoes.bjc 100000 --a CPU_difficulty=easy --b CPU_difficulty=hard
+
+File layout (little endian): b"BJSC", version (u8), decks per stack (u8), cards per stack (u16),
+number of stacks (u64), seed length (u16) and seed, then the card codes of every stack back to back.
+Stack n is the same shoe a seeded simulation (blackjack.simulate(..., seed=seed)) plays as stack n.
+'''
+import sys                  # For the command line arguments
+import os                   # For the number of cores
+import mmap                 # For reading the corpus without copying it
+import math                 # For the standard errors
+import struct               # For the header
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import blackjack
+import montecarlo
+
+MAGIC   = b"BJSC"
+VERSION = 1
+HEADER  = struct.Struct("<4sBBHQH")
+SHOES_PER_TASK = 1000   # Stacks each worker shuffles at a time
+
+def generate_shoes(num_decks, seed, first, count):
+    """Worker task: the card codes of stacks first..first+count-1, shuffled with each stack's
+    own stream exactly like Shoe.deal does it"""
+    streams = blackjack.RandomStreams(seed)
+    new_stack = bytearray(range(len(blackjack.CARD_TYPES))) * (4*num_decks)
+    size = len(new_stack)
+    codes = bytearray()
+    for stack in range(first, first + count):
+        draw = streams.shoe(stack).random
+        cards = bytearray(new_stack)
+        for cursor in range(size):
+            pick = cursor + int(draw() * (size - cursor))
+            cards[cursor], cards[pick] = cards[pick], cards[cursor]
+        codes += cards
+    return bytes(codes)
+def make_corpus(path, num_shoes, num_decks=6, seed=0, workers=None):
+    """Writes `num_shoes` shuffled stacks to `path`. The stack count is only filled in once
+    every stack is written, so a half-written corpus can't be opened by mistake."""
+    seed = str(seed).encode()
+    size = 52*num_decks
+    firsts = range(0, num_shoes, SHOES_PER_TASK)
+    counts = [min(SHOES_PER_TASK, num_shoes - first) for first in firsts]
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, num_decks, size, 0, len(seed)) + seed)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            chunks = executor.map(generate_shoes, repeat(num_decks), repeat(seed.decode()), firsts, counts)
+            for chunk in chunks: # In order
+                file.write(chunk)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, num_decks, size, num_shoes, len(seed)))
+
+class ShoeCorpus:
+    """A corpus file mapped read-only into memory. The pages are shared through the page cache
+    by every process that opens the same file, and shoe() hands the engine a view of them
+    instead of a copy."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_decks, self.shoe_size, self.count, seed_length = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a shoe corpus (or an unsupported version)")
+        self.offset = HEADER.size + seed_length
+        self.seed = self.map[HEADER.size:self.offset].decode()
+        if self.count == 0 or len(self.map) != self.offset + self.count*self.shoe_size:
+            raise ValueError(f"{path} is incomplete (was it still being written?)")
+        self.view = memoryview(self.map)
+    def __len__(self):
+        return self.count
+    def shoe(self, stack):
+        """Stack number `stack` as a Shoe that deals straight from the mapped file"""
+        if not 0 <= stack < self.count:
+            raise IndexError(f"The corpus only has {self.count} stacks")
+        start = self.offset + stack*self.shoe_size
+        return blackjack.Shoe.from_codes(self.view[start:start + self.shoe_size], self.num_decks)
+    def close(self):
+        """Unmaps the file (every Shoe from the corpus has to be gone by then)"""
+        self.view.release()
+        self.map.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc_info):
+        self.close()
+
+def compare(path, settings_a, settings_b, stacks, workers=None, seed=None):
+    """Plays the same corpus stacks with two settings and returns both house edges and their
+    difference, with standard errors. CPU decisions use the same streams in both runs too.
+    Raises ValueError if the corpus doesn't have that many stacks."""
+    with ShoeCorpus(path) as corpus:
+        if not 0 < stacks <= len(corpus):
+            raise ValueError(f"Can't play {stacks} stacks, {path} has {len(corpus)}")
+        if seed is None:
+            seed = corpus.seed
+    runs = []
+    for sim_settings in (settings_a, settings_b):
+        per_stack = {}
+        report = montecarlo.run(sim_settings, stacks, workers, seed, corpus_path=path,
+                                on_stack=lambda stats: per_stack.__setitem__(stats["stack"], stats))
+        runs.append((report, per_stack))
+    # Linearized (delta method) errors of the ratio casino_winnings/wagered, paired by stack
+    residuals = []
+    for report, per_stack in runs:
+        mean_wagered = report["wagered"]/stacks
+        residuals.append([(per_stack[stack]["casino_winnings"] - report["house_edge"]*per_stack[stack]["wagered"])/mean_wagered
+                          for stack in range(stacks)])
+    def stderr(values):
+        mean = sum(values)/len(values)
+        return math.sqrt(sum((value - mean)**2 for value in values)/(len(values) - 1)/len(values)) if len(values) > 1 else 0.0
+    (report_a, _), (report_b, _) = runs
+    return {"house_edge_a": report_a["house_edge"], "stderr_a": stderr(residuals[0]),
+            "house_edge_b": report_b["house_edge"], "stderr_b": stderr(residuals[1]),
+            "difference": report_a["house_edge"] - report_b["house_edge"],
+            "difference_stderr": stderr([a - b for a, b in zip(*residuals)])}
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Makes shoe corpora and compares settings on them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("make", help="pregenerate a corpus")
+    make.add_argument("path")
+    make.add_argument("shoes", type=int, help="number of stacks")
+    make.add_argument("--decks", type=int, default=6, help="decks per stack (default: 6)")
+    make.add_argument("--seed", default="0", help="master seed")
+    make.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    compare_parser = commands.add_parser("compare", help="play two settings on the same stacks")
+    compare_parser.add_argument("path")
+    compare_parser.add_argument("stacks", type=int, help="number of corpus stacks to play")
+    compare_parser.add_argument("--a", action="append", default=[], metavar="KEY=VALUE", help="settings of the first run")
+    compare_parser.add_argument("--b", action="append", default=[], metavar="KEY=VALUE", help="settings of the second run")
+    compare_parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    options = parser.parse_args(args)
+    if options.command == "make":
+        make_corpus(options.path, options.shoes, options.decks, options.seed, options.workers)
+        return
+    with ShoeCorpus(options.path) as corpus:
+        num_decks = corpus.num_decks
+    settings = blackjack.load_settings().replace(num_decks=num_decks) # The corpus decides
+    try:
+        settings_a = settings.replace(**montecarlo.parse_overrides(options.a))
+        settings_b = settings.replace(**montecarlo.parse_overrides(options.b))
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    try:
+        result = compare(options.path, settings_a, settings_b, options.stacks, options.workers)
+    except ValueError as error:
+        parser.error(str(error))
+    print(f"A: house edge {result['house_edge_a']:.5f} ± {result['stderr_a']:.5f}")
+    print(f"B: house edge {result['house_edge_b']:.5f} ± {result['stderr_b']:.5f}")
+    print(f"A - B: {result['difference']:+.5f} ± {result['difference_stderr']:.5f} (same shoes)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
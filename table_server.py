@@ -0,0 +1,227 @@
+'''Table server: runs many blackjack tables in one process with asyncio.
+Human seats connect over a Unix socket (e.g. `nc -U blackjack.sock`), or play on the server's own
+stdin/stdout pipes with --local. A table starts once its human seats are taken. While a human
+thinks, only their own table waits: the other tables (and CPU-only tables) keep playing.
+
+    python table_server.py --socket blackjack.sock --tables 100 --humans 1 --cpus 2
+
+The engine keeps its state in module globals (settings, output, cpu_random), so every table puts
+its own back (Table.activate) whenever it resumes after waiting for a human.
+'''
+import sys                  # For the command line arguments and the local seat
+import asyncio              # For the table scheduler
+import blackjack
+
+RULES_URL = "https://bicyclecards.com/how-to-play/blackjack/"
+
+class Remote_Player(blackjack.Human_Player):
+    """Human seat connected through an asyncio stream (socket or pipe)"""
+    __slots__ = ("reader", "writer", "left")
+    def __init__(self, money, name, reader, writer):
+        super().__init__(money, name)
+        self.reader = reader
+        self.writer = writer
+        self.left   = False
+    def send(self, text):
+        if not self.left:
+            self.writer.write(text.encode())
+    async def ask(self, prompt):
+        """Sends the prompt and waits for the player's answer. A player who leaves (q, or closes
+        the connection) goes bankrupt, so their seat is skipped from then on."""
+        if self.left:
+            return ""
+        self.send(prompt)
+        try:
+            await self.writer.drain()
+            line = await self.reader.readline()
+        except ConnectionError:
+            line = b""
+        answer = line.decode(errors="replace").strip()
+        if not line or answer.lower() in ["q", "quit", "exit"]:
+            self.leave()
+            return ""
+        if answer.lower() == "rules":
+            self.send(f"{RULES_URL}\n")
+            return await self.ask("")
+        return answer
+    def leave(self):
+        self.left = True
+        self.bankruptcy = True
+        self.writer.close()
+    def check_bankrupcy(self):
+        """Like Player.check_bankrupcy, without waiting for the player to read it"""
+        if self.money < blackjack.settings.minimum_bet and not self.bankruptcy:
+            self.bankruptcy = True
+            blackjack.output.show(f"{self.name} ran out of money! Better luck next time!\n")
+
+class Table:
+    """One table: its settings, rules, players, output and random streams"""
+    def __init__(self, number, settings, seed=None):
+        self.number   = number
+        self.settings = settings
+        self.rules    = blackjack.get_rules(settings.rules)
+        self.humans   = []
+        self.cpus     = [blackjack.CPU_Player(settings.starting_money, f"CPU {cpu+1}",
+                                              blackjack.get_strategy(settings.CPU_difficulty),
+                                              blackjack.get_bet_policy(settings.CPU_bets))
+                         for cpu in range(settings.players_ai)]
+        self.output   = blackjack.Renderer(blackjack.CARDS if settings.players_human else settings.verbosity,
+                                           write=self.broadcast)
+        self.streams  = blackjack.RandomStreams(seed).spawn(number)
+        self.cpu_random = self.streams.decisions(0)
+        self.full     = asyncio.Event()
+        self.finished = asyncio.Event()
+        if settings.players_human == 0:
+            self.full.set()
+    @property
+    def players(self):
+        return self.humans + self.cpus
+    def seat(self, player):
+        self.humans.append(player)
+        if len(self.humans) == self.settings.players_human:
+            self.full.set()
+    def broadcast(self, text):
+        """Sends the table's output to every human seat"""
+        for player in self.humans:
+            player.send(text)
+    def activate(self):
+        """Puts this table's state in the engine's globals"""
+        blackjack.settings   = self.settings
+        blackjack.output     = self.output
+        blackjack.cpu_random = self.cpu_random
+    async def play_round(self, dealing_cards):
+        """Plays a round, waiting for the human seats' answers without blocking the other tables.
+        Returns the dealer's hand, like blackjack.play_round."""
+        self.activate()
+        prompts = blackjack.round_prompts(self.players, dealing_cards, self.rules)
+        answer = None
+        while True:
+            try:
+                player, prompt = prompts.send(answer)
+            except StopIteration as done:
+                return done.value # The dealer's hand
+            self.output.flush()
+            answer = await player.ask(prompt)
+            self.activate()
+    async def run(self):
+        """Plays the table's stacks (like play_game), then sends everyone the standings"""
+        try:
+            return await self._play()
+        finally:
+            self.finished.set() # Lets the seats' connections go even if the table failed
+    async def _play(self):
+        await self.full.wait()
+        players = self.players
+        total_rounds = 0
+        for stack in range(self.settings.stacks):
+            self.activate()
+            self.cpu_random = blackjack.cpu_random = self.streams.decisions(stack)
+            if self.output.level >= blackjack.ROUNDS:
+                self.output.show(blackjack.emboss(f"TABLE {self.number+1} - STACK {stack+1}"))
+            dealing_cards = blackjack.make_decks(self.settings.num_decks, blackjack.CARD_TYPES, self.streams.shoe(stack))
+            round_num = 0
+            while not dealing_cards.reached_cut_card(len(players)):
+                if self.output.level >= blackjack.ROUNDS:
+                    self.output.show(f"----ROUND {round_num+1}----\n")
+                await self.play_round(dealing_cards)
+                for player in players:
+                    player.check_bankrupcy()
+                round_num += 1
+                total_rounds += 1
+                if all(player.bankruptcy for player in players):
+                    break
+                await asyncio.sleep(0) # Let the other tables play
+            if all(player.bankruptcy for player in players):
+                break
+        self.activate()
+        if self.output.level >= blackjack.SUMMARY:
+            self.output.show(f"\nEnd of game. Total number of rounds: {total_rounds} rounds.\n")
+            self.output.show(blackjack.standings(players))
+        self.output.flush()
+        for player in self.humans:
+            if not player.left:
+                try:
+                    await player.writer.drain()
+                except ConnectionError: # Left while only the CPUs were playing
+                    pass
+                player.writer.close()
+        return total_rounds
+
+class Server:
+    """Seats humans at the first table with a free seat and runs every table as a task"""
+    def __init__(self, tables, settings, seed=None):
+        self.settings = settings
+        self.tables = [Table(number, settings, seed) for number in range(tables)]
+    def free_table(self):
+        for table in self.tables:
+            if len(table.humans) < self.settings.players_human:
+                return table
+        return None
+    async def connect(self, reader, writer):
+        """Handles a new human: asks their name and seats them"""
+        table = self.free_table()
+        if table is None:
+            writer.write(b"Every table is full, try again later.\n")
+            writer.close()
+            return
+        writer.write(b"Input your name: ")
+        await writer.drain()
+        name = (await reader.readline()).decode(errors="replace").strip()
+        table = self.free_table() # Someone else may have sat down meanwhile
+        if table is None:
+            writer.write(b"Every table is full, try again later.\n")
+            writer.close()
+            return
+        player = Remote_Player(self.settings.starting_money, name or f"Player {len(table.humans)+1}", reader, writer)
+        table.seat(player)
+        if not table.full.is_set():
+            player.send(f"Waiting for {self.settings.players_human - len(table.humans)} more players...\n")
+        await table.finished.wait()
+    async def run(self, socket_path=None, local=False):
+        """Runs every table until it ends. Returns the rounds played by each table that didn't fail."""
+        tasks = [asyncio.create_task(table.run()) for table in self.tables]
+        server = None
+        if socket_path:
+            server = await asyncio.start_unix_server(self.connect, socket_path)
+        if local:
+            asyncio.create_task(self.connect(*await open_stdio()))
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True) # One failing table doesn't stop the others
+            for table, result in zip(self.tables, results):
+                if isinstance(result, Exception):
+                    print(f"Table {table.number+1} stopped: {result!r}", file=sys.stderr)
+            return [result for result in results if not isinstance(result, Exception)]
+        finally:
+            if server is not None:
+                server.close()
+
+async def open_stdio():
+    """(reader, writer) streams for the terminal's stdin/stdout pipes"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    return reader, asyncio.StreamWriter(transport, protocol, reader, loop)
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Runs many blackjack tables with remote human seats.")
+    parser.add_argument("--socket", metavar="PATH", help="Unix socket humans connect to")
+    parser.add_argument("--local", action="store_true", help="seat one human on this terminal")
+    parser.add_argument("--tables", type=int, default=1, help="number of tables (default: 1)")
+    parser.add_argument("--humans", type=int, default=1, help="human seats per table (default: 1)")
+    parser.add_argument("--cpus", type=int, default=2, help="CPU seats per table (default: 2)")
+    parser.add_argument("--seed", help="master seed for the shuffles and CPU decisions")
+    options = parser.parse_args(args)
+    if options.humans and not (options.socket or options.local):
+        parser.error("human seats need --socket or --local")
+    try:
+        settings = blackjack.load_settings().replace(players_human=options.humans, players_ai=options.cpus,
+                                                     autopause=False) # Nobody waits for the other players
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    rounds = asyncio.run(Server(options.tables, settings, options.seed).run(options.socket, options.local))
+    print(f"{len(rounds)} tables played {sum(rounds)} rounds.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
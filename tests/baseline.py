@@ -0,0 +1,177 @@
+'''The CPU players' original decision logic and round loop (blackjack.py before the headless
+engine, list shoes and compiled strategies), without the printing, for checking the engine against.
+Only what an all-CPU table with plenty of money needs: bets are always the maximum bet.'''
+
+def total_up(hand):
+    """Returns the total value of a hand."""
+    _aces  = 0
+    _total = 0
+    for card in hand:
+        if card in ('J', 'Q', 'K'):  # Face cards are worth 10
+            _total += 10
+        elif card != "A":  # Number cards are worth their value
+            _total += card
+        else:  # Aces can be worth 11 or 1, so we need to check the max value of the hand <= 21
+            _aces += 1
+    while _aces > 0:  # Could be a for loop, but this just works, so don't touch it
+        if  _total >= 12 - _aces:  # Don't go over 21 when there are multiple aces in the hand
+            _total += 1
+        else:
+            _total += 11  # Player should decide between 1 and 11, but 11 is always better
+        _aces -= 1
+    return _total
+def is_soft(hand):
+    '''Returns True if the hand is a soft hand'''
+    _aces  = 0
+    _total = 0
+    for card in hand:
+        if card in ('J', 'Q', 'K'):  # Face cards are worth 10
+            _total += 10
+        elif card != "A":  # Number cards are worth their value
+            _total += card
+        else:  # Aces can be worth 11 or 1, so we need to check the max value of the hand <= 21
+            _aces += 1
+    if _aces > 0:
+        if  _total >= 12 - _aces:  # Soft hand condition
+            return False
+        else:
+            return True
+    return False
+
+# CPU_Player's decisions, with the dealer's up card instead of the dealer's hand
+def doubles_down(hand, up_card, difficulty):
+    if difficulty == "easy":
+        return total_up(hand) in [10, 11]
+    if total_up(hand) == 9 and up_card in range(3, 7):
+        return True
+    if total_up(hand) == 10 and up_card in range(2, 10):
+        return True
+    if total_up(hand) == 11 and up_card != 'A':
+        return True
+    return False
+def splits_pairs(hand, up_card, difficulty):
+    if total_up(hand) in [20, 10]: # Never split 10s or 5s
+        return False
+    if hand == ['A', 'A'] or total_up(hand) == 16: # Always split aces or 8s
+        return True
+    if difficulty == "easy":
+        return False
+    if total_up(hand) == 18 and not up_card in [7, 10, 'J', 'Q', 'K', 'A']:
+        return True
+    if total_up(hand) in [4, 6, 14] and up_card in range(2, 8):
+        return True
+    if total_up(hand) == 12 and up_card in range(2, 7):
+        return True
+    if total_up(hand) == 8 and up_card in [5, 6]:
+        return True
+    return False
+def hits(hand, up_card, difficulty, rng):
+    '''Returns True for hitting, False for standing'''
+    if difficulty == "easy":
+        return ((rng.random() >= 0.35) or total_up(hand) <= 11) and (total_up(hand) <= 17)
+    if is_soft(hand):
+        if total_up(hand) <= 17:
+            return True
+        if total_up(hand) == 18:
+            return up_card not in [2, 7, 8]
+        return False
+    if total_up(hand) == 12 and up_card in [4, 5, 6]:
+        return False
+    if total_up(hand) in range(13, 17) and up_card in range(2, 7):
+        return False
+    if total_up(hand) >= 17:
+        return False
+    return True
+
+def _turn(hands, results, bets, cards, up_card, difficulty, rng):
+    """CPU_Player.turn for one seat"""
+    hand_id = 0
+    while hand_id < len(hands):
+        hand = hands[hand_id]
+        if len(hands) == 1 and total_up(hand) == 21:
+            results[0] = "bj"
+            return
+        if hand == ["A"]: # After splitting aces you only get one card
+            hand.append(cards.pop(0))
+            hand_id += 1
+            continue
+        while total_up(hand) < 21:
+            if len(hand) == 1:
+                hand.append(cards.pop(0))
+                if total_up(hand) == 21:
+                    break
+            if len(hand) == 2 and hand[0] == hand[1] and splits_pairs(hand, up_card, difficulty):
+                bets.append(bets[hand_id])
+                results.append(0)
+                hands.append([hand.pop(0)])
+                hand_id -= 1
+                break
+            if total_up(hand) in [9, 10, 11] and len(hand) == 2 and doubles_down(hand, up_card, difficulty):
+                hand.append(cards.pop(0))
+                bets[hand_id] *= 2
+                break
+            if hits(hand, up_card, difficulty, rng):
+                hand.append(cards.pop(0))
+                if total_up(hand) > 21:
+                    results[hand_id] = -1
+                    break
+            else:
+                break
+        hand_id += 1
+
+def play_rounds(rounds, difficulty, rng, players=3, num_decks=6, bet=500, blackjack_multiplier=1.5):
+    """Plays `rounds` rounds like play_game did. Returns the stats blackjack.simulate has, plus
+    "round_nets": the casino's winnings in every round."""
+    stats = dict.fromkeys(("rounds", "hands", "blackjacks", "won", "drawn", "lost", "wagered"), 0)
+    round_nets = []
+    cards = []
+    while len(round_nets) < rounds:
+        if len(cards) < num_decks*13 + 2*players: # New stack
+            cards = ["A", 2, 3, 4, 5, 6, 7, 8, 9, 10, "J", "Q", "K"]*(4*num_decks)
+            rng.shuffle(cards)
+        seats = [([[cards.pop(0), cards.pop(0)]], [0], [bet]) for _ in range(players)]
+        dealer = [cards.pop(0), cards.pop(0)]
+        if total_up(dealer) == 21: # House blackjack
+            for hands, results, bets in seats:
+                results[0] = 0 if total_up(hands[0]) == 21 else -1
+        else:
+            for hands, results, bets in seats:
+                _turn(hands, results, bets, cards, dealer[0], difficulty, rng)
+            while total_up(dealer) < 17:
+                dealer.append(cards.pop(0))
+            dealer_total = total_up(dealer)
+            for hands, results, bets in seats:
+                for hand_id, hand in enumerate(hands):
+                    if dealer_total > 21: # check_player_bust
+                        if results[hand_id] == 0:
+                            results[hand_id] = 1
+                    elif total_up(hand) > dealer_total or results[hand_id] == "bj": # check_player_win
+                        if total_up(hand) > 21:
+                            results[hand_id] = -1
+                        elif results[hand_id] != "bj":
+                            results[hand_id] = 1
+                    elif total_up(hand) == dealer_total and total_up(hand) <= 21:
+                        results[hand_id] = 0
+                    else:
+                        results[hand_id] = -1
+        net = 0
+        for hands, results, bets in seats:
+            for result, hand_bet in zip(results, bets):
+                stats["hands"] += 1
+                stats["wagered"] += hand_bet
+                if result == "bj":
+                    stats["blackjacks"] += 1
+                    net -= hand_bet*blackjack_multiplier
+                elif result == 1:
+                    stats["won"] += 1
+                    net -= hand_bet
+                elif result == 0:
+                    stats["drawn"] += 1
+                else:
+                    stats["lost"] += 1
+                    net += hand_bet
+        round_nets.append(net)
+    stats["rounds"] = rounds
+    stats["casino_winnings"] = sum(round_nets)
+    stats["round_nets"] = round_nets
+    return stats
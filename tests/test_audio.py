@@ -0,0 +1,14 @@
+'''Picking the audio backend.'''
+import blackjack
+
+def test_silent_output_doesnt_keep_null_audio(monkeypatch):
+    monkeypatch.setattr(blackjack, "audio", None)
+    monkeypatch.setattr(blackjack, "load_settings", lambda: blackjack.Settings(bgm_volume=40))
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(blackjack.SILENT))
+    assert isinstance(blackjack.get_audio(), blackjack.Null_Audio)
+    assert blackjack.audio is None
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(blackjack.CARDS))
+    audio = blackjack.get_audio()
+    assert isinstance(audio, blackjack.Pygame_Audio) and audio.volume == 40
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(blackjack.SILENT))
+    assert blackjack.get_audio() is audio # Made once
@@ -0,0 +1,33 @@
+'''The bet policy optimizer's race: who gets dropped, when, and the same result from the same seed.'''
+import math
+
+import bet_optimizer
+
+SETTINGS = {"players_human": 0, "players_ai": 2, "stacks": 1, "num_decks": 1, "starting_money": 100, "verbosity": 0}
+
+def race(**options):
+    return bet_optimizer.optimize(SETTINGS, ["flat:2", "fraction:1", "flat:5", "fraction:0.5"], objective="survival",
+                                  batch=32, min_stacks=64, max_stacks=192, workers=1, seed=4, **options)
+
+def test_elimination():
+    reports = race()
+    by_policy = {report["policy"]: report for report in reports}
+    # Betting everything every round busts almost every seat: dropped at the first test, after only min_stacks
+    assert by_policy["fraction:1"]["dropped_after"] == 64 and by_policy["fraction:1"]["stacks"] == 64
+    assert by_policy["fraction:1"]["bust_rate"] > 0.9
+    winners = [report for report in reports if report["dropped_after"] is None]
+    assert winners and reports[:len(winners)] == winners
+    assert all(report["stacks"] == 192 for report in winners)
+    for report in reports[len(winners):]: # Dropped ones only played until they were dropped
+        assert report["stacks"] == report["dropped_after"] and report["score"] < winners[0]["score"]
+    assert race() == reports
+
+def test_paired_z():
+    leader = bet_optimizer.Candidate("flat:2", bet_optimizer.blackjack.Settings.from_dict(SETTINGS))
+    candidate = bet_optimizer.Candidate("flat:5", leader.settings)
+    leader.scores = {stack: 1.0 for stack in range(10)}
+    candidate.scores = {stack: 0.5 for stack in range(5)}
+    assert bet_optimizer.paired_z(leader, candidate) == math.inf
+    candidate.scores = {stack: 1.0 + (-1)**stack for stack in range(10)}
+    assert bet_optimizer.paired_z(leader, candidate) == 0.0
+    assert bet_optimizer.paired_z(candidate, leader) == 0.0 # Even differences
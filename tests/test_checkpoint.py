@@ -0,0 +1,54 @@
+'''Checkpoints: saving a simulation, killing it and resuming it ends like an uninterrupted run.'''
+import json
+import os
+import subprocess
+import sys
+import time
+
+import blackjack
+import checkpoint
+
+BLACKJACK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "blackjack.py")
+SETTINGS = {"players_human": 0, "players_ai": 2, "CPU_bets": "flat:2", "starting_money": 100000, "verbosity": 0}
+
+def run(directory, *args):
+    """Runs `blackjack.py simulate` in directory, returns its stats lines (without the timings)"""
+    result = subprocess.run([sys.executable, BLACKJACK, "simulate", *args], cwd=directory,
+                            capture_output=True, text=True, timeout=300, check=True)
+    return [line for line in result.stdout.splitlines()
+            if not line.startswith(("seconds", "rounds_per_sec", "Resuming"))]
+
+def test_kill_and_resume(tmp_path):
+    with open(tmp_path / "game_blackjack_settings.json", "w") as file:
+        json.dump(SETTINGS, file)
+    args = ["20000", "--seed", "1", "--checkpoint", "sim.bjcp"]
+    expected = run(tmp_path, *args)
+    assert not (tmp_path / "sim.bjcp").exists() # Removed once finished
+    # Save after every round, and kill it once it has saved
+    process = subprocess.Popen([sys.executable, BLACKJACK, "simulate", *args, "--checkpoint-every", "0"],
+                               cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 60
+    while not (tmp_path / "sim.bjcp").exists():
+        assert process.poll() is None, process.stderr.read().decode()
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    time.sleep(0.2)
+    process.kill()
+    process.wait()
+    saved = checkpoint.Checkpointer(str(tmp_path / "sim.bjcp")).load()
+    assert 0 < saved.total_rounds < 20000
+    assert all(isinstance(player, blackjack.CPU_Player) for player in saved.players)
+    assert run(tmp_path, *args) == expected
+
+def test_snapshot_round_trip():
+    blackjack.settings = blackjack.Settings(players_human=0, CPU_bets="flat:2", starting_money=1000)
+    players = [blackjack.CPU_Player(1000, "CPU 1"), blackjack.Human_Player(7.5, "Ann")]
+    players[0].bankruptcy = True
+    shoe = blackjack.make_decks(2, blackjack.CARD_TYPES)
+    shoe.deal()
+    state = checkpoint.restore(checkpoint.snapshot(players, shoe, 1, 2, 3, wagered=10, seed="x"))
+    assert (state.stack, state.round_num, state.total_rounds, state.wagered, state.seed) == (1, 2, 3, 10, "x")
+    assert state.shoe.cursor == 1 and bytes(state.shoe.cards) == bytes(shoe.cards)
+    assert [type(player) for player in state.players] == [blackjack.CPU_Player, blackjack.Human_Player]
+    assert [player.money for player in state.players] == [1000, 7.5]
+    assert state.players[0].bankruptcy and not state.players[1].bankruptcy
@@ -0,0 +1,74 @@
+'''Decision dataset: human flags, outcomes and the situation index.'''
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import blackjack
+import decision_dataset
+
+np = pytest.importorskip("numpy")
+
+BLACKJACK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "blackjack.py")
+
+def test_piped_human_game(tmp_path):
+    settings = {"players_human": 1, "players_ai": 1, "stacks": 1, "num_decks": 1,
+                "names_human": False, "names_ai": False, "autopause": False}
+    with open(tmp_path / "game_blackjack_settings.json", "w") as file:
+        json.dump(settings, file)
+    # Play, bet $2 and answer 2 (no, stand) to everything for a while, then quit
+    answers = "1\n" + "2\n"*20 + "q\n"*50
+    subprocess.run([sys.executable, BLACKJACK, "--decisions", "decisions"], cwd=tmp_path, input=answers,
+                   capture_output=True, text=True, timeout=60, check=True)
+    columns = decision_dataset.load(str(tmp_path / "decisions"))
+    seats, human = np.asarray(columns["seat"]), np.asarray(columns["human"])
+    assert (seats == 0).any() and (seats == 1).any()
+    assert (human == (seats == 0)).all() # Seat 0 is the human one
+    assert set(np.asarray(columns["action"][seats == 0]).tolist()) == {ord("S")}
+
+def test_outcomes_and_index(tmp_path):
+    writer = decision_dataset.DecisionWriter(str(tmp_path))
+    blackjack.decision_log = writer
+    try:
+        blackjack.simulate(blackjack.Settings(players_human=0, players_ai=3, CPU_difficulty="hard", CPU_bets="flat:2",
+                                              starting_money=10**6, rules="s17,surrender"), 3000, seed=1)
+    finally:
+        blackjack.decision_log = None
+    writer.close()
+    columns = decision_dataset.load(str(tmp_path))
+    rows = columns["total"].size
+    assert rows > 3000 and not columns["human"].any()
+    surrendered = np.asarray(columns["action"]) == ord("R")
+    assert surrendered.any() and (np.asarray(columns["outcome"])[surrendered] == blackjack.SURRENDERED).all()
+    # Every row is in the index once, under its own situation
+    assert sorted(np.asarray(columns["order"]).tolist()) == list(range(rows))
+    found = decision_dataset.query(columns, 16, False, 10, "R")
+    assert found.size and (np.asarray(columns["total"][found]) == 16).all() and (np.asarray(columns["up_card"][found]) == 10).all()
+    assert (np.asarray(columns["soft"][found]) == 0).all()
+
+def test_human_flag_in_process(tmp_path):
+    blackjack.settings = blackjack.Settings(players_human=1, players_ai=1, autopause=False)
+    blackjack.output = blackjack.Renderer(blackjack.SILENT)
+    writer = decision_dataset.DecisionWriter(str(tmp_path))
+    blackjack.decision_log = writer
+    players = [blackjack.Human_Player(100, "Ann"), blackjack.CPU_Player(100, "CPU 1", blackjack.get_strategy("hard"))]
+    try:
+        for round_num in range(10):
+            prompts = blackjack.round_prompts(players, blackjack.make_decks(1, blackjack.CARD_TYPES, random.Random(round_num)))
+            answer = None
+            while True:
+                try:
+                    player, prompt = prompts.send(answer)
+                except StopIteration:
+                    break
+                answer = "2" if prompt == "" else "h" if "Hit" in prompt and player.hand.total < 12 else "s"
+    finally:
+        blackjack.decision_log = None
+        blackjack.output = blackjack.Renderer()
+    writer.close()
+    columns = decision_dataset.load(str(tmp_path))
+    assert (np.asarray(columns["human"]) == (np.asarray(columns["seat"]) == 0)).all()
+    assert np.asarray(columns["human"]).any()
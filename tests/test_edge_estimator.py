@@ -0,0 +1,19 @@
+'''The house edge estimator's control variates.'''
+import statistics
+
+import pytest
+
+import blackjack
+import edge_estimator
+
+@pytest.mark.parametrize("num_decks", [1, 6])
+def test_controls_agree_with_the_plain_estimate(num_decks):
+    config = blackjack.Settings(players_human=0, players_ai=3, CPU_difficulty="hard", CPU_bets="flat:2",
+                                starting_money=10**7, num_decks=num_decks)
+    (result,), differences = edge_estimator.estimate([config], precision=0, batch=1000, min_stacks=1000, max_stacks=1000,
+                                                      workers=1, seed=1)
+    z = statistics.NormalDist().inv_cdf(0.975)
+    assert result.count == 1000 and differences == []
+    assert result.stderr < result.plain_stderr
+    # Whatever bias the cut card gives the controls is well inside both intervals
+    assert abs(result.edge - result.plain) <= z*min(result.stderr, result.plain_stderr)
@@ -0,0 +1,55 @@
+'''Hand's running totals against the original total_up and is_soft.'''
+import itertools
+
+import pytest
+
+import baseline
+import blackjack
+
+def assert_matches(hand):
+    assert hand.total == baseline.total_up(hand.cards), hand
+    assert hand.soft == baseline.is_soft(hand.cards), hand
+    assert hand.pair == (len(hand) == 2 and hand[0] == hand[1]), hand
+
+def test_every_short_hand():
+    for size in (1, 2, 3):
+        for cards in itertools.product(blackjack.CARD_TYPES, repeat=size):
+            assert_matches(blackjack.Hand(cards))
+
+@pytest.mark.parametrize("cards, totals, softs", [
+    (["A", "A", "A", "A"],   [11, 12, 13, 14], [True, True, True, True]),
+    (["A", "A", 9, 10],      [11, 12, 21, 21], [True, True, True, False]),
+    (["A", 5, "A", 5, "K"],  [11, 16, 17, 12, 22], [True, True, True, False, False]),
+    ([6, "A", "A", "A", 9],  [6, 17, 18, 19, 18], [False, True, True, True, False]),
+])
+def test_aces_going_hard(cards, totals, softs):
+    hand = blackjack.Hand()
+    for card, total, soft in zip(cards, totals, softs):
+        hand.append(card)
+        assert (hand.total, hand.soft) == (total, soft)
+        assert_matches(hand)
+
+def test_splitting_aces():
+    hand = blackjack.Hand(["A", "A"])
+    assert hand.pair and hand.soft and hand.total == 12
+    new_hand = hand.split()
+    for split_hand in (hand, new_hand):
+        assert split_hand.cards == ["A"] and split_hand.aces == 1 and not split_hand.pair
+        assert_matches(split_hand)
+    hand.append("K")
+    new_hand.append("A") # A pair again, which the player may resplit
+    assert hand.total == 21 and new_hand.pair and new_hand.total == 12
+    assert_matches(hand)
+    assert_matches(new_hand)
+
+def test_append_after_split():
+    hand = blackjack.Hand([8, 8])
+    new_hand = hand.split()
+    assert (hand.hard_total, hand.aces, new_hand.hard_total) == (8, 0, 8)
+    for card in ("A", 8, "A", 3): # Soft 19, then hard from the third card on
+        hand.append(card)
+        assert_matches(hand)
+    assert hand.cards == [8, "A", 8, "A", 3] and hand.total == 21 and not hand.soft
+    new_hand.append(8)
+    assert new_hand.pair and new_hand.cards == [8, 8]
+    assert_matches(new_hand)
@@ -0,0 +1,49 @@
+'''Hand history: sessions appended to one file keep their own settings and seats, and replay.'''
+import blackjack
+import hand_history
+
+def log_session(path, settings, rounds, seed, players=None):
+    blackjack.hand_history = hand_history.HandHistoryWriter(path)
+    try:
+        return blackjack.simulate(settings, rounds, seed=seed, players=players)
+    finally:
+        blackjack.hand_history.close()
+        blackjack.hand_history = None
+
+def test_appended_sessions(tmp_path):
+    path = str(tmp_path / "game.bjh")
+    two = blackjack.Settings(players_human=0, players_ai=2, CPU_bets="flat:2", starting_money=1000)
+    four = two.replace(players_ai=4, CPU_difficulty="easy", rules="h17,double:any")
+    first = log_session(path, two, 50, 1)
+    second = log_session(path, four, 30, 2)
+    rounds = list(hand_history.read_history(path))
+    assert len(rounds) == first["rounds"] + second["rounds"]
+    assert [round_log.session for round_log in rounds] == [0]*first["rounds"] + [1]*second["rounds"]
+    assert max(len(round_log.seats) for round_log in rounds if round_log.session == 1) == 4
+    assert rounds[first["rounds"]].number == 0
+    sessions = {round_log.session: header for header, round_log in hand_history.read_sessions(path)}
+    assert sessions[0]["settings"]["players_ai"] == 2 and sessions[1]["settings"]["rules"] == "h17,double:any"
+    assert hand_history.replay(path) == (len(rounds), [])
+    assert hand_history.replay(path, lambda round_log: round_log.session == 1) == (second["rounds"], [])
+
+def test_many_decisions(tmp_path, monkeypatch):
+    # A CPU that splits 2s into 40 hands and hits them all to 21: more than 255 decisions in a round
+    path = str(tmp_path / "splits.bjh")
+    settings = blackjack.Settings(players_human=0, players_ai=1, CPU_bets="flat:1", starting_money=10**6, rules="resplit:40")
+    strategy = blackjack.compile_strategy(lambda total, soft, pair_card, up_card: blackjack.SPLIT | (blackjack.HIT if total < 21 else 0))
+    player = blackjack.CPU_Player(10**6, "CPU 1", strategy)
+    decisions = []
+    class Writer(hand_history.HandHistoryWriter):
+        def end_round(self, players, dealer_hand, dealing_cards):
+            decisions.append(len(players[0].decisions))
+            super().end_round(players, dealer_hand, dealing_cards)
+    monkeypatch.setattr(blackjack, "settings", settings)
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(blackjack.SILENT))
+    monkeypatch.setattr(blackjack, "hand_history", Writer(path))
+    two, five = blackjack.CARD_CODES[2], blackjack.CARD_CODES[5]
+    shoe = blackjack.Shoe.from_codes(bytearray([two, two, five, five] + [two]*1000), 8) # Dealer 5 5
+    blackjack.play_round([player], shoe)
+    blackjack.hand_history.close()
+    assert decisions[0] > 255
+    round_log, = hand_history.read_history(path)
+    assert len(round_log.seats[0].decisions) == decisions[0]
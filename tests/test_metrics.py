@@ -0,0 +1,35 @@
+'''Live metrics: the counts match the simulation's, and the text format is complete.'''
+import blackjack
+import metrics
+
+def sample(text, name):
+    """Value of the first sample called `name` in a Prometheus text page"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.split()[1])
+    raise KeyError(name)
+
+def test_metrics_match_simulate(monkeypatch):
+    live = metrics.Metrics(publish_seconds=0)
+    monkeypatch.setattr(blackjack, "metrics", live)
+    settings = blackjack.Settings(players_human=0, players_ai=4, CPU_bets="quarter", starting_money=20, verbosity=0)
+    stats = blackjack.simulate(settings, 300, seed=2)
+    live.publish()
+    text = live.render()
+    assert stats["bankrupt_players"] > 0
+    assert sample(text, "blackjack_rounds_total") == stats["rounds"]
+    assert sample(text, "blackjack_bankrupt_players") == stats["bankrupt_players"]
+    assert sample(text, "blackjack_casino_winnings") == stats["casino_winnings"]
+    assert sample(text, "blackjack_bankroll_count") == 4
+    assert sample(text, "blackjack_bankroll_sum") == sum(player.money for player in live.players)
+    assert "# TYPE blackjack_bankroll summary" in text
+
+def test_snapshots_see_the_last_bankruptcies(monkeypatch):
+    live = metrics.Metrics(publish_seconds=0)
+    monkeypatch.setattr(blackjack, "metrics", live)
+    settings = blackjack.Settings(players_human=0, players_ai=1, CPU_bets="quarter", starting_money=2, verbosity=0)
+    stats = blackjack.simulate(settings, 1, seed=3) # Loses its only bet
+    assert stats["bankrupt_players"] == 1
+    # The next round's start publishes the round after its bankruptcy check
+    live.start_round(live.players, blackjack.Shoe(1))
+    assert live.snapshot["rounds"] == 1 and live.snapshot["bankrupt_players"] == 1
@@ -0,0 +1,30 @@
+'''Monte Carlo runner: results stream back stack by stack, and replaying one stack matches the run.'''
+import json
+
+import blackjack
+import montecarlo
+import shoe_corpus
+
+def test_stack_from_corpus_matches_the_run(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path) # Default settings
+    corpus = str(tmp_path / "shoes.bjc")
+    shoe_corpus.make_corpus(corpus, 4, num_decks=2, seed=3, workers=1)
+    out_path = str(tmp_path / "stacks.jsonl")
+    overrides = ["--set", "players_human=0", "--set", "starting_money=100000", "--set", "CPU_bets=flat:2"]
+    montecarlo.main(["4", "--workers", "2", "--corpus", corpus, "--out", out_path] + overrides)
+    with open(out_path) as file:
+        saved = {stats["stack"]: stats for stats in map(json.loads, file)}
+    assert sorted(saved) == [0, 1, 2, 3]
+    capsys.readouterr()
+    montecarlo.main(["--stack", "2", "--corpus", corpus] + overrides)
+    assert f"rounds: {saved[2]['rounds']} house_edge: {saved[2]['house_edge']}" in capsys.readouterr().out
+
+def test_results_are_saved_per_stack(tmp_path):
+    settings = blackjack.Settings(players_human=0, players_ai=1, CPU_bets="flat:2", starting_money=100000, num_decks=1)
+    out_path = str(tmp_path / "stacks.jsonl")
+    arrived = []
+    def on_stack(stats):
+        arrived.append(stats["stack"])
+        assert set(montecarlo.load_results(out_path)) == set(arrived) # On disk before the next one comes in
+    montecarlo.run(settings, 40, workers=2, seed=1, out_path=out_path, on_stack=on_stack)
+    assert sorted(arrived) == list(range(40))
@@ -0,0 +1,14 @@
+'''Profiling: every phase and counter is hit by a simulation, and uninstalling puts the engine back.'''
+import blackjack
+import profiling
+
+def test_every_phase_and_counter():
+    play_round = blackjack.play_round
+    settings = blackjack.Settings(players_human=0, players_ai=2, CPU_bets="flat:2", starting_money=10**6)
+    with profiling.Profiler() as profiler:
+        stats = blackjack.simulate(settings, 200, seed=1)
+    assert blackjack.play_round is play_round
+    assert profiler.phases["play_round"][0] == stats["rounds"]
+    assert all(calls > 0 for calls, seconds in profiler.phases.values())
+    assert all(calls > 0 for calls in profiler.counters.values())
+    assert profiler.counters["hand_updates"] >= profiler.counters["cards_dealt"]
@@ -0,0 +1,50 @@
+'''The output renderer: what each level shows, and one write per round.'''
+import pytest
+
+import blackjack
+
+def test_flush():
+    writes = []
+    renderer = blackjack.Renderer(blackjack.CARDS, write=writes.append)
+    renderer.show("a")
+    renderer.show()
+    assert writes == []
+    renderer.flush()
+    renderer.flush() # Nothing new to write
+    assert writes == ["a\n\n"]
+
+def play(monkeypatch, level):
+    """Plays a one-stack CPU game at an output level, returns (rounds, every write)"""
+    writes = []
+    monkeypatch.setattr(blackjack, "settings", blackjack.Settings(players_human=0, players_ai=2, CPU_bets="flat:2", stacks=1,
+                                                                  num_decks=1, autopause=False, starting_money=1000), raising=False)
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(level, write=writes.append))
+    monkeypatch.setattr(blackjack, "audio", blackjack.Null_Audio())
+    monkeypatch.setattr("builtins.input", lambda prompt="": "x")
+    players = [blackjack.CPU_Player(1000, f"CPU {seat+1}") for seat in range(2)]
+    rounds = blackjack.play_game(players, blackjack.CARD_TYPES, 0)
+    assert rounds > 3
+    return rounds, writes
+
+def test_silent(monkeypatch):
+    rounds, writes = play(monkeypatch, blackjack.SILENT)
+    assert writes == []
+
+def test_summary(monkeypatch):
+    rounds, writes = play(monkeypatch, blackjack.SUMMARY)
+    text = "".join(writes)
+    assert f"Total number of rounds: {rounds} rounds." in text and "1st place - CPU" in text
+    assert "ROUND" not in text and "STACK" not in text
+
+@pytest.mark.parametrize("level, shown, hidden", [
+    (blackjack.ROUNDS, "'s winnings: $", "Dealer's hand:"),
+    (blackjack.CARDS, "Dealer's hand:", None),
+])
+def test_one_write_per_round(monkeypatch, level, shown, hidden):
+    rounds, writes = play(monkeypatch, level)
+    round_writes = [write for write in writes if "----ROUND" in write]
+    assert len(round_writes) == rounds
+    for write in round_writes:
+        assert write.count("----ROUND") == 1 and shown in write
+        assert hidden is None or hidden not in write
+        assert ("Round Start" in write) == (level >= blackjack.CARDS)
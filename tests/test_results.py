@@ -0,0 +1,44 @@
+'''Players' running result counters, against the opt-in history of every round, under different rules and settings.'''
+import pytest
+
+import blackjack
+
+NET = {blackjack.BLACKJACK: None, blackjack.WIN: 1, blackjack.DRAW: 0, blackjack.SURRENDERED: -0.5, blackjack.LOSS: -1}
+
+class BetHistory(list):
+    """History sink that also keeps the bets each round was paid on"""
+    def __init__(self, player):
+        super().__init__()
+        self.player = player
+    def append(self, round_results):
+        super().append((round_results, list(self.player.bet)))
+
+@pytest.mark.parametrize("rules, values", [
+    ("s17,das,double:9-11", {}),
+    ("h17,nodas,double:any,resplit:2", {"blackjack_multiplier": 1.2}),
+    ("s17,surrender,resplit:4", {"num_decks": 1, "CPU_bets": "progression:2:2"}),
+    ("h17,double:10-11", {"CPU_difficulty": "easy", "CPU_bets": "quarter", "blackjack_multiplier": 2}),
+])
+def test_counters_match_the_history(rules, values):
+    settings = blackjack.Settings(players_human=0, players_ai=3, CPU_difficulty="hard", CPU_bets="flat:10",
+                                  starting_money=10**6, maximum_bet=10**6, rules=rules).replace(**values)
+    strategy, bet_policy = blackjack.get_strategy(settings.CPU_difficulty), blackjack.get_bet_policy(settings.CPU_bets)
+    players = [blackjack.CPU_Player(settings.starting_money, f"CPU {seat+1}", strategy, bet_policy) for seat in range(3)]
+    for player in players:
+        player.history = BetHistory(player)
+    stats = blackjack.simulate(settings, 3000, seed=2, players=players)
+    results = set()
+    for player in players:
+        hands = [result for round_results, bets in player.history for result in round_results]
+        results.update(hands)
+        assert player.rounds_played == len(player.history)
+        assert player.result_counts() == {"blackjacks": hands.count(blackjack.BLACKJACK), "won": hands.count(blackjack.WIN),
+                                          "drawn": hands.count(blackjack.DRAW),
+                                          "lost": hands.count(blackjack.LOSS) + hands.count(blackjack.SURRENDERED)}
+        assert player.detailed_scores().endswith(f"Total rounds: {player.rounds_played} | Total hands: {len(hands)}")
+        net = sum(bet*(settings.blackjack_multiplier if result == blackjack.BLACKJACK else NET[result])
+                  for round_results, bets in player.history for result, bet in zip(round_results, bets))
+        assert player.money == pytest.approx(settings.starting_money + net)
+    assert stats["rounds"] == players[0].rounds_played and not hasattr(players[0], "__dict__")
+    assert ({blackjack.SURRENDERED} <= results) == ("surrender" in rules)
+    assert any(len(round_results) > 1 for player in players for round_results, bets in player.history) # Some splits
@@ -0,0 +1,28 @@
+'''Risk of ruin walks against the gambler's ruin closed form.'''
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import risk_of_ruin
+
+def ruin_within(rounds, win, start):
+    """Probability that a ±1 walk from `start` with P(+1) = win first reaches 0 within `rounds`
+    steps: by the ballot theorem, P(first at step n) = start/n * C(n, (n+start)/2) q^((n+start)/2) p^((n-start)/2)"""
+    lose = 1 - win
+    return sum(start/steps*math.comb(steps, (steps + start)//2)*lose**((steps + start)//2)*win**((steps - start)//2)
+               for steps in range(start, rounds + 1, 2))
+
+@pytest.mark.parametrize("win", [0.45, 0.5, 0.55])
+def test_two_outcome_walk(win):
+    settings = {"starting_money": 5, "minimum_bet": 1, "maximum_bet": 500, "CPU_bets": "flat:1"}
+    walks, rounds = 100000, 300
+    ruin_round, final_money = risk_of_ruin.ruin_walks(np.array([-1.0, 1.0]), np.array([1 - win, win]), settings, rounds, walks, seed=3)
+    assert np.all(final_money[ruin_round > 0] == 0)
+    assert np.all(final_money[ruin_round == 0] >= 1)
+    assert np.all(ruin_round[ruin_round > 0] % 2 == 1) # From 5, 0 is only reached after an odd number of rounds
+    for within, probability, stderr in risk_of_ruin.ruin_curve(ruin_round, rounds, points=6):
+        expected = ruin_within(within, win, 5)
+        assert abs(probability - expected) <= 4*math.sqrt(expected*(1 - expected)/walks)
+    if win > 0.5: # Close to the infinite horizon (q/p)^start by then
+        assert ruin_within(rounds, win, 5) == pytest.approx(((1 - win)/win)**5, abs=0.01)
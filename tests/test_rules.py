@@ -0,0 +1,64 @@
+'''Table rules: parsing, the compiled tables, and the engines that play them.'''
+import pytest
+
+import blackjack
+
+@pytest.mark.parametrize("spec", ["double:11-9", "double:0-11", "double:9-22", "double:9", "resplit:0", "s18", "h17,peek"])
+def test_bad_rules(spec):
+    with pytest.raises(ValueError):
+        blackjack.compile_rules(spec)
+    with pytest.raises(blackjack.SettingsError):
+        blackjack.Settings(rules=spec)
+
+def test_tables():
+    rules = blackjack.get_rules("h17,nodas,double:10-11,resplit:3,surrender")
+    assert rules.dealer_hits[True][17] and not rules.dealer_hits[False][17]
+    assert [total for total in range(32) if rules.can_double[False][total]] == [10, 11]
+    assert not any(rules.can_double[True])
+    assert rules.max_hands == 3 and rules.surrender
+    default = blackjack.get_rules(blackjack.DEFAULT_SETTINGS["rules"])
+    assert not default.dealer_hits[True][17] and default.can_double[True][9] and default.max_hands == blackjack.math.inf
+    assert blackjack.get_rules("double:any").can_double[False][2:22] == (True,)*20
+
+def test_rules_change_the_game():
+    settings = blackjack.Settings(players_human=0, players_ai=2, CPU_difficulty="hard", CPU_bets="flat:2", starting_money=10**6)
+    results = {spec: blackjack.simulate(settings.replace(rules=spec), 4000, seed=3)
+               for spec in ("s17,das,double:9-11", "h17,nodas,double:any,resplit:2", "s17,surrender")}
+    assert len({stats["casino_winnings"] for stats in results.values()}) == 3
+
+def test_batch_sim_rules():
+    batch_sim = pytest.importorskip("batch_sim")
+    dealer_hits, can_double, max_hands = batch_sim.rule_tables("h17,resplit:2")
+    assert dealer_hits[1, 17] and max_hands == 2
+    with pytest.raises(ValueError):
+        batch_sim.simulate_batch(10, rules="surrender")
+    stats = batch_sim.simulate_batch(200, seed=1, rules="h17,nodas,double:any")
+    assert stats["rounds"] > 0 and stats["hands"] >= stats["rounds"]
+
+def test_busted_double_loses_when_the_dealer_busts(monkeypatch):
+    monkeypatch.setattr(blackjack, "settings", blackjack.Settings(players_human=0, players_ai=1, CPU_bets="flat:10",
+                                                                  rules="double:any", autopause=False))
+    monkeypatch.setattr(blackjack, "output", blackjack.Renderer(blackjack.SILENT))
+    always_double = blackjack.compile_strategy(lambda total, soft, pair_card, up_card: blackjack.DOUBLE)
+    player = blackjack.CPU_Player(100, "CPU 1", always_double)
+    codes = [blackjack.CARD_CODES[card] for card in (10, 6, 10, 6, 10, 10)] # Player 10 6, dealer 10 6, player 10, dealer 10
+    dealer_hand = blackjack.play_round([player], blackjack.Shoe.from_codes(bytearray(codes + [0]*46), 1))
+    assert player.hand.total == dealer_hand.total == 26
+    assert player.round_results == [blackjack.LOSS]
+    assert player.money == 80
+
+def test_batch_sim_busted_doubles():
+    batch_sim = pytest.importorskip("batch_sim")
+    np = pytest.importorskip("numpy")
+    # Doubling every hand on any total: busted doubles must never be paid when the dealer busts too
+    strategy = np.full((11, 2, 32, 11), blackjack.DOUBLE, dtype=np.uint8)
+    stats = dict.fromkeys(("rounds", "hands", "blackjacks", "won", "drawn", "lost", "wagered"), 0)
+    stats["net"] = stats["net_squared"] = 0.0
+    batch_sim._play_shoes(np.random.default_rng(1), 1000, 1, 1.5, strategy, batch_sim.rule_tables("double:any"), stats)
+    busted_doubles = blackjack.Settings(players_human=0, players_ai=1, rules="double:any", CPU_bets="flat:1", starting_money=10**6)
+    # The engine with the same strategy and rules, for the house edge to compare with
+    scalar = blackjack.simulate(busted_doubles, 20000, seed=1,
+                                players=[blackjack.CPU_Player(10**6, "CPU 1", bytes(strategy.tobytes()))])
+    batch_edge = -stats["net"]/stats["wagered"]
+    assert batch_edge > 0.25 and scalar["house_edge"] > 0.25 # About 0.12 when busted doubles drew or won
+    assert abs(batch_edge - scalar["house_edge"]) < 0.05
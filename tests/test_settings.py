@@ -0,0 +1,69 @@
+'''Settings validation: every bad value is a SettingsError, and bad files fall back to the defaults.'''
+import json
+
+import pytest
+
+import blackjack
+
+@pytest.mark.parametrize("values", [
+    {"stacks": float("nan")},
+    {"starting_money": float("inf")},
+    {"blackjack_multiplier": float("nan")},
+    {"stacks": 1.5},
+    {"stacks": "2"},
+    {"stacks": 0},
+    {"players_ai": True},
+    {"players_human": 0, "players_ai": 0},
+    {"minimum_bet": 10, "maximum_bet": 5},
+    {"autopause": "yes"},
+    {"CPU_difficulty": 3},
+    {"CPU_difficulty": ["hard"]},
+    {"CPU_difficulty": "no such chart.json"},
+    {"CPU_bets": None},
+    {"CPU_bets": "flat:nan"},
+    {"CPU_bets": "martingale"},
+    {"rules": 17},
+    {"rules": "h18"},
+    {"verbosity": 4},
+    {"colour": "red"},
+])
+def test_bad_values(values):
+    with pytest.raises(blackjack.SettingsError):
+        blackjack.Settings(**values)
+
+def test_good_values():
+    settings = blackjack.Settings(stacks=3.0, autopause="false", CPU_bets="kelly:1:0.01", rules="h17,surrender")
+    assert settings.stacks == 3 and type(settings.stacks) is int
+    assert settings.autopause is False
+    assert settings.replace(num_decks=1).num_decks == 1
+    with pytest.raises(blackjack.SettingsError):
+        settings.replace(num_decks=-1)
+
+@pytest.mark.parametrize("chart", [
+    [],
+    {"hard": []},
+    {"hard": {"16": "S S S S S H H H H"}},
+    {"hard": {"16": "S S S S S H H H X H"}},
+    {"hard": {"sixteen": "S S S S S H H H H H"}},
+    {"soft": {"18": 5}},
+])
+def test_bad_charts(tmp_path, chart):
+    path = str(tmp_path / "chart.json")
+    with open(path, "w") as file:
+        json.dump(chart, file)
+    with pytest.raises(blackjack.SettingsError):
+        blackjack.Settings(CPU_difficulty=path)
+
+def test_chart(tmp_path):
+    path = str(tmp_path / "chart.json")
+    with open(path, "w") as file:
+        json.dump({"hard": {"16": "S S S S S H H H Rh Rh"}, "pairs": {"8": "P P P P P P P P P P"}}, file)
+    settings = blackjack.Settings(CPU_difficulty=path)
+    assert blackjack.strategies[path] is blackjack.get_strategy(settings.CPU_difficulty) # Compiled while validating
+
+@pytest.mark.parametrize("contents", ['{"stacks": NaN}', '{"stacks": Infinity}', '[1, 2]', '{"stacks": ', '\xff'])
+def test_bad_files(tmp_path, capsys, contents):
+    path = tmp_path / "settings.json"
+    path.write_text(contents, encoding="latin-1")
+    assert blackjack.load_settings(str(path)) == blackjack.Settings()
+    assert "Invalid settings file" in capsys.readouterr().out
@@ -0,0 +1,68 @@
+'''Shoes: dealing, composition (of engine and corpus stacks) and the dealer odds over them.'''
+import random
+
+import pytest
+
+import blackjack
+import dealer_odds
+import shoe_corpus
+
+def values(cards):
+    """Card counts by value of a list of cards, like Shoe.composition"""
+    counts = [0]*11
+    for card in cards:
+        counts[blackjack.CARD_VALUES[card]] += 1
+    return counts
+
+def test_composition():
+    shoe = blackjack.make_decks(2, blackjack.CARD_TYPES, random.Random(1))
+    assert shoe.composition() == dealer_odds.full_shoe(2)
+    dealt = [shoe.deal() for _ in range(30)]
+    assert len(shoe) == 104 - 30
+    assert shoe.composition() == [full - seen for full, seen in zip(dealer_odds.full_shoe(2), values(dealt))]
+    shoe.shuffle()
+    assert shoe.composition() == dealer_odds.full_shoe(2)
+
+def test_corpus_composition(tmp_path):
+    path = str(tmp_path / "shoes.bjc")
+    shoe_corpus.make_corpus(path, 3, num_decks=1, seed=5, workers=1)
+    with shoe_corpus.ShoeCorpus(path) as corpus:
+        shoe = corpus.shoe(2)
+        assert isinstance(shoe.cards, memoryview)
+        expected = blackjack.Shoe.from_codes(bytearray(shoe_corpus.generate_shoes(1, "5", 2, 1)), 1)
+        assert shoe.composition() == dealer_odds.full_shoe(1)
+        for _ in range(20):
+            assert shoe.deal() == expected.deal()
+        assert shoe.composition() == expected.composition()
+        assert sum(shoe.composition()) == 52 - 20
+        del shoe
+
+def test_dealer_odds_rules_and_big_shoes():
+    counts = dealer_odds.full_shoe(6)
+    counts[6] -= 1
+    s17 = dealer_odds.distribution(6, counts)
+    h17 = dealer_odds.distribution(6, counts, rules=blackjack.get_rules("h17"))
+    assert abs(sum(s17) - 1) < 1e-12 and abs(sum(h17) - 1) < 1e-12
+    assert h17[0] < s17[0] and h17[dealer_odds.BUST] > s17[dealer_odds.BUST]
+    # More than 255 cards of a value still get a signature of their own
+    big = [0] + [320]*9 + [1280]
+    assert dealer_odds.signature(6, big) != dealer_odds.signature(6, [0] + [64]*9 + [0])
+    assert dealer_odds.signature(6, counts) != dealer_odds.signature(6, counts, rules=blackjack.get_rules("h17"))
+    odds = dealer_odds.DealerOdds(path=None)
+    assert odds.get(6, big) == odds.get(6, big) and odds.hits == 1
+
+def test_compare_stack_range(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / "shoes.bjc")
+    shoe_corpus.make_corpus(path, 4, num_decks=1, seed=2, workers=1)
+    settings = blackjack.Settings(players_human=0, players_ai=2, CPU_bets="flat:2", starting_money=10**5, num_decks=1)
+    for stacks in (0, 5):
+        with pytest.raises(ValueError, match="has 4"):
+            shoe_corpus.compare(path, settings, settings, stacks, workers=1)
+    result = shoe_corpus.compare(path, settings, settings.replace(CPU_difficulty="hard"), 4, workers=1)
+    assert result["difference_stderr"] > 0
+    same = shoe_corpus.compare(path, settings, settings, 4, workers=1)
+    assert same["difference"] == same["difference_stderr"] == 0
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit):
+        shoe_corpus.main(["compare", path, "5", "--workers", "1"])
+    assert "has 4" in capsys.readouterr().err
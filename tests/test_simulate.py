@@ -0,0 +1,58 @@
+'''Headless simulation: plays like the original engine, seeded runs repeat, and the multi-core runner is reproducible.'''
+import math
+import random
+
+import pytest
+
+import blackjack
+import montecarlo
+import baseline
+
+ROUNDS = 40000
+SEATS = 3
+
+def rates(stats):
+    """Per hand result rates and per round casino winnings (mean and variance) of a simulation"""
+    nets = stats["round_nets"]
+    mean = sum(nets)/len(nets)
+    variance = sum((net - mean)**2 for net in nets)/(len(nets) - 1)
+    hands = stats["hands"]
+    return {key: stats[key]/hands for key in ("blackjacks", "won", "drawn", "lost")}, hands, mean, variance
+
+@pytest.mark.parametrize("difficulty", ["hard", "easy"])
+def test_matches_the_original_engine(difficulty):
+    """The engine plays like the original round loop: every per hand result rate and the casino's
+    winnings per round agree within 4 standard errors (different random numbers, same odds)"""
+    original = baseline.play_rounds(ROUNDS, difficulty, random.Random(7), players=SEATS)
+    settings = blackjack.Settings(players_human=0, players_ai=SEATS, CPU_difficulty=difficulty, starting_money=10**9)
+    engine = blackjack.simulate(settings, ROUNDS, bankroll=True, seed=7)
+    # Casino winnings of every round, from the players' money after each round
+    trajectories = [[settings.starting_money] + money for money in engine["bankroll"]]
+    engine["round_nets"] = [-sum(money[round_num + 1] - money[round_num] for money in trajectories) for round_num in range(ROUNDS)]
+    assert engine["wagered"]/engine["hands"] == pytest.approx(original["wagered"]/original["hands"], rel=0.02)
+    (rates_a, hands_a, mean_a, variance_a), (rates_b, hands_b, mean_b, variance_b) = rates(original), rates(engine)
+    for key in rates_a:
+        pooled = (rates_a[key]*hands_a + rates_b[key]*hands_b)/(hands_a + hands_b)
+        stderr = math.sqrt(pooled*(1 - pooled)*(1/hands_a + 1/hands_b))
+        assert abs(rates_a[key] - rates_b[key]) < 4*stderr, key
+    assert abs(mean_a - mean_b) < 4*math.sqrt(variance_a/ROUNDS + variance_b/ROUNDS)
+
+def test_seeded_runs_repeat():
+    settings = blackjack.Settings(players_human=0, players_ai=3, CPU_bets="flat:5", starting_money=10**6)
+    first, second = (blackjack.simulate(settings, 2000, seed="abc") for _ in range(2))
+    for stats in (first, second):
+        stats.pop("seconds"), stats.pop("rounds_per_sec")
+    assert first == second
+    assert blackjack.simulate(settings, 2000, seed="abd")["casino_winnings"] != first["casino_winnings"]
+
+def test_montecarlo_matches_simulate(tmp_path):
+    settings = blackjack.Settings(players_human=0, players_ai=2, CPU_bets="flat:2", starting_money=10**6)
+    out_path = str(tmp_path / "stacks.jsonl")
+    report = montecarlo.run(settings, 6, workers=2, seed=4, out_path=out_path)
+    single = montecarlo.merge_results([montecarlo.play_stack(settings, 4, stack) for stack in range(6)])
+    for key in ("rounds", "hands", "wagered", "casino_winnings", "house_edge", "seats"):
+        assert report[key] == single[key]
+    # Every stack is saved, so running it again plays nothing and gives the same report
+    assert len(montecarlo.load_results(out_path)) == 6
+    resumed = montecarlo.run(settings, 6, workers=1, seed=4, out_path=out_path, on_stack=pytest.fail)
+    assert resumed["casino_winnings"] == report["casino_winnings"]
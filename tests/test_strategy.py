@@ -0,0 +1,40 @@
+'''The compiled easy and hard strategy tables against the original decision functions.'''
+import itertools
+
+import pytest
+
+import baseline
+import blackjack
+
+class FixedRandom:
+    """Stands in for the CPU's random.Random, always drawing the same number"""
+    def __init__(self, value):
+        self.value = value
+    def random(self):
+        return self.value
+
+def decision_hands():
+    """Every hand of two or three cards a CPU can still act on (under 21)"""
+    for size in (2, 3):
+        for cards in itertools.product(blackjack.CARD_TYPES, repeat=size):
+            if baseline.total_up(cards) < 21:
+                yield list(cards)
+
+@pytest.mark.parametrize("difficulty", ["easy", "hard"])
+def test_table_matches_the_original_decisions(difficulty):
+    table = blackjack.compile_strategy(blackjack.easy_action if difficulty == "easy" else blackjack.hard_action)
+    mismatches = []
+    for cards in decision_hands():
+        hand = blackjack.Hand(cards)
+        for up_card in blackjack.CARD_TYPES:
+            action = table[blackjack.strategy_index(hand, blackjack.CARD_VALUES[up_card])]
+            checks = []
+            if hand.pair:
+                checks.append(("split", bool(action & blackjack.SPLIT), baseline.splits_pairs(cards, up_card, difficulty)))
+            if len(hand) == 2 and hand.total in (9, 10, 11): # The only doubles the original logic made
+                checks.append(("double", bool(action & blackjack.DOUBLE), baseline.doubles_down(cards, up_card, difficulty)))
+            for draw in (0.1, 0.5): # Either side of the 35% stand chance of easy CPUs
+                hit = draw >= 0.35 if action & blackjack.HIT_SOMETIMES else bool(action & blackjack.HIT)
+                checks.append((f"hit ({draw})", hit, baseline.hits(cards, up_card, difficulty, FixedRandom(draw))))
+            mismatches += [(cards, up_card, name, got, expected) for name, got, expected in checks if got != expected]
+    assert mismatches == []
@@ -0,0 +1,40 @@
+'''Table server: seats that drop and tables that fail don't take the server down.'''
+import asyncio
+
+import blackjack
+import table_server
+
+class DroppedWriter:
+    """Stream writer of a connection the client closed"""
+    def __init__(self):
+        self.closed = False
+    def write(self, data):
+        pass
+    async def drain(self):
+        raise ConnectionResetError("Connection reset by peer")
+    def close(self):
+        self.closed = True
+
+SETTINGS = blackjack.Settings(players_human=1, players_ai=2, stacks=1, num_decks=1, CPU_bets="flat:2", autopause=False)
+
+def test_seat_dropped_while_cpus_play():
+    async def play():
+        table = table_server.Table(0, SETTINGS, seed=1)
+        player = table_server.Remote_Player(SETTINGS.starting_money, "Ann", asyncio.StreamReader(), DroppedWriter())
+        player.bankruptcy = True # Out of the game: only the CPUs play, nobody notices the connection is gone
+        table.seat(player)
+        rounds = await table.run()
+        return table, player, rounds
+    table, player, rounds = asyncio.run(play())
+    assert rounds > 0 and table.finished.is_set() and player.writer.closed
+
+def test_failing_table_does_not_stop_the_others(capsys):
+    async def play():
+        server = table_server.Server(3, SETTINGS.replace(players_human=0, verbosity=0), seed=1)
+        async def fail():
+            raise RuntimeError("broken table")
+        server.tables[1].run = fail
+        return await server.run()
+    rounds = asyncio.run(play())
+    assert len(rounds) == 2 and all(table_rounds > 0 for table_rounds in rounds)
+    assert "Table 2 stopped" in capsys.readouterr().err
@@ -0,0 +1,52 @@
+'''Tournaments: who goes through each elimination round, and the command line.'''
+import blackjack
+import tournament
+
+SETTINGS = {"players_human": 0, "stacks": 1, "starting_money": 100, "minimum_bet": 2, "maximum_bet": 10**6, "verbosity": 0}
+
+def play(monkeypatch, count, bet_policies, seats_per_table, advance, seed=0):
+    """Runs a tournament, returns (standings, every round's tables as (entrant, bankruptcy) lists)"""
+    rounds = []
+    def play_round(*args):
+        tables = original_play_round(*args)
+        rounds.append([[(entrant, entrant.bankruptcy) for entrant in blackjack.rank_players(table)] for table in tables])
+        return tables
+    original_play_round = tournament.play_round
+    monkeypatch.setattr(tournament, "play_round", play_round)
+    monkeypatch.setattr(blackjack, "settings", None, raising=False) # run sets it
+    entrants = tournament.make_entrants(count, ["easy", "hard"], bet_policies)
+    standings = tournament.run(SETTINGS, entrants, seats_per_table, advance, seed=seed, workers=1)
+    assert sorted(entrant.number for entrant in standings) == list(range(count))
+    return standings, rounds
+
+def going_through(tables, advance):
+    return {entrant.number for table in tables for entrant, bankruptcy in table[:advance] if not bankruptcy}
+
+def test_elimination(monkeypatch):
+    standings, rounds = play(monkeypatch, 24, ["flat:2"], seats_per_table=4, advance=2)
+    assert [len(tables) for tables in rounds] == [6, 3, 2, 1]
+    for tables, next_tables in zip(rounds, rounds[1:]):
+        assert {entrant.number for table in next_tables for entrant, bankruptcy in table} == going_through(tables, 2)
+    final = [entrant for entrant, bankruptcy in rounds[-1][0]]
+    assert standings[:len(final)] == final # The final's ranking, then everyone else by the round they got to
+    assert [entrant.reached for entrant in standings] == sorted((entrant.reached for entrant in standings), reverse=True)
+    assert {entrant.reached for entrant in final} == {3}
+
+def test_bankrupt_entrants_drop_out(monkeypatch):
+    # Half the entrants bet everything every round, so most tables have fewer than 3 left at the end
+    standings, rounds = play(monkeypatch, 16, ["flat:2", "fraction:1"], seats_per_table=4, advance=3)
+    first_round = rounds[0]
+    assert any(bankruptcy for table in first_round for entrant, bankruptcy in table[:3])
+    through = going_through(first_round, 3)
+    assert {entrant.number for entrant in standings if entrant.reached > 0} == through
+    assert len(through) < 4*3
+    # Nobody gets through when everyone goes bankrupt
+    standings, rounds = play(monkeypatch, 8, ["fraction:1"], seats_per_table=4, advance=2)
+    assert len(rounds) == 1 and all(entrant.bankruptcy and entrant.reached == 0 for entrant in standings)
+
+def test_fewer_entrants_than_kinds(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(blackjack, "settings", None, raising=False)
+    tournament.main(["3", "--bets", "flat:10", "--bets", "quarter", "--bets", "progression:2:2", "--workers", "1"])
+    summaries = [line for line in capsys.readouterr().out.splitlines() if "average round reached" in line]
+    assert len(summaries) == 3
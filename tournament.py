@@ -0,0 +1,145 @@
+'''CPU tournament: thousands of CPU entrants with mixed difficulties and bet policies, seated at
+many tables and played down by elimination rounds on every core.
+
+    python tournament.py 5000 --difficulty easy --difficulty hard --bets quarter --bets flat:10 --bets progression:2:2
+
+Every elimination round reseats the entrants still in at random tables and plays a full game at
+each (the settings' stacks, with the starting money). The best `--advance` of every table (ranked
+like end_game_scores ranks players) go through to the next round, unless they went bankrupt.
+Once the entrants fit at one table, they play the final. Workers only send back each entrant's
+final money and counters, never the tables' rounds.
+Final standings: by the round each entrant got to (the champion first), then like end_game_scores.
+'''
+import sys                  # For the command line arguments
+import os                   # For the number of cores
+import json                 # For the standings file
+import random               # For the seating
+import itertools            # For mixing difficulties and bet policies
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import blackjack
+
+TABLES_PER_TASK = 16    # Tables each worker plays before sending its results back
+
+class Entrant:
+    """A tournament entrant and how they did in the last round they played"""
+    __slots__ = ("number", "name", "difficulty", "bet_policy", "reached", "money", "rounds_played", "bankruptcy",
+                 "blackjacks", "won", "drawn", "lost")
+    def __init__(self, number, name, difficulty, bet_policy):
+        self.number = number
+        self.name = name
+        self.difficulty = difficulty
+        self.bet_policy = bet_policy
+        self.reached = 0    # Last elimination round played (from 0)
+        self.money = 0
+        self.rounds_played = 0
+        self.bankruptcy = False
+        self.blackjacks = self.won = self.drawn = self.lost = 0
+    def detailed_scores(self):
+        return blackjack.Player.detailed_scores(self)
+
+def make_entrants(count, difficulties, bet_policies):
+    """Entrants named from names.txt (numbered once the names run out), with the difficulties and
+    bet policies taken in turn, so every combination is as common as the others"""
+    names = [name for name in blackjack.load_cpu_names() if name.strip()] or blackjack.DEFAULT_CPU_NAMES
+    kinds = itertools.cycle(itertools.product(difficulties, bet_policies))
+    return [Entrant(number, names[number % len(names)] + (f" {number//len(names) + 1}" if number >= len(names) else ""), *next(kinds))
+            for number in range(count)]
+
+def play_tables(sim_settings, seed, round_num, tables):
+    """Worker task: plays tables of (table number, [(entrant number, name, difficulty, bet policy)]) and
+    returns every entrant's (number, money, rounds played, bankruptcy, blackjacks, won, drawn, lost)"""
+    results = []
+    for table, seats in tables:
+        players = [blackjack.CPU_Player(sim_settings.starting_money, name, blackjack.get_strategy(difficulty),
+                                        blackjack.get_bet_policy(bet_policy))
+                   for number, name, difficulty, bet_policy in seats]
+        blackjack.simulate(sim_settings, stacks=sim_settings.stacks, seed=f"{seed}:{round_num}:{table}", players=players)
+        for (number, *entrant), player in zip(seats, players):
+            results.append((number, player.money, player.rounds_played, player.bankruptcy,
+                            player.blackjacks, player.won, player.drawn, player.lost))
+    return results
+
+def play_round(executor, sim_settings, entrants, seats_per_table, seed, round_num):
+    """Seats the entrants at random tables and plays them all. Returns the tables (lists of entrants)."""
+    order = list(entrants)
+    random.Random(blackjack.stream_seed(seed, "seating", round_num)).shuffle(order)
+    tables = [order[start:start + seats_per_table] for start in range(0, len(order), seats_per_table)]
+    by_number = {entrant.number: entrant for entrant in entrants}
+    seatings = [(table, [(entrant.number, entrant.name, entrant.difficulty, entrant.bet_policy) for entrant in seated])
+                for table, seated in enumerate(tables)]
+    tasks = [seatings[start:start + TABLES_PER_TASK] for start in range(0, len(seatings), TABLES_PER_TASK)]
+    futures = [executor.submit(play_tables, sim_settings, seed, round_num, task) for task in tasks]
+    for future in as_completed(futures):
+        for number, *result in future.result():
+            entrant = by_number[number]
+            entrant.reached = round_num
+            (entrant.money, entrant.rounds_played, entrant.bankruptcy,
+             entrant.blackjacks, entrant.won, entrant.drawn, entrant.lost) = result
+    return tables
+
+def run(sim_settings, entrants, seats_per_table=6, advance=3, seed=0, workers=None, on_round=None):
+    """Plays the tournament and returns the entrants in their final standings"""
+    if not 0 < advance < seats_per_table:
+        raise ValueError("advance must be at least 1 and less than the seats per table")
+    sim_settings = blackjack.Settings.from_dict(sim_settings).replace(players_ai=seats_per_table)
+    blackjack.settings = sim_settings # For rank_players and standings
+    remaining = list(entrants)
+    round_num = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        while True:
+            tables = play_round(executor, sim_settings, remaining, seats_per_table, seed, round_num)
+            if len(tables) == 1: # The final
+                break
+            remaining = [entrant for table in tables for entrant in blackjack.rank_players(table)[:advance]
+                         if not entrant.bankruptcy]
+            if on_round:
+                on_round(round_num, len(tables), len(remaining))
+            if not remaining: # Everyone went bankrupt
+                break
+            round_num += 1
+    # rank_players' order within every round reached (sorted is stable)
+    return sorted(blackjack.rank_players(entrants), key=lambda entrant: entrant.reached, reverse=True)
+
+def main(args):
+    import argparse
+    parser = argparse.ArgumentParser(description="Plays a CPU blackjack tournament on every core.")
+    parser.add_argument("entrants", type=int, help="number of entrants")
+    parser.add_argument("--difficulty", action="append", help="CPU difficulties to mix (default: easy and hard)")
+    parser.add_argument("--bets", action="append", help="bet policies to mix (default: quarter)")
+    parser.add_argument("--seats", type=int, default=6, help="seats per table (default: 6)")
+    parser.add_argument("--advance", type=int, default=3, help="entrants of each table going through (default: 3)")
+    parser.add_argument("--seed", default="0", help="master seed")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--top", type=int, default=10, help="standings to print (default: 10)")
+    parser.add_argument("--out", help="file to write the full standings to (JSON lines)")
+    options = parser.parse_args(args)
+    difficulties = options.difficulty or ["easy", "hard"]
+    bet_policies = options.bets or ["quarter"]
+    try:
+        sim_settings = blackjack.load_settings()
+        for difficulty, bet_policy in itertools.product(difficulties, bet_policies):
+            sim_settings.replace(CPU_difficulty=difficulty, CPU_bets=bet_policy)
+    except blackjack.SettingsError as error:
+        parser.error(str(error))
+    def on_round(round_num, tables, remaining):
+        print(f"Round {round_num+1}: {tables} tables, {remaining} entrants go through", file=sys.stderr)
+    try:
+        standings = run(sim_settings, make_entrants(options.entrants, difficulties, bet_policies),
+                        options.seats, options.advance, options.seed, options.workers, on_round)
+    except ValueError as error:
+        parser.error(str(error))
+    if options.out:
+        with open(options.out, "w") as file:
+            for place, entrant in enumerate(standings, start=1):
+                file.write(json.dumps({"place": place, "name": entrant.name, "difficulty": entrant.difficulty,
+                                       "bets": entrant.bet_policy, "round": entrant.reached + 1, "money": entrant.money,
+                                       "bankruptcy": entrant.bankruptcy, **blackjack.Player.result_counts(entrant)}) + "\n")
+    print(blackjack.standings(standings[:options.top], ranked=True))
+    for kind in itertools.product(difficulties, bet_policies):
+        rounds = [entrant.reached + 1 for entrant in standings if (entrant.difficulty, entrant.bet_policy) == kind]
+        if not rounds: # Fewer entrants than kinds
+            continue
+        print(f"{kind[0]}, bets {kind[1]}: {len(rounds)} entrants, average round reached {sum(rounds)/len(rounds):.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])